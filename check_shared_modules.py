@@ -0,0 +1,80 @@
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+
+# ===============================
+# 공유 모듈 사본 일치 확인
+# ===============================
+# 세 배포 단위(simulation/, dashboard+chatbot/, reportgenerator/)는 각자 디렉터리를 경로로 실행되므로
+# 공통 모듈을 디렉터리마다 같은 파일로 둠. 한쪽만 고치면 사본이 어긋나므로 커밋 전에 확인.
+#   python check_shared_modules.py                          # 다른 사본이 있으면 목록을 출력하고 종료 코드 1
+#   python check_shared_modules.py --sync dashboard+chatbot # 그 디렉터리의 파일로 나머지 사본을 덮어씀
+# metrics.py는 앱마다 등록하는 메트릭이 달라 공유 모듈이 아님.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+WEB_APPS = ["dashboard+chatbot", "reportgenerator"]
+ALL_UNITS = ["simulation"] + WEB_APPS
+
+SHARED_MODULES = {
+    "asgi_support.py": WEB_APPS,
+    "chart_renderer.py": WEB_APPS,
+    "export_pool.py": WEB_APPS,
+    "flask_metrics.py": WEB_APPS,
+    "replication.py": WEB_APPS,
+    "report_jobs.py": WEB_APPS,
+    "status_protocol.py": WEB_APPS,
+    "process_log.py": ALL_UNITS,
+    "status_log.py": ALL_UNITS,
+    "topology.py": ALL_UNITS,
+    "feature_store.py": ["simulation", "dashboard+chatbot"],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync", type=str, default=None, choices=ALL_UNITS,
+                        help="Overwrite the other copies with this directory's files")
+    return parser.parse_args()
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def mismatches():
+    """{모듈: {디렉터리: 해시}} (사본이 모두 같은 모듈은 제외, 없는 사본은 해시 None)"""
+    result = {}
+    for module, units in SHARED_MODULES.items():
+        digests = {}
+        for unit in units:
+            path = os.path.join(ROOT, unit, module)
+            digests[unit] = _digest(path) if os.path.exists(path) else None
+        if len(set(digests.values())) > 1:
+            result[module] = digests
+    return result
+
+
+def sync(source):
+    for module, units in SHARED_MODULES.items():
+        if source not in units:
+            continue
+        for unit in units:
+            if unit != source:
+                shutil.copyfile(os.path.join(ROOT, source, module), os.path.join(ROOT, unit, module))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.sync:
+        sync(args.sync)
+
+    different = mismatches()
+    for module, digests in different.items():
+        print(f"{module}: " + ", ".join(
+            f"{unit}={digest[:8] if digest else 'missing'}" for unit, digest in digests.items()))
+    if different:
+        sys.exit(1)
+    print(f"{len(SHARED_MODULES)} shared modules match")
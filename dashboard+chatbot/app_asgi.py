@@ -0,0 +1,348 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from fastapi.staticfiles import StaticFiles
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+import socketio
+import uvicorn
+from flow_analytics import FlowAnalyticsService
+from policy_comparison import PolicyComparisonStore
+import dashboard_service
+from chatbot import ChatbotService
+from chat_fastpath import ChatFastPath
+from status_log import AsyncStatusLogReader
+from topology import Topology
+from metrics import instrument_influx, instrument_influx_async, record_llm_call
+from replication import LeaderLease, connect_redis
+from status_protocol import AsyncStatusBroadcaster, StatusStore
+from asgi_support import EndpointRoute, flask_templates, create_socketio, metrics_response, poll_status
+from export_pool import pool as export_pool, ExportQueueFull
+from report_jobs import ReportJobStore, JobSlots, ReportJobsFull, REPORT_JOB_EVENT, job_room, public_status
+from feature_store import FeatureStore
+
+# ✅ 대시보드 + 챗봇 서버 (ASGI: FastAPI + python-socketio)
+# app.py와 같은 라우트/Socket.IO 이벤트를 asyncio로 제공.
+#  - 요청 경로의 Influx/OpenAI 호출은 async 클라이언트, 챗봇 LLM 호출은 LangGraph astream
+#  - 흐름 분석/정책 비교 갱신처럼 동기 클라이언트를 쓰는 작업은 스레드, DOCX 조립은 export_pool 프로세스에서 실행
+#   uvicorn app_asgi:asgi_app --host 0.0.0.0 --port 5000
+load_dotenv()
+
+INFLUX_URL = os.getenv("INFLUX_URL")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
+INFLUX_ORG = os.getenv("INFLUX_ORG")
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# ✅ 동기 클라이언트: 스레드에서 도는 흐름 분석/정책 비교/챗봇 Tool용
+influx_client = instrument_influx(InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG))
+# ✅ async 클라이언트: 이벤트 루프 안에서 만들어야 하므로 lifespan에서 설정
+influx = {}
+
+# ✅ 공장 토폴로지 (설비 라인 목록)
+topology = Topology.load()
+LINES = topology.equipment_lines
+
+flow_analytics = FlowAnalyticsService(influx_client, INFLUX_ORG, topology.sink_process)
+policy_comparison = PolicyComparisonStore(influx_client, INFLUX_ORG, LINES)
+
+# ✅ 상태 fan-out 리더 선출 및 최신 상태 공유 (eventlet 서버와 같은 키/채널)
+redis_client = connect_redis()
+# ✅ 라인별 피처/고장 위험 점수 (FeatureUpdater가 갱신, 읽기만 함)
+feature_store = FeatureStore(redis_client)
+chatbot_service = ChatbotService(
+    influx_client, flow_analytics, feature_store, fast_path=ChatFastPath(policy_comparison, topology)
+)
+status_lease = LeaderLease(redis_client, "dashboard_emit_status")
+status_store = StatusStore(redis_client, "dashboard")
+sio = create_socketio("facman-dashboard")
+status_broadcaster = AsyncStatusBroadcaster(sio, status_store, status_lease, LINES)
+
+
+def status_reader():
+    return AsyncStatusLogReader(influx["client"].query_api(), INFLUX_ORG)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    influx["client"] = instrument_influx_async(
+        InfluxDBClientAsync(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG, timeout=60_000))
+    tasks = [
+        asyncio.create_task(poll_status(status_broadcaster, status_lease, lambda: status_reader().latest(LINES))),
+        asyncio.create_task(status_broadcaster.run()),
+    ]
+    # 정책 비교 갱신은 동기 Influx 조회라 전용 데몬 스레드에서 주기 실행
+    threading.Thread(target=policy_comparison.run, args=(time.sleep,), daemon=True, name="policy-comparison").start()
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.to_thread(status_lease.release)
+        await influx["client"].close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = EndpointRoute
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.mount("/static", StaticFiles(directory="static"), name="static")
+templates = flask_templates("templates", app)
+
+
+# ✅ 페이지 라우팅
+@app.get("/")
+async def index(request: Request):
+    return templates.TemplateResponse(request, "index.html", {"lines": LINES})
+
+
+@app.get("/usefulness")
+async def usefulness(request: Request):
+    return templates.TemplateResponse(request, "usefulness.html")
+
+
+@app.get("/report")
+async def report_page(request: Request):
+    return templates.TemplateResponse(request, "report.html")
+
+
+# ✅ Prometheus 메트릭
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+# ✅ 유용성 데이터 API: 정책별 가동률/고장/MTBF/MTTR/OEE 비교
+@app.post("/get_usefulness_data")
+async def get_usefulness_data(request: Request):
+    data = await request.json() or {}
+    process = data.get("process")
+    try:
+        summary = policy_comparison.summary(process, data.get("range", "1d"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    _, _, latest, _ = await asyncio.to_thread(status_store.read)
+    summary["serverStatus"] = latest.get(process)
+    summary["risk"] = await asyncio.to_thread(feature_store.read, process)
+    return summary
+
+
+# ✅ 생산 추이 데이터 API
+@app.post("/get_production_data")
+async def get_production_data():
+    try:
+        result = await influx["client"].query_api().query(query=dashboard_service.production_flux(), org=INFLUX_ORG)
+        return dashboard_service.production_series(result, LINES)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ✅ 라인별 대기/가공/리드타임 분석 API
+@app.post("/get_flow_analytics")
+async def get_flow_analytics(request: Request):
+    try:
+        try:
+            data = await request.json() or {}
+        except ValueError:
+            data = {}
+        return await asyncio.to_thread(flow_analytics.summary, data.get("line_id"))
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ✅ 라인별 실시간 피처/고장 위험 API (Influx 조회 없음)
+@app.post("/get_line_risk")
+async def get_line_risk(request: Request):
+    try:
+        data = await request.json() or {}
+    except ValueError:
+        data = {}
+    features = await asyncio.to_thread(feature_store.read_all)
+    line_id = data.get("line_id")
+    return {line: value for line, value in features.items() if not line_id or line == line_id}
+
+
+# ✅ /chat 라우팅: LangGraph 기반 챗봇
+@app.post("/chat")
+async def chat(request: Request):
+    user_message = (await request.json()).get("message", "")
+    try:
+        return {"reply": await chatbot_service.areply(user_message)}
+    except Exception as e:
+        return JSONResponse({"reply": f"❌ LangGraph 챗봇 오류: {str(e)}"}, status_code=500)
+
+
+# ✅ 상태 구독 / 렌더 완료 ack
+@sio.on("connect")
+async def handle_connect(sid, environ):
+    print("Client connected")
+
+
+@sio.on("subscribe_status")
+async def handle_subscribe_status(sid, data):
+    await status_broadcaster.subscribe(sid, data)
+
+
+@sio.on("disconnect")
+async def handle_disconnect(sid):
+    await status_broadcaster.unsubscribe(sid)
+
+
+@sio.on("status_ack")
+async def handle_status_ack(sid, data):
+    status_broadcaster.acknowledge(data)
+
+
+# ✅ 보고서 본문(LLM)과 차트 데이터 생성
+async def generate_status_report(process, range_str):
+    events = (await status_reader().events([process], f"|> range(start: -{range_str})"))[process]
+    prompt, charts = dashboard_service.status_report(process, range_str, events)
+    started = time.perf_counter()
+    response = await openai_client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": dashboard_service.REPORT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    )
+    record_llm_call("report", time.perf_counter() - started, response)
+    return response.choices[0].message.content, charts
+
+
+# ✅ 보고서 생성 API
+@app.post("/generate_report")
+async def generate_report(request: Request):
+    data = await request.json()
+    try:
+        report_text, charts = await generate_status_report(data.get("process"), data.get("range"))
+        return {"report": report_text, **charts}
+    except Exception as e:
+        print(f"오류 발생: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+def docx_response(docx):
+    return Response(docx, media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                    headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote('제조_보고서.docx')}"})
+
+
+EXPORT_BUSY = {"error": "보고서 생성 요청이 많습니다. 잠시 후 다시 시도하세요."}
+
+
+# ✅ 보고서 다운로드 API
+@app.post("/generate_docx")
+async def generate_docx(request: Request):
+    try:
+        data = await request.json()
+        images = dashboard_service.uploaded_images(data.get("availabilityImage", ""), data.get("failureImage", ""))
+        with export_pool.admit():
+            docx = await export_pool.run_async("docx", dashboard_service.build_docx, data.get("report", ""), images)
+        return docx_response(docx)
+    except ExportQueueFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+    except Exception as e:
+        print(f"🔛 DOCX 생성 오류: {e}")
+        return JSONResponse({"error": "파일 생성 실패"}, status_code=500)
+
+
+# ✅ 보고서 작업 API: 백그라운드 생성 후 본문/차트 PNG를 서버에 보관, 다운로드는 작업 ID로
+report_jobs = ReportJobStore(redis_client, "dashboard")
+job_slots = JobSlots()
+# 실행 중인 작업 태스크 (가비지 컬렉션으로 취소되지 않도록 참조 유지)
+job_tasks = set()
+
+
+async def run_report_job(job_id, process, range_str):
+    async def progress(stage, done):
+        job = await asyncio.to_thread(report_jobs.progress, job_id, stage, done, 2)
+        await sio.emit(REPORT_JOB_EVENT, public_status(job), to=job_room(job_id))
+
+    try:
+        await progress("report", 0)
+        report_text, charts = await generate_status_report(process, range_str)
+        await progress("charts", 1)
+        with export_pool.admit():
+            pngs = await dashboard_service.render_report_charts_async(charts)
+        job = await asyncio.to_thread(
+            report_jobs.finish, job_id, {"report": report_text, **charts}, {"text": report_text, "charts": [pngs]})
+    except ExportQueueFull:
+        job = await asyncio.to_thread(report_jobs.fail, job_id, EXPORT_BUSY["error"])
+    except Exception as e:
+        print(f"오류 발생: {e}")
+        job = await asyncio.to_thread(report_jobs.fail, job_id, str(e))
+    finally:
+        job_slots.release()
+    await sio.emit(REPORT_JOB_EVENT, public_status(job), to=job_room(job_id))
+
+
+@app.post("/report_jobs")
+async def create_report_job(request: Request):
+    data = await request.json() or {}
+    process = data.get("process")
+    range_str = data.get("range") or "1h"
+    if not process:
+        return JSONResponse({"error": "Missing process"}, status_code=400)
+    try:
+        job_slots.acquire()
+    except ReportJobsFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+    try:
+        job = await asyncio.to_thread(report_jobs.create, {"process": process, "range": range_str})
+    except Exception:
+        job_slots.release()
+        raise
+    task = asyncio.create_task(run_report_job(job["job_id"], process, range_str))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return JSONResponse(public_status(job), status_code=202)
+
+
+@app.get("/report_jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = await asyncio.to_thread(report_jobs.get, job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown or expired job"}, status_code=404)
+    status = public_status(job)
+    if job["status"] == "done":
+        status["result"] = await asyncio.to_thread(report_jobs.result, job_id)
+    return status
+
+
+@sio.on("subscribe_report_job")
+async def handle_subscribe_report_job(sid, data):
+    job_id = (data or {}).get("job_id")
+    job = await asyncio.to_thread(report_jobs.get, job_id) if job_id else None
+    if job is None:
+        return
+    await sio.enter_room(sid, job_room(job_id))
+    # 구독 전에 지나간 진행 상황은 현재 상태로 한 번 보내줌
+    await sio.emit(REPORT_JOB_EVENT, public_status(job), to=sid)
+
+
+@app.get("/report_jobs/{job_id}/docx")
+async def download_report_docx(job_id: str):
+    artifacts = await asyncio.to_thread(report_jobs.artifacts, job_id)
+    if artifacts is None:
+        return JSONResponse({"error": "Unknown or unfinished job"}, status_code=404)
+    try:
+        with export_pool.admit():
+            docx = await export_pool.run_async(
+                "docx", dashboard_service.build_docx,
+                artifacts["text"], dashboard_service.chart_images(artifacts["charts"][0]))
+        return docx_response(docx)
+    except ExportQueueFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+
+
+# ✅ Socket.IO(/socket.io)와 FastAPI 라우트를 한 ASGI 앱으로 제공
+asgi_app = socketio.ASGIApp(sio, other_asgi_app=app)
+
+# ✅ 서버 실행
+if __name__ == "__main__":
+    uvicorn.run(asgi_app, host="0.0.0.0", port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,133 @@
+import re
+import threading
+from datetime import datetime, timezone, timedelta
+from policy_comparison import parse_duration, floor_bucket, BUCKET
+from metrics import CHATBOT_REPLIES, CHATBOT_REPLY_SECONDS
+
+# ===============================
+# 챗봇 정형 질문 빠른 경로
+# ===============================
+# "최근 1시간 P2-A 가동률", "P1-A 고장 몇 번 났어?"처럼 라인(또는 전체) + 기간 + 지표 하나를 묻는 질문은
+# 규칙으로 의도/슬롯을 뽑아 정책 비교 저장소(PolicyComparisonStore, 메모리 집계)에서 바로 답함 (LLM/Influx 호출 없음).
+#  - 의도: availability, failures, mtbf, mttr, production 중 정확히 하나가 매칭될 때만
+#  - 라인: 토폴로지 라인 ID (없으면 '전체/공장'이 있을 때만 전체), 기간: '최근 N분/시간/일', '하루', '일주일' (없으면 1시간)
+#  - '왜/원인/비교/추천' 같은 열린 질문, 저장소 보관 기간을 넘는 기간, 집계가 없는 경우는 LLM으로 넘김
+#  - 전체 생산량은 제품이 단계마다 한 번씩 finish되므로 sink 직전 단계(마지막 설비 단계) 라인의 finish만 합산
+# 저장소는 1시간 버킷이라 기간 시작을 정시로 내림 (최근 1시간 = 한 시간 전이 속한 정시부터 현재까지).
+# 그래서 1시간 미만 기간은 LLM으로 넘기고, 답변에는 실제 집계 시작 시각(KST)을 함께 적음.
+# 경로별 응답 수/지연은 메트릭(facman_chatbot_replies_total, facman_chatbot_reply_seconds)과 로그로 남김.
+
+INTENT_PATTERNS = {
+    "availability": re.compile(r"가동\s*률|가동\s*율|가용\s*률|availability", re.IGNORECASE),
+    "failures": re.compile(r"고장\s*(횟수|건수|수(?!리))|고장.*(몇\s*(번|회|건)|얼마나\s*자주)|failures?", re.IGNORECASE),
+    "mtbf": re.compile(r"mtbf|평균\s*고장\s*간격", re.IGNORECASE),
+    "mttr": re.compile(r"mttr|평균\s*수리\s*시간|수리\s*시간", re.IGNORECASE),
+    "production": re.compile(r"생산\s*량|생산\s*수|생산.*몇\s*개|산출\s*량|production", re.IGNORECASE),
+}
+OPEN_ENDED = re.compile(r"왜|이유|원인|어떻게|비교|추천|예측|분석|설명|개선|대응|보고서")
+WHOLE_FACTORY = re.compile(r"전체|공장|모든\s*라인")
+KOREAN_NUMBERS = {"한": 1, "두": 2, "세": 3, "네": 4, "다섯": 5, "여섯": 6, "일곱": 7, "여덟": 8, "아홉": 9, "열": 10, "열두": 12}
+RANGE_PATTERN = re.compile(r"(\d+|열두|한|두|세|네|다섯|여섯|일곱|여덟|아홉|열)\s*(분|시간|일)")
+RANGE_WORDS = (("일주일", "7d"), ("1주일", "7d"), (r"한\s*주", "7d"), ("하루", "1d"))
+RANGE_UNITS = {"분": "m", "시간": "h", "일": "d"}
+RANGE_LABELS = {"m": "분", "h": "시간", "d": "일"}
+DEFAULT_RANGE = "1h"
+KST = timezone(timedelta(hours=9))
+
+
+def _range_slot(message):
+    for word, range_str in RANGE_WORDS:
+        if re.search(word, message):
+            return range_str
+    match = RANGE_PATTERN.search(message)
+    if match is None:
+        return DEFAULT_RANGE
+    value, unit = match.groups()
+    value = int(value) if value.isdigit() else KOREAN_NUMBERS[value]
+    return f"{value}{RANGE_UNITS[unit]}"
+
+
+def _range_label(range_str):
+    """'최근 3시간(07:00 이후)'처럼 실제 집계 시작 시각(정시로 내림)을 함께 표시"""
+    duration = parse_duration(range_str)
+    since = floor_bucket(datetime.now(timezone.utc) - duration).astimezone(KST)
+    since_label = since.strftime("%H:00" if duration < timedelta(days=1) else "%m/%d %H:00")
+    return f"최근 {range_str[:-1]}{RANGE_LABELS[range_str[-1]]}({since_label} 이후)"
+
+
+def _minutes(seconds):
+    return f"{seconds / 60:.1f}분" if seconds >= 60 else f"{seconds:.1f}초"
+
+
+class ChatFastPath:
+    def __init__(self, metrics_store, topology):
+        self._metrics_store = metrics_store
+        lines = topology.equipment_lines
+        self._line_pattern = re.compile(
+            "|".join(re.escape(line) for line in sorted(lines, key=len, reverse=True)), re.IGNORECASE
+        )
+        # 마지막 설비 단계의 finish = sink 도착 (전체 생산량)
+        self._output_lines = next(stage.lines for stage in reversed(topology.stages) if not stage.sink)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._total = 0
+
+    def parse(self, message):
+        """(의도, 라인 또는 None(전체), 기간) 또는 빠른 경로로 답할 수 없는 질문이면 None"""
+        if OPEN_ENDED.search(message):
+            return None
+        intents = [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(message)]
+        if len(intents) != 1:
+            return None
+        lines = {line.upper() for line in self._line_pattern.findall(message)}
+        if len(lines) > 1 or (not lines and not WHOLE_FACTORY.search(message)):
+            return None
+        range_str = _range_slot(message)
+        try:
+            duration = parse_duration(range_str)
+        except ValueError:
+            return None
+        # 1시간 미만은 시간 버킷으로 답하면 요청보다 훨씬 긴 구간이 되므로 LLM으로
+        if duration < BUCKET or duration > self._metrics_store.lookback:
+            return None
+        return intents[0], (lines.pop() if lines else None), range_str
+
+    def answer(self, message):
+        """템플릿 문장 답변. 빠른 경로로 답할 수 없으면 None"""
+        parsed = self.parse(message)
+        if parsed is None:
+            return None
+        intent, line, range_str = parsed
+        metrics = self._metrics_store.totals(line, range_str)
+        if metrics["availability"] is None:
+            # 집계가 아직 없으면 (시작 직후, 이벤트 없는 라인) LLM이 원시 로그로 답하도록
+            return None
+        subject = f"{_range_label(range_str)} 동안 {line or '전체 라인'}"
+
+        if intent == "availability":
+            return f"{subject}의 평균 가동률은 {metrics['availability'] * 100:.1f}%입니다.", intent
+        if intent == "failures":
+            return f"{subject}의 고장 횟수는 {metrics['failures']}회입니다.", intent
+        if intent == "mtbf":
+            if metrics["mtbf_seconds"] is None:
+                return f"{subject}의 고장이 0회라 MTBF(평균 고장 간격)를 계산할 수 없습니다.", intent
+            return f"{subject}의 MTBF(평균 고장 간격)는 {_minutes(metrics['mtbf_seconds'])}입니다.", intent
+        if intent == "mttr":
+            if metrics["mttr_seconds"] is None:
+                return f"{subject}의 수리 완료가 0회라 MTTR(평균 수리 시간)을 계산할 수 없습니다.", intent
+            return f"{subject}의 MTTR(평균 수리 시간)은 {_minutes(metrics['mttr_seconds'])}입니다.", intent
+        if line is None:
+            produced = sum(self._metrics_store.totals(output, range_str)["finish"] for output in self._output_lines)
+            return f"{subject}의 생산량(최종 공정 도착)은 {produced:,}개입니다.", intent
+        return f"{subject}의 생산량은 {metrics['finish']:,}개입니다.", intent
+
+    def record(self, path, seconds, intent=None):
+        """경로별 응답 수/지연 메트릭과 누적 적중률 로그"""
+        CHATBOT_REPLIES.labels(path=path, intent=intent or "open").inc()
+        CHATBOT_REPLY_SECONDS.labels(path=path).observe(seconds)
+        with self._lock:
+            self._total += 1
+            self._hits += path == "fastpath"
+            hit_rate = self._hits / self._total
+        print(f"[Chat] path={path} intent={intent or '-'} {seconds * 1000:.1f}ms "
+              f"(fast path hit rate {hit_rate:.1%} of {self._total})")
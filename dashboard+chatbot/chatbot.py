@@ -0,0 +1,207 @@
+import time
+from typing import Annotated
+from typing_extensions import TypedDict
+from langgraph.graph import StateGraph
+from langgraph.graph.message import add_messages
+from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.checkpoint.memory import MemorySaver
+from langchain.agents import Tool
+from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from process_log import events_flux
+from feature_store import describe
+from metrics import record_llm_call
+
+# ===============================
+# LangGraph 챗봇 (공정 로그/흐름 분석/고장 위험 Tool)
+# ===============================
+# Flask 서버는 reply(), ASGI 서버는 areply()를 사용. 그래프는 같고 LLM 호출만 동기/비동기로 나뉨.
+# fast_path(chat_fastpath.py)가 있으면 가동률/고장 횟수 같은 정형 질문은 그래프 없이 템플릿으로 답함.
+
+SYSTEM_PROMPT = (
+    "너는 제조 공정 데이터를 해석해주는 전문 챗봇이야.\n"
+    "📌 사용자의 질문에 대해 **항상 단 하나의 명확한 문장**으로 요약된 답변을 제공해.\n"
+    "예: '최근 1시간 동안 P2-A의 평균 가동률은 74.3%입니다.'\n"
+    "\n"
+    "✅ 반드시 아래 기준을 지켜:\n"
+    "- 계산 과정이나 로그 데이터를 설명하거나 나열하지 마.\n"
+    "- 수식, 표, 코드 블록은 절대 포함하지 마.\n"
+    "- '~다음과 같습니다:', '~입니다:', '~아래와 같습니다:' 같은 표현은 사용하지 마.\n"
+    "- 답변 문장은 반드시 마침표로 끝내고, 말줄임표(...) 사용하지 마.\n"
+    "- 리스트를 나열할 땐 꼭 줄바꿈해서 표시해.\n"
+    "- 단위(%, 회 등)는 생략하지 말고 반드시 표시해.\n"
+    "- 중복되거나 불필요한 표현은 줄이고, 최대한 간결하게 말해.\n"
+    "\n"
+    "⛔ 아래는 금지된 표현 예시야:\n"
+    "- 다음과 같습니다: ... (금지)\n"
+    "- 아래 내용을 참고하세요. (금지)\n"
+    "- 90%의 가동률입니다. 감사합니다. (감사는 금지)\n"
+    "\n"
+    "🧠 너의 역할은 분석 보고서를 쓰는 게 아니라, 데이터를 해석해서 정확한 문장으로 전달하는 것이야.\n"
+    "마지막으로, **반드시 최소 하나의 '정확한 수치'를 포함**한 문장으로 답변해."
+)
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+class ChatbotService:
+    def __init__(self, influx_client, flow_analytics, feature_store=None, fast_path=None):
+        self._influx_client = influx_client
+        self._flow_analytics = flow_analytics
+        self._feature_store = feature_store
+        self._fast_path = fast_path
+
+    # ✅ InfluxDB 쿼리용 Tool 함수
+    def query_process_logs(self, process_id: str):
+        query_api = self._influx_client.query_api()
+
+        if not process_id or not isinstance(process_id, str):
+            return "올바른 process_id 또는 line_id를 입력해주세요 (예: 'P1' 또는 'P1-A')"
+
+        if "-" in process_id:
+            query = events_flux("|> range(start: -12h)", where=f'r.line_id == "{process_id}"')
+        else:
+            query = events_flux("|> range(start: -12h)", where=f'r.process_id == "{process_id}"')
+
+        try:
+            tables = query_api.query(query)
+            logs = []
+            for table in tables:
+                for record in table.records:
+                    logs.append(f"{record.get_time()}: {record.get_value()}")
+            return "\n".join(logs) if logs else f"{process_id}에 대한 로그가 없습니다."
+        except Exception as e:
+            return f"로그 조회 중 오류 발생: {e}"
+
+    # ✅ 흐름 분석 Tool 함수
+    def query_flow_analytics(self, line_id: str = ""):
+        line_id = (line_id or "").strip().strip("'\"").upper()
+        summary = self._flow_analytics.summary(line_id if "-" in line_id else None)
+
+        def fmt(stats):
+            if not stats.get("count"):
+                return "데이터 없음"
+            return f"평균 {stats['mean_sec']}초, p50 {stats['p50_sec']}초, p90 {stats['p90_sec']}초"
+
+        lines = []
+        for lid, stats in summary["lines"].items():
+            lines.append(
+                f"{lid}: 대기 {fmt(stats['queue_wait'])} / 가공 {fmt(stats['processing'])} / "
+                f"중단율 {stats['interrupt_rate'] * 100:.1f}% / 재작업률 {stats['rework_rate'] * 100:.1f}%"
+            )
+        lines.append(f"투입→산출 리드타임: {fmt(summary['lead_time'])} (완료 {summary['completed']}개)")
+        if summary["bottleneck"]:
+            lines.append(f"병목 라인(대기 p90 최대): {summary['bottleneck']}")
+        return "\n".join(lines)
+
+    # ✅ 라인별 고장 위험 Tool 함수 (피처 저장소, Influx 조회 없음)
+    def query_line_risk(self, line_id: str = ""):
+        line_id = (line_id or "").strip().strip("'\"").upper()
+        if self._feature_store is None:
+            return "피처 저장소가 설정되지 않았습니다."
+        features = self._feature_store.read_all()
+        if line_id:
+            features = {line: value for line, value in features.items() if line == line_id}
+        if not features:
+            return f"{line_id or '라인'}의 피처 데이터가 없습니다."
+        return "\n".join(describe(line, value) for line, value in sorted(features.items()))
+
+    # ✅ LangGraph 챗봇 생성 함수
+    def create_graph(self):
+        tools = [Tool(
+            name="query_process_logs",
+            func=self.query_process_logs,
+            description="Input은 'P1' 또는 'P1-A'와 같은 process_id나 line_id입니다."
+        ), Tool(
+            name="query_flow_analytics",
+            func=self.query_flow_analytics,
+            description="라인별 대기 시간, 가공 시간, 중단율, 재작업률, 투입→산출 리드타임과 병목 라인을 조회합니다. Input은 'P1-A' 같은 line_id 또는 전체 조회 시 빈 문자열입니다."
+        ), Tool(
+            name="query_line_risk",
+            func=self.query_line_risk,
+            description="라인별 실시간 고장 위험 점수와 리셋 후 가동시간, 최근 1시간 고장 횟수, MTBF/MTTR, 대기열 길이, 중단율을 조회합니다. Input은 'P1-A' 같은 line_id 또는 전체 조회 시 빈 문자열입니다."
+        )]
+
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
+            MessagesPlaceholder("messages"),
+        ])
+
+        llm = ChatOpenAI(model="gpt-4o", temperature=0).bind_tools(tools)
+        chain = prompt | llm
+
+        def chatbot_node(state: State):
+            started = time.perf_counter()
+            response = chain.invoke(state["messages"])
+            record_llm_call("chatbot", time.perf_counter() - started, response)
+            return {"messages": [response]}
+
+        async def achatbot_node(state: State):
+            started = time.perf_counter()
+            response = await chain.ainvoke(state["messages"])
+            record_llm_call("chatbot", time.perf_counter() - started, response)
+            return {"messages": [response]}
+
+        graph = StateGraph(State)
+        graph.add_node("chatbot", RunnableLambda(chatbot_node, afunc=achatbot_node))
+        graph.add_node("tools", ToolNode(tools=tools))
+        graph.add_conditional_edges("chatbot", tools_condition)
+        graph.add_edge("tools", "chatbot")
+        graph.set_entry_point("chatbot")
+        graph.set_finish_point("chatbot")
+
+        return graph.compile(checkpointer=MemorySaver())
+
+    @staticmethod
+    def _inputs(user_message):
+        config = RunnableConfig(recursion_limit=10, configurable={"thread_id": "web-user"})
+        return {"messages": [{"role": "user", "content": user_message}]}, config
+
+    @staticmethod
+    def _last_reply(event, response_text):
+        for value in event.values():
+            if "messages" in value and value["messages"]:
+                response_text = value["messages"][-1].content
+        return response_text
+
+    def _fast_reply(self, user_message, started):
+        if self._fast_path is None:
+            return None
+        answer = self._fast_path.answer(user_message)
+        if answer is None:
+            return None
+        response_text, intent = answer
+        self._fast_path.record("fastpath", time.perf_counter() - started, intent)
+        return response_text
+
+    def _record_llm_reply(self, started):
+        if self._fast_path is not None:
+            self._fast_path.record("llm", time.perf_counter() - started)
+
+    def reply(self, user_message):
+        started = time.perf_counter()
+        response_text = self._fast_reply(user_message, started)
+        if response_text is not None:
+            return response_text
+        inputs, config = self._inputs(user_message)
+        response_text = ""
+        for event in self.create_graph().stream(inputs, config=config):
+            response_text = self._last_reply(event, response_text)
+        self._record_llm_reply(started)
+        return response_text
+
+    async def areply(self, user_message):
+        """Tool(동기 Influx 조회)은 LangGraph가 실행기 스레드에서 호출. 빠른 경로는 메모리 집계만 읽어 이벤트 루프에서 바로 처리"""
+        started = time.perf_counter()
+        response_text = self._fast_reply(user_message, started)
+        if response_text is not None:
+            return response_text
+        inputs, config = self._inputs(user_message)
+        response_text = ""
+        async for event in self.create_graph().astream(inputs, config=config):
+            response_text = self._last_reply(event, response_text)
+        self._record_llm_reply(started)
+        return response_text
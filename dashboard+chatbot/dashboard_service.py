@@ -0,0 +1,148 @@
+import base64
+from io import BytesIO
+from docx import Document
+from docx.shared import Inches
+from process_log import events_flux
+from chart_renderer import renderer
+
+# ===============================
+# 대시보드 응답 생성 (웹 프레임워크 무관)
+# ===============================
+# Flask(app.py)와 ASGI(app_asgi.py) 서버가 같은 응답을 만들도록 쿼리 구성과 집계, DOCX 생성을 모아 둠.
+
+# 생산 추이 기준 시간대 (09:00 ~ 18:00)
+TIME_SLOTS = [f"{h:02}:00" for h in range(9, 19)]
+REPORT_SYSTEM_PROMPT = "너는 제조공정 보고서를 작성하는 AI 비서야."
+
+
+def production_flux():
+    # 🔍 실제 생산 완료만 카운트 (status == "finish")
+    return events_flux("|> range(start: -12h)", statuses=["finish"]) + '''
+        |> group(columns:["line_id"])
+        |> aggregateWindow(every: 1h, fn: count, createEmpty: false)
+        '''
+
+
+def production_series(tables, lines):
+    """라인별 시간대 생산량: {"labels": [...], line_id: [...]}"""
+    label_set = set(TIME_SLOTS)
+    data_by_line = {line: {} for line in lines}
+
+    for table in tables:
+        for record in table.records:
+            time_label = record.get_time().strftime("%H:%M")
+            line_id = record.values.get("line_id")
+            value = int(record.get_value())
+            if line_id in data_by_line and time_label in label_set:
+                data_by_line[line_id][time_label] = value
+
+    response = {"labels": TIME_SLOTS}
+    for line_id in data_by_line:
+        response[line_id] = [data_by_line[line_id].get(t, 0) for t in TIME_SLOTS]
+    return response
+
+
+def status_report(process, range_str, events):
+    """상태 이벤트로 (보고서 프롬프트, 차트 데이터) 계산"""
+    total = 0
+    available_sum = 0
+    failure_count = 0
+    time_labels = []
+    available_values = []
+    failure_values = []
+    for event in events:
+        available = event.available
+        event_type = event.event_type
+        timestamp = event.time.strftime("%H:%M")
+        total += 1
+        available_sum += available
+        if event_type == "failure":
+            failure_count += 1
+        time_labels.append(timestamp)
+        available_values.append(round(available, 2))
+        failure_values.append(1 if event_type == "failure" else 0)
+    avg_avail = round((available_sum / total) * 100, 1) if total else 0
+    prompt = f"""
+공정명: {process}
+기간: 최근 {range_str}
+가동률 평균: {avg_avail}%
+고장 횟수: {failure_count}회
+
+위 데이터를 바탕으로 제조 공정 보고서를 작성해줘. 다음 항목을 포함해줘:
+1. 공정 요약
+2. 주요 이슈
+3. 대응 조치
+4. 향후 제언
+"""
+    return prompt, {"labels": time_labels, "available": available_values, "failures": failure_values}
+
+
+# 보고서 차트 이름 → DOCX 소제목
+CHART_TITLES = {"availability": "✅ 가동률 변화", "failures": "📊 고장 발생 분포"}
+
+
+def hourly_failures(labels, failures):
+    """이벤트 단위 고장 여부(0/1)를 시간대별 건수로 묶음: (시간대 목록, 건수 목록)"""
+    hour_map = {}
+    for label, failure in zip(labels, failures):
+        hour = label[:2] + ":00"
+        hour_map[hour] = hour_map.get(hour, 0) + failure
+    return list(hour_map.keys()), list(hour_map.values())
+
+
+def report_chart_specs(charts):
+    """status_report 차트 데이터로 서버 렌더링할 차트 목록: {이름: (템플릿, 파라미터)}"""
+    specs = {}
+    if charts["available"]:
+        percent = round(sum(charts["available"]) / len(charts["available"]) * 100, 1)
+        specs["availability"] = ("donut", {"percent": percent, "labels": ["가동률", "비가동률"], "colors": ["green", "#e0e0e0"]})
+    hours, counts = hourly_failures(charts["labels"], charts["failures"])
+    if hours:
+        specs["failures"] = ("failure_line", {"labels": hours, "values": counts})
+    return specs
+
+
+def render_report_charts(charts):
+    """보고서 차트를 export_pool에서 렌더링: {이름: PNG bytes}"""
+    specs = report_chart_specs(charts)
+    return dict(zip(specs, renderer.render_many(list(specs.values()))))
+
+
+async def render_report_charts_async(charts):
+    specs = report_chart_specs(charts)
+    return dict(zip(specs, await renderer.render_many_async(list(specs.values()))))
+
+
+def chart_images(pngs):
+    """{이름: PNG bytes} → build_docx에 넘길 [(소제목, PNG bytes)]"""
+    return [(CHART_TITLES[name], png) for name, png in pngs.items()]
+
+
+def decode_image(b64_string):
+    """브라우저가 보낸 차트 data URL을 PNG bytes로 변환 (없거나 잘못되면 None)"""
+    if not b64_string or "base64," not in b64_string:
+        return None
+    try:
+        return base64.b64decode(b64_string.split(",")[-1])
+    except Exception as img_err:
+        print(f"이미지 디코딩 오류: {img_err}")
+        return None
+
+
+def uploaded_images(avail_img_b64, fail_img_b64):
+    """/generate_docx로 업로드된 차트 이미지 → [(소제목, PNG bytes)]"""
+    pngs = {"availability": decode_image(avail_img_b64), "failures": decode_image(fail_img_b64)}
+    return chart_images({name: png for name, png in pngs.items() if png})
+
+
+def build_docx(text, images):
+    """보고서 본문과 [(소제목, PNG bytes)] 차트로 DOCX bytes 생성 (export_pool 워커에서 실행)"""
+    doc = Document()
+    doc.add_heading("📄 스마트 제조 보고서", 0)
+    doc.add_paragraph(text)
+    for title, png in images:
+        doc.add_paragraph(title)
+        doc.add_picture(BytesIO(png), width=Inches(2.75))
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
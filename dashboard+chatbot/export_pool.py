@@ -0,0 +1,85 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from metrics import EXPORT_SECONDS, EXPORT_IN_FLIGHT, EXPORT_REJECTED
+
+# ===============================
+# 문서/차트 생성 프로세스 풀
+# ===============================
+# dashboard+chatbot/과 reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# matplotlib, python-docx, openpyxl 작업은 순수 CPU 작업이라 웹 프로세스(eventlet 허브, asyncio 루프)에서
+# 돌리면 그동안 Socket.IO 하트비트와 상태 emit이 멈춤. 모든 생성 작업을 이 풀의 워커 프로세스에서 실행.
+#  - 동시 실행 수 = EXPORT_WORKERS (워커 프로세스 수, 기본 CPU 코어 수)
+#  - admit()으로 받은 내보내기 요청은 최대 EXPORT_MAX_PENDING개(실행 + 대기). 넘으면 ExportQueueFull → 503
+# eventlet.monkey_patch() 환경에서 future.result()는 green Condition을 기다리므로 허브를 막지 않음.
+# ASGI 서버는 run_async()로 기다림.
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", os.cpu_count() or 2))
+EXPORT_MAX_PENDING = int(os.getenv("EXPORT_MAX_PENDING", "16"))
+
+
+class ExportQueueFull(Exception):
+    pass
+
+
+def _timed(fn, args):
+    """워커에서 실행. 결과와 실행 시간을 함께 반환해 부모가 대기/실행 시간을 나눠 기록"""
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class ExportPool:
+    def __init__(self, workers=EXPORT_WORKERS, max_pending=EXPORT_MAX_PENDING):
+        self._workers = workers
+        self._max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+        return self._executor
+
+    @contextmanager
+    def admit(self):
+        """내보내기 요청 한 건의 자리를 잡음. 대기열이 가득 차면 ExportQueueFull"""
+        with self._lock:
+            if self._pending >= self._max_pending:
+                EXPORT_REJECTED.inc()
+                raise ExportQueueFull(f"export queue full ({self._max_pending})")
+            self._pending += 1
+            EXPORT_IN_FLIGHT.set(self._pending)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+                EXPORT_IN_FLIGHT.set(self._pending)
+
+    def submit(self, kind, fn, *args):
+        """fn(*args)를 워커 프로세스에서 실행하는 Future. fn과 인자는 pickle 가능해야 함"""
+        submitted = time.perf_counter()
+        future = self._get_executor().submit(_timed, fn, args)
+
+        def record(done):
+            if done.cancelled() or done.exception() is not None:
+                return
+            _, run_seconds = done.result()
+            EXPORT_SECONDS.labels(kind=kind, stage="run").observe(run_seconds)
+            EXPORT_SECONDS.labels(kind=kind, stage="wait").observe(max(time.perf_counter() - submitted - run_seconds, 0.0))
+        future.add_done_callback(record)
+        return future
+
+    def run(self, kind, fn, *args):
+        return self.submit(kind, fn, *args).result()[0]
+
+    async def run_async(self, kind, fn, *args):
+        result, _ = await asyncio.wrap_future(self.submit(kind, fn, *args))
+        return result
+
+
+pool = ExportPool()
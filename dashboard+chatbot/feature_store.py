@@ -0,0 +1,171 @@
+import os
+import json
+import math
+from collections import deque
+
+# ===============================
+# 라인별 피처 저장소 / 고장 위험 점수
+# ===============================
+# FeatureUpdater.py가 라인 이벤트 스트림(event_stream.py)으로 LineFeatures를 증분 갱신하고, 학습된 RiskModel
+# (RiskModelTraining.py)로 점수를 매겨 Redis 해시 하나(facman:line_features)에 라인별 JSON으로 저장.
+# 에이전트/챗봇/대시보드는 FeatureStore로 Influx 조회 없이 최신 피처와 위험 점수를 읽음.
+# simulation/과 dashboard+chatbot/에 같은 파일을 둠 (웹 앱은 읽기만 함). 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+#   runtime         마지막 리셋(수리/정비 완료) 이후 누적 가동시간(초)
+#   steps           마지막 리셋 이후 끝난 스텝 수 (finish + interrupt)
+#   failures_1h     최근 ROLLING_WINDOW초 고장 횟수
+#   mtbf / mttr     최근 ROLLING_EVENTS번의 가동 재개→고장 / 고장→가동 재개 평균(초). 이력이 없으면 None
+#   queue_depth     입력 큐 길이
+#   interrupt_rate  스텝 결과(finish=0, interrupt=1)의 EWMA
+#   risk            앞으로 horizon초 안에 고장날 확률 (모델이 없으면 키 없음)
+FEATURES_KEY = "facman:line_features"
+ROLLING_WINDOW = 3600
+ROLLING_EVENTS = 10
+INTERRUPT_ALPHA = 0.1
+RISK_MODEL_PATH = os.getenv(
+    "RISK_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_model.json")
+)
+
+DOWN_EVENTS = ("failure:", "repair:start", "maintenance:start")
+RESET_EVENTS = ("repair:finish", "maintenance:finish")
+# 모델 입력 순서 (RiskModelTraining.py가 같은 순서로 학습)
+MODEL_INPUTS = ("runtime", "runtime_sq", "steps", "failures_1h", "mtbf", "mttr", "has_history",
+                "queue_depth", "interrupt_rate")
+
+
+class LineFeatures:
+    """라인 하나의 피처를 이벤트마다 O(1)로 갱신"""
+    def __init__(self):
+        self.runtime = 0.0
+        self.steps = 0
+        self.available = True
+        self.queue_depth = 0
+        self.interrupt_rate = 0.0
+        self._failures = deque()
+        self._uptimes = deque(maxlen=ROLLING_EVENTS)
+        self._repairs = deque(maxlen=ROLLING_EVENTS)
+        self._up_since = None
+        self._failed_at = None
+
+    def observe(self, event):
+        ts = event["ts"]
+        self.runtime = event["runtime"]
+        if event["kind"] != "status":
+            if event["event"] in ("finish", "interrupt"):
+                self.steps += 1
+                interrupted = 1.0 if event["event"] == "interrupt" else 0.0
+                self.interrupt_rate += INTERRUPT_ALPHA * (interrupted - self.interrupt_rate)
+            return
+
+        name = event["event"]
+        if name == "failure:":
+            self._failures.append(ts)
+            if self._up_since is not None:
+                self._uptimes.append(ts - self._up_since)
+            self._failed_at = ts
+        if name in DOWN_EVENTS:
+            self.available = False
+            self._up_since = None
+        elif name.startswith("processing:"):
+            # 병목 해제(blocked → processing)는 가동 구간을 끊지 않음
+            if self._failed_at is not None:
+                self._repairs.append(ts - self._failed_at)
+                self._failed_at = None
+            if self._up_since is None:
+                self._up_since = ts
+            self.available = True
+        if name in RESET_EVENTS:
+            self.steps = 0
+
+    def snapshot(self, now):
+        while self._failures and self._failures[0] < now - ROLLING_WINDOW:
+            self._failures.popleft()
+        return {
+            "runtime": round(self.runtime, 3),
+            "steps": self.steps,
+            "failures_1h": len(self._failures),
+            "mtbf": round(sum(self._uptimes) / len(self._uptimes), 3) if self._uptimes else None,
+            "mttr": round(sum(self._repairs) / len(self._repairs), 3) if self._repairs else None,
+            "queue_depth": self.queue_depth,
+            "interrupt_rate": round(self.interrupt_rate, 4),
+            "available": self.available,
+        }
+
+
+def model_inputs(features):
+    return [
+        features["runtime"],
+        features["runtime"] ** 2,
+        features["steps"],
+        features["failures_1h"],
+        features["mtbf"] or 0.0,
+        features["mttr"] or 0.0,
+        0.0 if features["mtbf"] is None else 1.0,
+        features["queue_depth"],
+        features["interrupt_rate"],
+    ]
+
+
+class RiskModel:
+    """표준화한 피처의 로지스틱 회귀. 순수 파이썬 내적이라 점수 한 번에 수 마이크로초"""
+    def __init__(self, params):
+        if tuple(params["features"]) != MODEL_INPUTS:
+            raise ValueError(f"risk model features {params['features']} != {list(MODEL_INPUTS)}")
+        self.horizon = params["horizon"]
+        self.sim_speed = params.get("sim_speed")
+        self._mean = params["mean"]
+        self._std = params["std"]
+        self._weights = params["weights"]
+        self._bias = params["bias"]
+
+    @classmethod
+    def load(cls, path=RISK_MODEL_PATH):
+        """모델 파일이 없으면 None (피처만 저장)"""
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def score(self, features):
+        z = self._bias
+        for x, mean, std, weight in zip(model_inputs(features), self._mean, self._std, self._weights):
+            z += weight * (x - mean) / std
+        return 1.0 / (1.0 + math.exp(-max(min(z, 50.0), -50.0)))
+
+
+class FeatureStore:
+    """라인별 최신 피처. REDIS_URL이 없으면 읽기 결과가 비어 있음"""
+    def __init__(self, redis_client):
+        self._redis_client = redis_client
+
+    def write(self, snapshots):
+        if self._redis_client is None or not snapshots:
+            return
+        self._redis_client.hset(
+            FEATURES_KEY, mapping={line: json.dumps(snapshot) for line, snapshot in snapshots.items()}
+        )
+
+    def read(self, line):
+        if self._redis_client is None:
+            return None
+        payload = self._redis_client.hget(FEATURES_KEY, line)
+        return json.loads(payload) if payload else None
+
+    def read_all(self):
+        if self._redis_client is None:
+            return {}
+        return {line: json.loads(payload) for line, payload in self._redis_client.hgetall(FEATURES_KEY).items()}
+
+
+def describe(line, features):
+    """챗봇/에이전트용 한 줄 요약"""
+    def seconds(value):
+        return "이력 없음" if value is None else f"{value:.0f}초"
+
+    risk = features.get("risk")
+    head = f"{line}: 고장 위험 {risk * 100:.1f}% (향후 {features['risk_horizon']:.0f}초)," if risk is not None else f"{line}:"
+    return (
+        f"{head} 리셋 후 가동 {features['runtime']:.0f}초/{features['steps']}스텝, "
+        f"최근 1시간 고장 {features['failures_1h']}회, MTBF {seconds(features['mtbf'])}, "
+        f"MTTR {seconds(features['mttr'])}, 대기열 {features['queue_depth']}개, "
+        f"중단율 {features['interrupt_rate'] * 100:.1f}%, {'가동 중' if features['available'] else '정지'}"
+    )
@@ -0,0 +1,218 @@
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone, timedelta
+from process_log import events_flux
+
+# 늦게 쓰인 이벤트를 다시 읽는 구간 (이보다 더 늦게 도착한 이벤트는 누락)
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+class LogHistogram:
+    """
+    HDR 방식의 로그 버킷 히스토그램.
+    값 범위가 정해져 있으면 버킷 수가 고정되므로 샘플 수와 무관하게 메모리가 일정하다.
+    """
+    def __init__(self, precision=0.02, min_value=0.01):
+        self._log_base = math.log1p(precision)
+        self._min_value = min_value
+        self._buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value):
+        return int(math.log(max(value, self._min_value) / self._min_value) / self._log_base)
+
+    def _bucket_value(self, index):
+        # 버킷의 중간값으로 복원 (상대 오차 precision/2 이내)
+        return self._min_value * math.exp((index + 0.5) * self._log_base)
+
+    def add(self, value):
+        self._buckets[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_sec": round(self.total / self.count, 2),
+            "p50_sec": round(self.percentile(50), 2),
+            "p90_sec": round(self.percentile(90), 2),
+            "p99_sec": round(self.percentile(99), 2),
+            "max_sec": round(self.max, 2),
+        }
+
+
+class LineStats:
+    def __init__(self):
+        self.queue_wait = LogHistogram()
+        self.processing = LogHistogram()
+        self.arrivals = 0
+        self.starts = 0
+        self.finishes = 0
+        self.interrupts = 0
+        self.reworks = 0
+
+    def summary(self):
+        return {
+            "arrivals": self.arrivals,
+            "starts": self.starts,
+            "finishes": self.finishes,
+            "interrupts": self.interrupts,
+            "interrupt_rate": round(self.interrupts / self.starts, 4) if self.starts else 0,
+            "rework_rate": round(self.reworks / self.starts, 4) if self.starts else 0,
+            "queue_wait": self.queue_wait.summary(),
+            "processing": self.processing.summary(),
+        }
+
+
+class FlowAnalytics:
+    """
+    process_log 이벤트(input/arrival/start/finish/interrupt)를 product_id 기준으로 스트리밍 조인해
+    라인별 대기 시간, 가공 시간, 중단/재작업 비율과 투입→sink 도착 리드타임을 누적한다.
+    sink_process는 산출(sink 도착)이 기록되는 공정 ID (Topology.sink_process).
+    진행 중인 제품 상태는 max_open_items 개까지만 유지하고 오래된 것부터 버린다.
+    """
+    def __init__(self, sink_process, max_open_items=50000):
+        self._sink_process = sink_process
+        self._max_open_items = max_open_items
+        self._items = OrderedDict()
+        self._lines = defaultdict(LineStats)
+        self._lead_time = LogHistogram()
+        self._completed = 0
+        self._evicted = 0
+
+    def _item(self, product_id):
+        item = self._items.get(product_id)
+        if item is None:
+            item = {"input": None, "arrival": {}, "start": {}, "started_lines": set()}
+            self._items[product_id] = item
+            while len(self._items) > self._max_open_items:
+                self._items.popitem(last=False)
+                self._evicted += 1
+        return item
+
+    def add_event(self, time, product_id, process_id, line_id, status):
+        if not product_id:
+            return
+        item = self._item(product_id)
+
+        if status == "input":
+            item["input"] = time
+        elif status == "arrival" and process_id == self._sink_process and not line_id:
+            # 최종 공정 도착 = 생산 완료
+            if item["input"] is not None:
+                self._lead_time.add((time - item["input"]).total_seconds())
+            self._completed += 1
+            self._items.pop(product_id, None)
+        elif status == "arrival" and line_id:
+            self._lines[line_id].arrivals += 1
+            item["arrival"][line_id] = time
+        elif status == "start" and line_id:
+            line = self._lines[line_id]
+            line.starts += 1
+            if line_id in item["started_lines"]:
+                line.reworks += 1
+            item["started_lines"].add(line_id)
+            arrived = item["arrival"].pop(line_id, None)
+            if arrived is not None:
+                line.queue_wait.add((time - arrived).total_seconds())
+            item["start"][line_id] = time
+        elif status == "finish" and line_id:
+            line = self._lines[line_id]
+            line.finishes += 1
+            started = item["start"].pop(line_id, None)
+            if started is not None:
+                line.processing.add((time - started).total_seconds())
+        elif status == "interrupt" and line_id:
+            self._lines[line_id].interrupts += 1
+            item["start"].pop(line_id, None)
+
+    def summary(self, line_id=None):
+        lines = {lid: stats.summary() for lid, stats in sorted(self._lines.items())
+                 if line_id in (None, lid)}
+
+        # 대기 시간 p90이 가장 긴 라인을 병목으로 판단
+        bottleneck = None
+        waits = [(s["queue_wait"].get("p90_sec", 0), lid) for lid, s in lines.items() if s["queue_wait"]["count"]]
+        if waits:
+            bottleneck = max(waits)[1]
+
+        return {
+            "lines": lines,
+            "lead_time": self._lead_time.summary(),
+            "completed": self._completed,
+            "open_items": len(self._items),
+            "evicted_items": self._evicted,
+            "bottleneck": bottleneck,
+        }
+
+
+class FlowAnalyticsService:
+    """
+    Influx process 버킷에서 마지막 조회 이후의 이벤트만 가져와 FlowAnalytics에 누적.
+    라인마다 쓰기 지연이 달라 늦게 도착하는 이벤트가 있으므로 커서보다 overlap만큼 앞에서부터 다시 읽고,
+    그 구간에서 이미 반영한 포인트((_time, product_id, status, line_id))는 건너뜀.
+    """
+    def __init__(self, influx_client, org, sink_process, lookback="12h", overlap=REFRESH_OVERLAP):
+        self._influx_client = influx_client
+        self._org = org
+        self._lookback = lookback
+        self._overlap = overlap
+        self._analytics = FlowAnalytics(sink_process)
+        self._cursor = None
+        # overlap 구간 안에서 반영한 포인트 키 → 시각 (구간을 벗어나면 지움)
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            if self._cursor is None:
+                range_clause = f"|> range(start: -{self._lookback})"
+            else:
+                start = (self._cursor - self._overlap).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                range_clause = f"|> range(start: time(v: \"{start}\"))"
+
+            query = events_flux(range_clause) + '''
+              |> keep(columns: ["_time", "_value", "product_id", "process_id", "line_id"])
+            '''
+            tables = self._influx_client.query_api().query(org=self._org, query=query)
+            records = sorted(
+                (record for table in tables for record in table.records),
+                key=lambda r: r.get_time()
+            )
+            for record in records:
+                time = record.get_time()
+                product_id, line_id = record.values.get("product_id"), record.values.get("line_id")
+                key = (time, product_id, record.get_value(), line_id)
+                if key in self._seen:
+                    continue
+                self._seen[key] = time
+                self._analytics.add_event(time, product_id, record.values.get("process_id"), line_id, record.get_value())
+
+            if records:
+                self._cursor = max(self._cursor or records[-1].get_time(), records[-1].get_time())
+            elif self._cursor is None:
+                self._cursor = datetime.now(timezone.utc) - timedelta(seconds=1)
+            oldest = self._cursor - self._overlap
+            self._seen = {key: time for key, time in self._seen.items() if time >= oldest}
+
+    def summary(self, line_id=None):
+        self.refresh()
+        with self._lock:
+            return self._analytics.summary(line_id)
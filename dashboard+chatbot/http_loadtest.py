@@ -0,0 +1,145 @@
+import time
+import random
+import asyncio
+import argparse
+import aiohttp
+
+# ===============================
+# HTTP 부하 테스트 (eventlet vs ASGI)
+# ===============================
+# 같은 요청 구성을 여러 서버에 동시 요청 수(concurrency) 단계별로 보내 처리량(req/s)과 p50/p99 지연을 비교.
+# 각 워커는 응답을 받으면 바로 다음 요청을 보내는 closed-loop 방식.
+#   python http_loadtest.py --app dashboard --target eventlet=http://a:5000 --target asgi=http://b:5000
+#   python http_loadtest.py --app report --target eventlet=http://a:5001 --target asgi=http://b:5001 --steps 10,50,200
+# LLM을 호출하는 라우트(/chat, /generate_report)는 비용 때문에 --include_llm일 때만 포함.
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", action="append", required=True, help="name=url (repeat to compare)")
+    parser.add_argument("--app", choices=["dashboard", "report"], default="dashboard", help="Request mix to send")
+    parser.add_argument("--steps", type=str, default="10,50,100,200", help="Concurrent request counts")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of load before measuring")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds")
+    parser.add_argument("--line", type=str, default="P1-A", help="Line used in request bodies")
+    parser.add_argument("--range", type=str, default="1h", help="Range used in request bodies")
+    parser.add_argument("--include_llm", action="store_true", help="Also call routes that invoke the LLM")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def request_mix(app, line, range_str, include_llm):
+    """[(가중치, method, path, json 본문)]"""
+    if app == "dashboard":
+        mix = [
+            (4, "POST", "/get_production_data", {}),
+            (3, "POST", "/get_usefulness_data", {"process": line, "range": "1d"}),
+            (2, "POST", "/get_flow_analytics", {"line_id": line}),
+            (1, "GET", "/", None),
+        ]
+        if include_llm:
+            mix += [(1, "POST", "/chat", {"message": f"최근 {line} 가동률 알려줘"}),
+                    (1, "POST", "/generate_report", {"process": line, "range": range_str})]
+        return mix
+
+    body = {"process": line, "range": range_str}
+    mix = [
+        (3, "POST", "/get_mtbf_data", body),
+        (3, "POST", "/get_mttr_data", body),
+        (2, "POST", "/get_downtime_data", body),
+        (2, "POST", "/get_production_data", {"range": range_str}),
+        (1, "GET", "/report", None),
+    ]
+    if include_llm:
+        mix.append((1, "POST", "/generate_report", {"processes": [line], "range": range_str}))
+    return mix
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+async def worker(session, base_url, mix, weights, stop_at, measure_from, rng, result):
+    while True:
+        now = time.perf_counter()
+        if now >= stop_at:
+            return
+        _, method, path, body = rng.choices(mix, weights=weights)[0]
+        started = time.perf_counter()
+        try:
+            async with session.request(method, base_url + path, json=body) as response:
+                await response.read()
+                ok = response.status < 500
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        finished = time.perf_counter()
+        if started < measure_from or finished > stop_at:
+            continue
+        if ok:
+            result["latencies"].append(finished - started)
+            result["per_path"].setdefault(path, []).append(finished - started)
+        else:
+            result["errors"] += 1
+
+
+async def run_step(base_url, concurrency, args, mix):
+    weights = [weight for weight, *_ in mix]
+    result = {"latencies": [], "errors": 0, "per_path": {}}
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        measure_from = time.perf_counter() + args.warmup
+        stop_at = measure_from + args.duration
+        await asyncio.gather(*(
+            worker(session, base_url, mix, weights, stop_at, measure_from, random.Random(args.seed + i), result)
+            for i in range(concurrency)
+        ))
+
+    completed = len(result["latencies"])
+    total = completed + result["errors"]
+    return {
+        "concurrency": concurrency,
+        "rps": completed / args.duration,
+        "p50": percentile(result["latencies"], 50),
+        "p99": percentile(result["latencies"], 99),
+        "error_rate": result["errors"] / total if total else 0,
+        "per_path_p99": {path: percentile(values, 99) for path, values in sorted(result["per_path"].items())},
+    }
+
+
+def fmt(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+async def main(args):
+    targets = [target.split("=", 1) for target in args.target]
+    steps = [int(s) for s in args.steps.split(",")]
+    mix = request_mix(args.app, args.line, args.range, args.include_llm)
+
+    results = {}
+    for name, url in targets:
+        print(f"\n=== {name}: {url} ===")
+        results[name] = []
+        for concurrency in steps:
+            step = await run_step(url.rstrip("/"), concurrency, args, mix)
+            results[name].append(step)
+            print(
+                f"concurrency={concurrency:>5} {step['rps']:8.1f} req/s  p50={fmt(step['p50'])} "
+                f"p99={fmt(step['p99'])} errors={step['error_rate']:.1%}"
+            )
+            print("    p99 per path: " + ", ".join(f"{p} {fmt(v)}" for p, v in step["per_path_p99"].items()))
+
+    base_name = targets[0][0]
+    print(f"\n=== 비교 (기준: {base_name}) ===")
+    for name, _ in targets[1:]:
+        for base, step in zip(results[base_name], results[name]):
+            rps_ratio = step["rps"] / base["rps"] if base["rps"] else float("inf")
+            p99_ratio = step["p99"] / base["p99"] if base["p99"] and step["p99"] else float("nan")
+            print(f"{name} concurrency={step['concurrency']:>5} req/s x{rps_ratio:.2f}  p99 x{p99_ratio:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,237 @@
+import os
+import time
+from contextvars import ContextVar
+from collections import deque
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# ===============================
+# 웹 앱 메트릭 (/metrics)
+# ===============================
+FLUX_QUERY_SECONDS = Histogram(
+    "facman_flux_query_seconds",
+    "Flux query latency per endpoint",
+    ["endpoint"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+FLUX_QUERY_ERRORS = Counter(
+    "facman_flux_query_errors_total",
+    "Flux query failures per endpoint",
+    ["endpoint"],
+)
+
+SOCKETIO_EMITS = Counter(
+    "facman_socketio_emits_total",
+    "Socket.IO messages emitted",
+    ["event"],
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "facman_llm_call_seconds",
+    "LLM call latency",
+    ["component"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_TOKENS = Counter(
+    "facman_llm_tokens_total",
+    "LLM tokens consumed",
+    ["component", "kind"],
+)
+
+# 문서/차트 생성 프로세스 풀 (export_pool.py)
+EXPORT_SECONDS = Histogram(
+    "facman_export_seconds",
+    "Export job time spent waiting for a worker and running in it",
+    ["kind", "stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+EXPORT_IN_FLIGHT = Gauge(
+    "facman_export_in_flight",
+    "Export requests admitted and not finished (running + queued)",
+)
+EXPORT_REJECTED = Counter(
+    "facman_export_rejected_total",
+    "Export requests rejected because the queue was full",
+)
+
+# 백그라운드 보고서 작업 (report_jobs.py)
+REPORT_JOB_SECONDS = Histogram(
+    "facman_report_job_seconds",
+    "Background report job duration from creation to done/error",
+    ["status"],
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+REPORT_CACHE_LOOKUPS = Counter(
+    "facman_report_cache_lookups_total",
+    "Standard-range report cache lookups per process",
+    ["result"],
+)
+REPORT_WARM_SECONDS = Histogram(
+    "facman_report_warm_seconds",
+    "Time to pre-generate one standard range for every line",
+    ["range"],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+
+# 챗봇 응답 경로 (chat_fastpath.py): fastpath = 규칙 파서 + 지표 저장소, llm = LangGraph
+CHATBOT_REPLIES = Counter(
+    "facman_chatbot_replies_total",
+    "Chatbot replies by answering path",
+    ["path", "intent"],
+)
+CHATBOT_REPLY_SECONDS = Histogram(
+    "facman_chatbot_reply_seconds",
+    "Chatbot reply latency by answering path",
+    ["path"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2, 4, 8, 16, 32),
+)
+
+# ===============================
+# 지연 추적 (상태 이벤트 → 대시보드 렌더 / 에이전트 점검 수신)
+# ===============================
+# 시뮬레이터가 상태 로그를 쓸 때 trace_id와 이벤트 시각을 남기고, 각 구간을 지날 때마다
+# 이벤트 시각 기준 경과 시간을 기록. 서버 간 시계는 NTP로 맞춰져 있다고 가정 (음수는 0으로 기록).
+# path: dashboard(상태 로그 → 폴링 → emit → 브라우저 ack), agent(상태 로그 → InfluxNode → publish → 수신)
+TRACE_SLO_SECONDS = float(os.getenv("TRACE_SLO_SECONDS", "5"))
+TRACE_SLO_TARGET = float(os.getenv("TRACE_SLO_TARGET", "0.99"))
+TRACE_SLO_WINDOW = int(os.getenv("TRACE_SLO_WINDOW", "1000"))
+TRACE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+TRACE_HOP_SECONDS = Histogram(
+    "facman_trace_hop_seconds",
+    "Latency of one hop of a traced status event",
+    ["path", "hop"],
+    buckets=TRACE_BUCKETS,
+)
+TRACE_E2E_SECONDS = Histogram(
+    "facman_trace_e2e_seconds",
+    "Latency from the status event to the end of the path",
+    ["path"],
+    buckets=TRACE_BUCKETS,
+)
+TRACE_SLO_VIOLATIONS = Counter(
+    "facman_trace_slo_violations_total",
+    "Traced events slower than TRACE_SLO_SECONDS end to end",
+    ["path"],
+)
+TRACE_SLO_COMPLIANCE = Gauge(
+    "facman_trace_slo_compliance",
+    "Share of the last TRACE_SLO_WINDOW traced events within TRACE_SLO_SECONDS",
+    ["path"],
+)
+
+_slo_windows = {}
+_slo_breached = set()
+
+
+def observe_hop(path, hop, seconds):
+    TRACE_HOP_SECONDS.labels(path=path, hop=hop).observe(max(seconds, 0.0))
+
+
+def observe_e2e(path, seconds):
+    """종단 지연을 기록하고 최근 구간의 SLO 준수율을 갱신. 목표 아래로 떨어지거나 회복하면 로그 출력"""
+    seconds = max(seconds, 0.0)
+    TRACE_E2E_SECONDS.labels(path=path).observe(seconds)
+    within = seconds <= TRACE_SLO_SECONDS
+    if not within:
+        TRACE_SLO_VIOLATIONS.labels(path=path).inc()
+
+    window = _slo_windows.setdefault(path, deque(maxlen=TRACE_SLO_WINDOW))
+    window.append(within)
+    compliance = sum(window) / len(window)
+    TRACE_SLO_COMPLIANCE.labels(path=path).set(compliance)
+
+    breached = compliance < TRACE_SLO_TARGET
+    if breached != (path in _slo_breached):
+        (_slo_breached.add if breached else _slo_breached.discard)(path)
+        state = "BREACHED" if breached else "recovered"
+        print(f"[SLO] {path} {state}: {compliance:.1%} of last {len(window)} events within {TRACE_SLO_SECONDS}s "
+              f"(target {TRACE_SLO_TARGET:.0%})")
+
+
+# ASGI 서버는 요청마다 라우트 이름을 여기에 설정 (asgi_support.EndpointRoute)
+current_endpoint = ContextVar("current_endpoint", default=None)
+# Flask 서버는 요청 컨텍스트에서 엔드포인트 이름을 찾는 함수를 등록 (flask_metrics.py). 이 모듈은 Flask에 의존하지 않음
+_endpoint_resolvers = []
+
+
+def register_endpoint_resolver(resolver):
+    """resolver()는 현재 요청의 엔드포인트 이름 또는 None"""
+    _endpoint_resolvers.append(resolver)
+
+
+def _current_endpoint():
+    for resolver in _endpoint_resolvers:
+        endpoint = resolver()
+        if endpoint:
+            return endpoint
+    return current_endpoint.get() or "background"
+
+
+class InstrumentedQueryApi:
+    """query_api()를 감싸 호출한 엔드포인트별로 Flux 쿼리 지연을 기록"""
+    def __init__(self, query_api):
+        self._query_api = query_api
+
+    def query(self, *args, **kwargs):
+        endpoint = _current_endpoint()
+        started = time.perf_counter()
+        try:
+            return self._query_api.query(*args, **kwargs)
+        except Exception:
+            FLUX_QUERY_ERRORS.labels(endpoint=endpoint).inc()
+            raise
+        finally:
+            FLUX_QUERY_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._query_api, name)
+
+
+class AsyncInstrumentedQueryApi(InstrumentedQueryApi):
+    """InfluxDBClientAsync의 query_api()용"""
+    async def query(self, *args, **kwargs):
+        endpoint = _current_endpoint()
+        started = time.perf_counter()
+        try:
+            return await self._query_api.query(*args, **kwargs)
+        except Exception:
+            FLUX_QUERY_ERRORS.labels(endpoint=endpoint).inc()
+            raise
+        finally:
+            FLUX_QUERY_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+
+
+def instrument_influx(influx_client):
+    query_api = influx_client.query_api
+    influx_client.query_api = lambda *args, **kwargs: InstrumentedQueryApi(query_api(*args, **kwargs))
+    return influx_client
+
+
+def instrument_influx_async(influx_client):
+    query_api = influx_client.query_api
+    influx_client.query_api = lambda *args, **kwargs: AsyncInstrumentedQueryApi(query_api(*args, **kwargs))
+    return influx_client
+
+
+def record_llm_call(component, seconds, response=None):
+    """
+    OpenAI 응답(usage.prompt_tokens/completion_tokens) 또는
+    LangChain AIMessage(usage_metadata)의 토큰 수를 함께 기록
+    """
+    LLM_CALL_SECONDS.labels(component=component).observe(seconds)
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.labels(component=component, kind="input").inc(usage.get("input_tokens", 0))
+        LLM_TOKENS.labels(component=component, kind="output").inc(usage.get("output_tokens", 0))
+        return
+    usage = getattr(response, "usage", None) or (response.get("usage") if isinstance(response, dict) else None)
+    if usage:
+        get = usage.get if isinstance(usage, dict) else lambda key, default=0: getattr(usage, key, default)
+        LLM_TOKENS.labels(component=component, kind="input").inc(get("prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(component=component, kind="output").inc(get("completion_tokens", 0) or 0)
+
+
+def metrics_payload():
+    """(본문, Content-Type)"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
@@ -0,0 +1,298 @@
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from process_log import events_flux
+from status_log import StatusLogReader
+
+# ===============================
+# 정비 정책별 성과 비교 저장소
+# ===============================
+# 상태 로그(policy 태그)와 생산 로그를 1시간 버킷으로 미리 집계해 두고,
+# 백그라운드에서 마지막 조회 이후 데이터만 반영. 페이지 요청은 메모리 읽기만 수행.
+# policy 태그가 없던 과거 데이터는 "untagged"로 분류.
+
+BUCKET = timedelta(hours=1)
+UNTAGGED = "untagged"
+STATUS_OVERLAP = timedelta(minutes=1)
+# OEE 성능 효율 계산용 이상 사이클 타임 (시뮬레이터 기본 step 10s / sim_speed 5)
+IDEAL_CYCLE_SECONDS = float(os.getenv("IDEAL_CYCLE_SECONDS", "2.0"))
+
+RANGE_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_duration(range_str):
+    """'1h', '7d' 같은 상대 기간을 timedelta로 변환"""
+    value, unit = range_str[:-1], range_str[-1]
+    if unit not in RANGE_UNITS or not value.isdigit():
+        raise ValueError(f"Invalid range: {range_str}")
+    return timedelta(**{RANGE_UNITS[unit]: int(value)})
+
+
+def floor_bucket(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def _flux_time(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class BucketStats:
+    __slots__ = ("up_seconds", "down_seconds", "failures", "repairs", "repair_seconds",
+                 "maintenances", "finish", "interrupt")
+
+    def __init__(self):
+        self.up_seconds = 0.0
+        self.down_seconds = 0.0
+        self.failures = 0
+        self.repairs = 0
+        self.repair_seconds = 0.0
+        self.maintenances = 0
+        self.finish = 0
+        self.interrupt = 0
+
+    def merge(self, other):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def metrics(self):
+        observed = self.up_seconds + self.down_seconds
+        availability = self.up_seconds / observed if observed else None
+        produced = self.finish + self.interrupt
+        quality = self.finish / produced if produced else None
+        performance = min(1.0, self.finish * IDEAL_CYCLE_SECONDS / self.up_seconds) if self.up_seconds else None
+        oee = availability * performance * quality if None not in (availability, performance, quality) else None
+        return {
+            "availability": round(availability, 4) if availability is not None else None,
+            "failures": self.failures,
+            "maintenances": self.maintenances,
+            "mtbf_seconds": round(self.up_seconds / self.failures, 1) if self.failures else None,
+            "mttr_seconds": round(self.repair_seconds / self.repairs, 1) if self.repairs else None,
+            "performance": round(performance, 4) if performance is not None else None,
+            "quality": round(quality, 4) if quality is not None else None,
+            "oee": round(oee, 4) if oee is not None else None,
+            "finish": self.finish,
+            "interrupt": self.interrupt,
+        }
+
+
+class _LineCursor:
+    """라인별로 직전 상태 이벤트를 기억해 다음 이벤트까지의 구간을 가동/비가동으로 누적"""
+    __slots__ = ("time", "available", "policy", "failure_time")
+
+    def __init__(self):
+        self.time = None
+        self.available = None
+        self.policy = None
+        self.failure_time = None
+
+
+class PolicyComparisonStore:
+    def __init__(self, influx_client, org, lines, lookback="7d", refresh_every=60):
+        self._influx_client = influx_client
+        self._org = org
+        self._status_reader = StatusLogReader(influx_client.query_api(), org)
+        self._lines = list(lines)
+        self._lookback = parse_duration(lookback)
+        self._refresh_every = refresh_every
+
+        # (line, policy, bucket_start) → BucketStats
+        self._buckets = defaultdict(BucketStats)
+        # (line, bucket_start) → 해당 시간대에 적용된 정책 (생산 로그에는 정책 태그가 없음)
+        self._line_policy = {}
+        # (line, bucket_start) → (finish, interrupt): 시간대 집계를 덮어써 가며 갱신
+        self._production = {}
+        self._cursors = {line: _LineCursor() for line in self._lines}
+        self._production_cursor = None
+        self._status_cursor = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    # ---------- 상태 로그 ----------
+    def _accumulate(self, line, cursor, until, target):
+        """cursor 시점부터 until까지 직전 상태를 유지했다고 보고 시간대별로 나눠 누적"""
+        start = cursor.time
+        while start < until:
+            bucket = floor_bucket(start)
+            end = min(until, bucket + BUCKET)
+            stats = target[(line, cursor.policy, bucket)]
+            self._line_policy[(line, bucket)] = cursor.policy
+            if cursor.available:
+                stats.up_seconds += (end - start).total_seconds()
+            else:
+                stats.down_seconds += (end - start).total_seconds()
+            start = end
+
+    def _apply_status(self, line, time, event_type, event_status, available, policy):
+        cursor = self._cursors[line]
+        if cursor.time is not None and time > cursor.time:
+            self._accumulate(line, cursor, time, self._buckets)
+
+        bucket = floor_bucket(time)
+        stats = self._buckets[(line, policy, bucket)]
+        if event_type == "failure":
+            stats.failures += 1
+            cursor.failure_time = time
+        elif event_type == "repair" and event_status == "finish" and cursor.failure_time is not None:
+            stats.repairs += 1
+            stats.repair_seconds += (time - cursor.failure_time).total_seconds()
+            cursor.failure_time = None
+        elif event_type == "maintenance" and event_status == "start":
+            stats.maintenances += 1
+
+        cursor.time = time
+        cursor.available = bool(available)
+        cursor.policy = policy
+        self._line_policy[(line, bucket)] = policy
+
+    def _fetch_status(self, now):
+        # 전체 라인을 직전 조회 시각부터 한 번에 조회. 늦게 기록된 이벤트를 놓치지 않도록 겹쳐 읽고,
+        # 이미 반영한 이벤트는 _apply_status_rows에서 라인별 커서로 건너뜀
+        if self._status_cursor is None:
+            start = now - self._lookback
+        else:
+            start = self._status_cursor - STATUS_OVERLAP
+        events = self._status_reader.events(self._lines, f'|> range(start: time(v: "{_flux_time(start)}"))')
+        return {
+            line: [
+                (event.time, event.event_type, event.event_status, event.available, event.policy or UNTAGGED)
+                for event in line_events
+            ]
+            for line, line_events in events.items()
+        }
+
+    def _apply_status_rows(self, rows):
+        for line, events in rows.items():
+            cursor = self._cursors[line]
+            for time, *event in events:
+                # range start는 포함 구간이므로 이미 반영한 이벤트는 건너뜀
+                if cursor.time is not None and time <= cursor.time:
+                    continue
+                self._apply_status(line, time, *event)
+
+    # ---------- 생산 로그 ----------
+    def _fetch_production(self, now):
+        # 진행 중인 시간대는 매번 다시 집계해 덮어씀
+        start = floor_bucket(self._production_cursor or (now - self._lookback))
+        range_clause = f'|> range(start: time(v: "{_flux_time(start)}"))'
+        query = events_flux(range_clause, statuses=["finish", "interrupt"]) + '''
+          |> map(fn: (r) => ({r with status: r._value}))
+          |> group(columns: ["line_id", "status"])
+          |> aggregateWindow(every: 1h, fn: count, timeSrc: "_start", createEmpty: false)
+        '''
+        tables = self._influx_client.query_api().query(org=self._org, query=query)
+        counts = defaultdict(lambda: [0, 0])
+        for table in tables:
+            for record in table.records:
+                line = record.values.get("line_id")
+                if line not in self._cursors:
+                    continue
+                key = (line, floor_bucket(record.get_time()))
+                counts[key][0 if record.values.get("status") == "finish" else 1] += int(record.get_value())
+        return counts
+
+    # ---------- 조회 ----------
+    def refresh(self):
+        # 조회는 락 밖에서 수행해 갱신 중에도 summary()가 기다리지 않도록 함
+        now = datetime.now(timezone.utc)
+        status_rows = self._fetch_status(now)
+        production = self._fetch_production(now)
+        with self._lock:
+            self._apply_status_rows(status_rows)
+            self._status_cursor = now
+            for key, (finish, interrupt) in production.items():
+                self._production[key] = (finish, interrupt)
+            self._production_cursor = now
+            self._evict(now)
+            self._refreshed_at = now
+
+    def _evict(self, now):
+        oldest = floor_bucket(now - self._lookback)
+        for key in [key for key in self._buckets if key[2] < oldest]:
+            del self._buckets[key]
+        for store in (self._line_policy, self._production):
+            for key in [key for key in store if key[1] < oldest]:
+                del store[key]
+
+    def _stats(self, buckets, line, policy, bucket):
+        stats = BucketStats().merge(buckets[(line, policy, bucket)])
+        # 생산 실적은 그 시간대의 정책으로 귀속
+        if self._line_policy.get((line, bucket)) == policy:
+            stats.finish, stats.interrupt = self._production.get((line, bucket), (0, 0))
+        return stats
+
+    def _buckets_now(self, now):
+        """마지막 이벤트 이후 현재까지 이어지는 상태 구간도 반영한 사본 (저장소에는 누적하지 않음). 락 안에서 호출"""
+        buckets_now = defaultdict(BucketStats)
+        for key, stats in self._buckets.items():
+            buckets_now[key].merge(stats)
+        for cursor_line, cursor in self._cursors.items():
+            if cursor.time is not None and cursor.time < now:
+                self._accumulate(cursor_line, cursor, now, buckets_now)
+        return buckets_now
+
+    @property
+    def lookback(self):
+        return self._lookback
+
+    def totals(self, line=None, range_str="1d"):
+        """정책 구분 없이 라인(None이면 전체)의 기간 합계 지표. 기간은 시간 버킷 단위로 올림"""
+        now = datetime.now(timezone.utc)
+        since = floor_bucket(now - parse_duration(range_str))
+        total = BucketStats()
+        with self._lock:
+            buckets_now = self._buckets_now(now)
+            for key in list(buckets_now):
+                if key[2] >= since and (line is None or key[0] == line):
+                    total.merge(self._stats(buckets_now, *key))
+        return total.metrics()
+
+    def summary(self, line=None, range_str="1d"):
+        now = datetime.now(timezone.utc)
+        since = floor_bucket(now - parse_duration(range_str))
+        with self._lock:
+            buckets_now = self._buckets_now(now)
+
+            keys = [key for key in list(buckets_now) if key[2] >= since and (line is None or key[0] == line)]
+            buckets = sorted({key[2] for key in keys})
+
+            policies = {}
+            for policy in sorted({key[1] for key in keys}):
+                series = {bucket: BucketStats() for bucket in buckets}
+                for key_line, key_policy, bucket in keys:
+                    if key_policy == policy:
+                        series[bucket].merge(self._stats(buckets_now, key_line, policy, bucket))
+                total = BucketStats()
+                for stats in series.values():
+                    total.merge(stats)
+                per_bucket = [series[bucket].metrics() for bucket in buckets]
+                policies[policy] = {
+                    **total.metrics(),
+                    "series": {
+                        "availability": [m["availability"] for m in per_bucket],
+                        "oee": [m["oee"] for m in per_bucket],
+                        "failures": [m["failures"] for m in per_bucket],
+                    },
+                }
+
+            overall = [BucketStats() for _ in buckets]
+            index = {bucket: i for i, bucket in enumerate(buckets)}
+            for key_line, key_policy, bucket in keys:
+                overall[index[bucket]].merge(self._stats(buckets_now, key_line, key_policy, bucket))
+
+            return {
+                "labels": [bucket.isoformat() for bucket in buckets],
+                "availability": [m["availability"] for m in (stats.metrics() for stats in overall)],
+                "policies": policies,
+                "refreshed_at": self._refreshed_at.isoformat() if self._refreshed_at else None,
+            }
+
+    def run(self, sleep):
+        """socketio.sleep을 받아 백그라운드 태스크로 주기 갱신"""
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[PolicyComparison] refresh error: {e}")
+            sleep(self._refresh_every)
@@ -0,0 +1,91 @@
+import os
+import socket
+import uuid
+import redis
+
+# ===============================
+# 다중 레플리카 배포 지원
+# ===============================
+# dashboard+chatbot/과 reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# REDIS_URL이 설정되면
+#  - Socket.IO가 Redis pub/sub을 메시지 큐로 사용해 어느 레플리카의 emit이든 모든 클라이언트에 전달되고
+#  - 리스(lease)를 잡은 레플리카 하나만 InfluxDB 상태 폴링(emit_status)을 수행하며
+#  - 최신 상태는 Redis에 공유되어 신규 연결 시 Influx 조회 없이 바로 전송됨 (status_protocol.py).
+# 클라이언트는 websocket 전송만 사용하므로 로드밸런서에 sticky session이 필요 없음.
+# REDIS_URL이 없으면 기존처럼 단일 프로세스로 동작.
+
+LEADER_KEY_PREFIX = "facman:leader:"
+
+RENEW_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def redis_url():
+    return os.getenv("REDIS_URL") or None
+
+
+def connect_redis(url=None):
+    url = url or redis_url()
+    if not url:
+        return None
+    return redis.from_url(url, decode_responses=True)
+
+
+class LeaderLease:
+    """
+    Redis SET NX PX 기반 리더 선출. 리더는 ttl 안에 계속 갱신해야 하며,
+    갱신이 끊기면(프로세스 종료, 네트워크 단절) ttl 후 다른 레플리카가 리스를 가져감.
+    """
+    def __init__(self, redis_client, name, ttl=5.0):
+        self._redis_client = redis_client
+        self._key = f"{LEADER_KEY_PREFIX}{name}"
+        self._ttl_ms = int(ttl * 1000)
+        self._id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Redis가 없으면 단일 프로세스이므로 항상 리더
+        self._is_leader = redis_client is None
+        if redis_client is not None:
+            self._renew = redis_client.register_script(RENEW_LEASE)
+            self._release = redis_client.register_script(RELEASE_LEASE)
+
+    @property
+    def is_leader(self):
+        return self._is_leader
+
+    def acquire_or_renew(self):
+        if self._redis_client is None:
+            return True
+
+        was_leader = self._is_leader
+        try:
+            if was_leader and self._renew(keys=[self._key], args=[self._id, self._ttl_ms]):
+                return True
+            self._is_leader = bool(self._redis_client.set(self._key, self._id, nx=True, px=self._ttl_ms))
+        except redis.exceptions.RedisError as e:
+            # Redis와 연결이 끊기면 리더 여부를 확신할 수 없으므로 물러남
+            print(f"[Leader] Redis error: {e}")
+            self._is_leader = False
+
+        if self._is_leader != was_leader:
+            print(f"[Leader] {self._id} {'acquired' if self._is_leader else 'lost'} {self._key}")
+        return self._is_leader
+
+    def release(self):
+        if self._redis_client is None or not self._is_leader:
+            return
+        try:
+            self._release(keys=[self._key], args=[self._id])
+        except redis.exceptions.RedisError as e:
+            print(f"[Leader] Redis error: {e}")
+        self._is_leader = False
+
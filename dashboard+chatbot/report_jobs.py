@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import uuid
+import base64
+import threading
+from metrics import REPORT_JOB_SECONDS, REPORT_CACHE_LOOKUPS
+
+# ===============================
+# 보고서 작업 / 산출물 저장소
+# ===============================
+# dashboard+chatbot/과 reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# 보고서 생성을 작업 ID가 있는 백그라운드 작업으로 실행하고, 결과 산출물을 서버에 보관.
+#   POST /report_jobs                    요청 본문은 /generate_report와 같음 → 202 {job_id}
+#   Socket.IO subscribe_report_job       {job_id} → report_job {job_id, status, stage, done, total, error}
+#   GET  /report_jobs/<job_id>           작업 상태 (완료 시 result 포함)
+#   GET  /report_jobs/<job_id>/docx|xlsx 저장된 산출물로 문서 생성 (브라우저 재업로드, Influx 재조회 없음)
+# result: 화면에 그릴 지표 + LLM 서술. artifacts: 렌더링된 차트 PNG(charts)와 DOCX/XLSX 생성에 필요한 값.
+# REDIS_URL이 있으면 Redis에 TTL과 함께 저장해 어느 레플리카에서든 조회/다운로드, 없으면 프로세스 메모리.
+# 프로세스당 실행/대기 중인 작업은 REPORT_MAX_JOBS개까지 (넘으면 ReportJobsFull → 503). 작업 안의 차트 렌더링도
+# 동기 내보내기 요청과 같은 export_pool.admit() 자리를 잡아, 작업을 쌓아 풀 상한을 우회할 수 없음.
+
+REPORT_JOB_TTL = int(os.getenv("REPORT_JOB_TTL", "86400"))
+REPORT_MAX_JOBS = int(os.getenv("REPORT_MAX_JOBS", "8"))
+REPORT_JOB_EVENT = "report_job"
+KEY_PREFIX = "facman:report_job:"
+CACHE_KEY_PREFIX = "facman:report_cache:"
+
+
+def job_room(job_id):
+    return f"report_job:{job_id}"
+
+
+def _encode_charts(charts):
+    return [{name: base64.b64encode(png).decode("ascii") for name, png in images.items()} for images in charts]
+
+
+def _decode_charts(charts):
+    return [{name: base64.b64decode(png) for name, png in images.items()} for images in charts]
+
+
+class ReportJobsFull(Exception):
+    pass
+
+
+class JobSlots:
+    """이 프로세스에서 실행/대기 중인 보고서 작업 수 상한"""
+    def __init__(self, limit=REPORT_MAX_JOBS):
+        self._limit = limit
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """작업 한 건의 자리를 잡음. 가득 차면 ReportJobsFull. 작업이 끝나면 release()"""
+        with self._lock:
+            if self._active >= self._limit:
+                raise ReportJobsFull(f"report jobs full ({self._limit})")
+            self._active += 1
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+
+class _JsonStore:
+    """JSON 값을 TTL과 함께 저장. Redis가 있으면 레플리카 간 공유, 없으면 프로세스 메모리"""
+    def __init__(self, redis_client, prefix, ttl):
+        self._redis_client = redis_client
+        self._prefix = prefix
+        self._ttl = ttl
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _set(self, key, value, ttl=None):
+        ttl = ttl or self._ttl
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        if self._redis_client is None:
+            with self._lock:
+                now = time.time()
+                self._local = {k: v for k, v in self._local.items() if v[0] > now}
+                self._local[key] = (now + ttl, payload)
+            return
+        self._redis_client.set(self._prefix + key, payload, ex=int(ttl))
+
+    def _get(self, key):
+        if self._redis_client is None:
+            with self._lock:
+                expires_at, payload = self._local.get(key, (0, None))
+            if expires_at <= time.time():
+                return None
+        else:
+            payload = self._redis_client.get(self._prefix + key)
+        return json.loads(payload) if payload else None
+
+
+class ReportJobStore(_JsonStore):
+    """작업 상태와 산출물. Redis가 있으면 레플리카 간 공유"""
+    def __init__(self, redis_client, app_name, ttl=REPORT_JOB_TTL):
+        # 같은 Redis를 쓰는 앱끼리 작업 ID가 섞이지 않도록 앱 이름으로 구분
+        super().__init__(redis_client, f"{KEY_PREFIX}{app_name}:", ttl)
+
+    def create(self, request):
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "stage": None,
+            "done": 0,
+            "total": 0,
+            "error": None,
+            "request": request,
+            "created_at": time.time(),
+        }
+        self._set(job["job_id"], job)
+        return job
+
+    def get(self, job_id):
+        return self._get(job_id)
+
+    def _update(self, job_id, **fields):
+        job = self._get(job_id) or {"job_id": job_id}
+        job.update(fields)
+        self._set(job_id, job)
+        return job
+
+    def progress(self, job_id, stage, done, total):
+        return self._update(job_id, status="running", stage=stage, done=done, total=total)
+
+    def finish(self, job_id, result, artifacts):
+        """결과와 산출물을 먼저 저장한 뒤 완료 표시 (완료를 본 클라이언트는 항상 결과를 받을 수 있음)"""
+        self._set(f"{job_id}:result", result)
+        self._set(f"{job_id}:artifacts", {**artifacts, "charts": _encode_charts(artifacts.get("charts", []))})
+        total = (self._get(job_id) or {}).get("total", 0)
+        job = self._update(job_id, status="done", stage="done", done=total)
+        REPORT_JOB_SECONDS.labels(status="done").observe(time.time() - job.get("created_at", time.time()))
+        return job
+
+    def fail(self, job_id, error):
+        job = self._update(job_id, status="error", error=error)
+        REPORT_JOB_SECONDS.labels(status="error").observe(time.time() - job.get("created_at", time.time()))
+        return job
+
+    def result(self, job_id):
+        """완료된 작업의 화면용 결과. 없거나 만료됐으면 None"""
+        return self._get(f"{job_id}:result")
+
+    def artifacts(self, job_id):
+        """완료된 작업의 문서 생성용 산출물 (차트는 PNG bytes). 없거나 만료됐으면 None"""
+        artifacts = self._get(f"{job_id}:artifacts")
+        if artifacts is None:
+            return None
+        artifacts["charts"] = _decode_charts(artifacts["charts"])
+        return artifacts
+
+
+class ReportCache(_JsonStore):
+    """
+    표준 기간 보고서 재료 캐시 (report_warmer.py가 미리 채움). 공정별 항목은 (기간, 공정)으로 저장.
+    TTL은 기간별 갱신 주기에 맞춰 넘겨받아, 다음 갱신을 놓치면 오래된 항목이 저절로 만료됨.
+    """
+    def __init__(self, redis_client, app_name):
+        super().__init__(redis_client, f"{CACHE_KEY_PREFIX}{app_name}:", REPORT_JOB_TTL)
+
+    def get_entries(self, range_str, processes):
+        """캐시에 있는 공정만 {공정: 항목}으로 반환"""
+        entries = {}
+        for process in processes:
+            entry = self._get(f"entry:{range_str}:{process}")
+            REPORT_CACHE_LOOKUPS.labels(result="hit" if entry else "miss").inc()
+            if entry:
+                entries[process] = entry
+        return entries
+
+    def put_entries(self, range_str, entries, ttl):
+        for process, entry in entries.items():
+            self._set(f"entry:{range_str}:{process}", entry, ttl)
+
+    def get_production_rows(self, range_str):
+        return self._get(f"production_rows:{range_str}")
+
+    def put_production_rows(self, range_str, rows, ttl):
+        self._set(f"production_rows:{range_str}", rows, ttl)
+
+    def last_warmed(self, range_str):
+        """기간을 마지막으로 미리 생성한 시각(epoch 초). 없으면 None"""
+        return self._get(f"warmed:{range_str}")
+
+    def mark_warmed(self, range_str, ttl):
+        self._set(f"warmed:{range_str}", time.time(), ttl)
+
+
+def public_status(job):
+    """클라이언트에 보낼 작업 상태 (요청 원문은 제외)"""
+    return {key: job.get(key) for key in ("job_id", "status", "stage", "done", "total", "error")}
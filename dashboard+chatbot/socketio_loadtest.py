@@ -0,0 +1,145 @@
+import time
+import asyncio
+import argparse
+import socketio
+
+# ===============================
+# Socket.IO 대시보드 부하 테스트
+# ===============================
+# 레플리카 구성별로 동시 접속 클라이언트 수를 단계적으로 늘려 가며
+# 연결 지연과 첫 상태 스냅샷 수신 지연(p95)이 기준 안에 드는 최대 클라이언트 수(capacity)를 측정.
+# 예) 1대 vs 3대 비교
+#   python socketio_loadtest.py --urls http://lb:5000 --urls http://a:5000,http://b:5000,http://c:5000
+# 두 번째 그룹부터 capacity / (첫 그룹 capacity × 레플리카 수)로 선형 확장 효율을 출력.
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--urls", action="append", required=True,
+                        help="Comma separated replica URLs for one configuration (repeat to compare)")
+    parser.add_argument("--steps", type=str, default="100,200,400,800,1600", help="Concurrent client counts")
+    parser.add_argument("--hold", type=float, default=15.0, help="Seconds to keep clients connected per step")
+    parser.add_argument("--connect_concurrency", type=int, default=100, help="Parallel connection attempts")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Connect timeout in seconds")
+    parser.add_argument("--max_p95", type=float, default=1.0, help="p95 latency budget in seconds")
+    parser.add_argument("--lines", type=str, default=None, help="Comma separated lines to subscribe (default: all)")
+    parser.add_argument("--max_error_rate", type=float, default=0.01, help="Allowed failed connection ratio")
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class LoadClient:
+    def __init__(self, url, lines=None):
+        self.url = url
+        self.lines = lines
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.connect_seconds = None
+        self.first_status_seconds = None
+        self.messages = 0
+        self._started = None
+        self.sio.on("status_snapshot", self._on_status)
+        self.sio.on("status_delta", self._on_status)
+
+    async def _on_status(self, data):
+        self.messages += 1
+        if self.first_status_seconds is None:
+            self.first_status_seconds = time.perf_counter() - self._started
+
+    async def connect(self, timeout):
+        self._started = time.perf_counter()
+        await self.sio.connect(self.url, transports=["websocket"], wait_timeout=timeout)
+        self.connect_seconds = time.perf_counter() - self._started
+        await self.sio.emit("subscribe_status", {"v": 1, "lines": self.lines, "since": None, "epoch": None})
+
+    async def disconnect(self):
+        if self.sio.connected:
+            await self.sio.disconnect()
+
+
+async def run_step(urls, n_clients, args):
+    lines = args.lines.split(",") if args.lines else None
+    clients = [LoadClient(urls[i % len(urls)], lines) for i in range(n_clients)]
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    failures = 0
+
+    async def connect(client):
+        nonlocal failures
+        async with semaphore:
+            try:
+                await asyncio.wait_for(client.connect(args.timeout), args.timeout)
+            except Exception:
+                failures += 1
+
+    await asyncio.gather(*(connect(c) for c in clients))
+    await asyncio.sleep(args.hold)
+
+    connected = [c for c in clients if c.connect_seconds is not None]
+    connect_times = [c.connect_seconds for c in connected]
+    first_status = [c.first_status_seconds for c in connected if c.first_status_seconds is not None]
+    per_replica = {url: sum(1 for c in connected if c.url == url) for url in urls}
+
+    await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+
+    return {
+        "clients": n_clients,
+        "connected": len(connected),
+        "error_rate": failures / n_clients,
+        "connect_p50": percentile(connect_times, 50),
+        "connect_p95": percentile(connect_times, 95),
+        "first_status_p95": percentile(first_status, 95),
+        "no_status": len(connected) - len(first_status),
+        "messages_per_client": sum(c.messages for c in connected) / len(connected) if connected else 0,
+        "per_replica": per_replica,
+    }
+
+
+def within_budget(result, args):
+    p95 = max(v for v in (result["connect_p95"], result["first_status_p95"]) if v is not None) \
+        if result["connected"] else float("inf")
+    return result["error_rate"] <= args.max_error_rate and p95 <= args.max_p95
+
+
+def fmt(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+async def main(args):
+    steps = [int(s) for s in args.steps.split(",")]
+    capacities = []
+    for group in args.urls:
+        urls = [u.strip() for u in group.split(",") if u.strip()]
+        print(f"\n=== {len(urls)} replica(s): {', '.join(urls)} ===")
+        capacity = 0
+        for n_clients in steps:
+            result = await run_step(urls, n_clients, args)
+            ok = within_budget(result, args)
+            print(
+                f"clients={result['clients']:>6} connected={result['connected']:>6} "
+                f"errors={result['error_rate']:.1%} connect p50/p95={fmt(result['connect_p50'])}/{fmt(result['connect_p95'])} "
+                f"first_status p95={fmt(result['first_status_p95'])} no_status={result['no_status']} "
+                f"msgs/client={result['messages_per_client']:.1f} {'OK' if ok else 'OVER BUDGET'}"
+            )
+            print(f"    per replica: {result['per_replica']}")
+            if not ok:
+                break
+            capacity = n_clients
+        capacities.append((len(urls), capacity))
+        print(f"capacity: {capacity} clients")
+
+    base_replicas, base_capacity = capacities[0]
+    print("\n=== scaling ===")
+    for replicas, capacity in capacities:
+        if base_capacity:
+            expected = base_capacity * replicas / base_replicas
+            print(f"{replicas} replica(s): {capacity} clients, efficiency {capacity / expected:.0%} of linear")
+        else:
+            print(f"{replicas} replica(s): {capacity} clients")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
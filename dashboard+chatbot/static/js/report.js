@@ -62,14 +62,44 @@ function drawCharts(labels, available, failures) {
     tableBody.appendChild(row);
   });
   document.getElementById("failureTable").style.display = "table";
-
-  // ✅ 이미지 저장
-  setTimeout(() => {
-    document.getElementById("availabilityImage").src =
-      gaugeChart.toBase64Image();
-  }, 500);
 }
 
+// 완료된 보고서 작업 ID (다운로드는 서버에 저장된 본문/차트로 생성)
+let currentJobId = null;
+let pendingJobId = null;
+
+// ✅ 보고서 작업 진행 상황 수신
+const reportSocket = io({ transports: ["websocket"] });
+
+reportSocket.on("connect", () => {
+  // 재연결 시 진행 중인 작업을 다시 구독 (서버가 현재 상태를 바로 보내줌)
+  if (pendingJobId) reportSocket.emit("subscribe_report_job", { job_id: pendingJobId });
+});
+
+reportSocket.on("report_job", (job) => {
+  if (job.job_id !== pendingJobId) return;
+  const reportBox = document.getElementById("reportBox");
+
+  if (job.status === "error") {
+    pendingJobId = null;
+    reportBox.textContent = job.error;
+    return;
+  }
+  if (job.status !== "done") {
+    reportBox.textContent = `보고서를 생성 중입니다... (${job.done}/${job.total || "?"})`;
+    return;
+  }
+
+  pendingJobId = null;
+  fetch(`/report_jobs/${job.job_id}`)
+    .then((res) => res.json())
+    .then((data) => {
+      currentJobId = job.job_id;
+      reportBox.textContent = data.result.report;
+      drawCharts(data.result.labels, data.result.available, data.result.failures);
+    });
+});
+
 function generateReport() {
   document.getElementById("reportBox").textContent = "보고서를 생성 중입니다...";
   document.getElementById("failureTable").style.display = "none";
@@ -77,28 +107,31 @@ function generateReport() {
   const process = document.getElementById("process").value;
   const range = document.getElementById("range").value;
 
-  fetch("/generate_report", {
+  fetch("/report_jobs", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ process, range }),
   })
     .then((res) => res.json())
-    .then((data) => {
-      document.getElementById("reportBox").textContent =
-        data.report || data.error;
-      drawCharts(data.labels, data.available, data.failures);
+    .then((job) => {
+      if (job.error) {
+        document.getElementById("reportBox").textContent = job.error;
+        return;
+      }
+      currentJobId = null;
+      pendingJobId = job.job_id;
+      reportSocket.emit("subscribe_report_job", { job_id: job.job_id });
     });
 }
 
+// ✅ 서버에 저장된 보고서 본문과 차트로 DOCX 생성 (이미지 업로드 없음)
 function downloadDocx() {
-  const reportText = document.getElementById("reportBox").textContent;
-  const availabilityImage = document.getElementById("availabilityImage").src;
+  if (!currentJobId) {
+    alert("먼저 보고서를 생성하세요.");
+    return;
+  }
 
-  fetch("/generate_docx", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ report: reportText, availabilityImage }),
-  })
+  fetch(`/report_jobs/${currentJobId}/docx`)
     .then((response) => {
       if (!response.ok) throw new Error("파일 생성 실패");
       return response.blob();
@@ -112,4 +145,4 @@ function downloadDocx() {
       link.remove();
     })
     .catch((err) => alert("다운로드 오류: " + err.message));
-}
\ No newline at end of file
+}
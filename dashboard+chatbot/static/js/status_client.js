@@ -0,0 +1,52 @@
+// ✅ 설비 상태 구독 (프로토콜 v1)
+// 연결/재연결 때마다 subscribe_status를 보내고, 스냅샷과 seq가 붙은 델타를 받아 라인별로 적용.
+// 재연결 시 마지막 seq를 since로 보내면 서버가 놓친 변경분만 델타로 보내줌.
+// lines를 null로 주면 전체 라인을 구독. 알 수 없는 라인 ID는 서버가 무시함.
+function subscribeStatus(socket, lines, onUpdate) {
+  let epoch = null;
+  let lastSeq = null;
+  let lineSeq = {};
+
+  function apply(msg) {
+    if (msg.epoch !== epoch) {
+      // 서버 상태가 초기화됨: 이전 seq는 더 이상 비교 대상이 아님
+      epoch = msg.epoch;
+      lastSeq = null;
+      lineSeq = {};
+    }
+    Object.entries(msg.lines).forEach(([line, eventType]) => {
+      // 뷰 수 상한으로 전체 뷰에 묶이면 구독하지 않은 라인도 오므로 걸러냄
+      if (lines && !lines.includes(line)) {
+        return;
+      }
+      // 구독 직후 스냅샷보다 새 델타가 먼저 도착할 수 있으므로 라인별 seq로 역전 방지
+      if (lineSeq[line] === undefined || msg.seq >= lineSeq[line]) {
+        lineSeq[line] = msg.seq;
+        onUpdate(line, eventType);
+      }
+    });
+    if (lastSeq === null || msg.seq > lastSeq) {
+      lastSeq = msg.seq;
+    }
+    if (msg.traces) {
+      ack(msg.traces);
+    }
+  }
+
+  // 추적 정보가 붙은 델타는 화면에 그려진 뒤 그대로 돌려보내 서버가 종단 지연을 기록
+  // (백그라운드 탭은 렌더가 멈추므로 ack하지 않음)
+  function ack(traces) {
+    if (document.hidden) {
+      return;
+    }
+    requestAnimationFrame(() => setTimeout(() => {
+      socket.emit('status_ack', { traces: Object.values(traces) });
+    }, 0));
+  }
+
+  socket.on('connect', () => {
+    socket.emit('subscribe_status', { v: 1, lines: lines, since: lastSeq, epoch: epoch });
+  });
+  socket.on('status_snapshot', apply);
+  socket.on('status_delta', apply);
+}
@@ -1,9 +1,11 @@
 // ✅ 유용성 도넛 차트 생성
 function updateUsefulnessCharts(labels, availability) {
   const chartCtx = document.getElementById("usefulnessChart").getContext("2d");
-  const avgAvailability = Math.round(
-    (availability.reduce((a, b) => a + b, 0) / availability.length) * 100
-  );
+  // 관측 구간이 없는 시간대(null)는 평균에서 제외
+  const observed = availability.filter((v) => v !== null);
+  const avgAvailability = observed.length
+    ? Math.round((observed.reduce((a, b) => a + b, 0) / observed.length) * 100)
+    : 0;
 
   new Chart(chartCtx, {
     type: "doughnut",
@@ -30,6 +32,33 @@ function updateUsefulnessCharts(labels, availability) {
   });
 }
 
+// ✅ 정책별 비교 표 갱신
+function updatePolicyTable(policies) {
+  const tbody = document.querySelector("#policyTable tbody");
+  if (!tbody || !policies) return;
+
+  const policyNames = {
+    "reactive": "사후 정비",
+    "rule_based": "Rule-based",
+    "agent": "AI Agent",
+    "untagged": "미분류",
+  };
+  const percent = (v) => (v === null ? "-" : `${(v * 100).toFixed(1)}%`);
+  const minutes = (v) => (v === null ? "-" : (v / 60).toFixed(1));
+
+  tbody.innerHTML = Object.entries(policies)
+    .map(([policy, m]) => `
+      <tr>
+        <td>${policyNames[policy] || policy}</td>
+        <td>${percent(m.availability)}</td>
+        <td>${m.failures}</td>
+        <td>${minutes(m.mtbf_seconds)}</td>
+        <td>${minutes(m.mttr_seconds)}</td>
+        <td>${percent(m.oee)}</td>
+      </tr>`)
+    .join("");
+}
+
 // ✅ 서버 상태 박스 색상/텍스트 갱신
 function updateServerStatus(status) {
   const statusBox = document.getElementById("P1-A_status");
@@ -40,6 +69,7 @@ function updateServerStatus(status) {
     "repair": "orange",
     "failure": "red",
     "maintenance": "yellow",
+    "blocked": "#9575cd",
   };
 
   if (statusBox) {
@@ -51,6 +81,19 @@ function updateServerStatus(status) {
   }
 }
 
+// ✅ 고장 위험 점수 표시 (피처 저장소 값, 없으면 -)
+function updateFailureRisk(risk) {
+  const riskText = document.getElementById("failureRiskText");
+  if (!riskText) return;
+  if (!risk || risk.risk === undefined) {
+    riskText.textContent = "고장 위험: -";
+    return;
+  }
+  riskText.textContent =
+    `고장 위험: ${(risk.risk * 100).toFixed(1)}% (향후 ${risk.risk_horizon}초) · ` +
+    `리셋 후 가동 ${Math.round(risk.runtime)}초`;
+}
+
 // ✅ 서버에서 유용성 데이터 요청
 function fetchUsefulnessData() {
   const process = "P1-A";
@@ -64,7 +107,11 @@ function fetchUsefulnessData() {
     .then((res) => res.json())
     .then((data) => {
       updateUsefulnessCharts(data.labels, data.availability);
-      updateServerStatus(data.serverStatus);
+      updatePolicyTable(data.policies);
+      if (data.serverStatus) {
+        updateServerStatus(data.serverStatus);
+      }
+      updateFailureRisk(data.risk);
     })
     .catch((err) => console.error("유용성 데이터 가져오기 실패:", err));
 }
@@ -146,11 +193,9 @@ window.onload = function () {
     console.log('SocketIO 서버 연결됨.');
   });
 
-  socket.on('status_update', (data) => {
-    if (data["P1-A"]) {
-      const status = data["P1-A"].event_type;
-      updateServerStatus(status);
-    }
+  // 이 페이지는 P1-A만 표시하므로 P1-A만 구독
+  subscribeStatus(socket, ["P1-A"], (line, eventType) => {
+    updateServerStatus(eventType);
   });
 };
 
@@ -0,0 +1,216 @@
+import os
+import asyncio
+from collections import namedtuple
+from influxdb_client import Point
+
+# ===============================
+# 설비 상태 로그 스키마
+# ===============================
+# simulation/, dashboard+chatbot/, reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# legacy        {line}_status 버킷 / status_log   tags: process, policy
+#               fields: event_type, event_status, available, trace_id (필드마다 별도 시리즈)
+#               라인마다 버킷을 만들어야 하고, 조회는 라인별 쿼리 + pivot.
+# consolidated  status 버킷 / line_status        tags: line, policy
+#               field: state = "event_type|event_status|available|trace_id"
+#               이벤트 한 건이 한 행이라 전체 라인을 pivot 없이 한 번에 조회. 라인 추가 시 버킷 생성 불필요.
+# 전환 순서: 쓰기 dual → 읽기 consolidated → 쓰기 consolidated
+#   STATUS_LOG_WRITE = legacy | dual | consolidated   (시뮬레이터, 기본 dual)
+#   STATUS_LOG_READ  = legacy | consolidated          (대시보드/리포트/PMAgent, 기본 legacy)
+
+STATUS_BUCKET = "status"
+LEGACY_MEASUREMENT = "status_log"
+MEASUREMENT = "line_status"
+WRITE_SCHEMAS = ("legacy", "dual", "consolidated")
+READ_SCHEMAS = ("legacy", "consolidated")
+STATE_SEPARATOR = "|"
+
+StatusEvent = namedtuple("StatusEvent", ["time", "event_type", "event_status", "available", "trace_id", "policy"])
+
+
+def legacy_bucket(line):
+    return f"{line}_status"
+
+
+def write_schema():
+    schema = os.getenv("STATUS_LOG_WRITE", "dual")
+    if schema not in WRITE_SCHEMAS:
+        raise ValueError(f"Invalid STATUS_LOG_WRITE: {schema}")
+    return schema
+
+
+def read_schema():
+    schema = os.getenv("STATUS_LOG_READ", "legacy")
+    if schema not in READ_SCHEMAS:
+        raise ValueError(f"Invalid STATUS_LOG_READ: {schema}")
+    return schema
+
+
+def encode_state(event_type, event_status, available, trace_id=""):
+    return STATE_SEPARATOR.join([event_type, event_status, str(int(available)), trace_id or ""])
+
+
+def decode_state(value):
+    """(event_type, event_status, available, trace_id)"""
+    parts = (value or "").split(STATE_SEPARATOR)
+    parts += [""] * (4 - len(parts))
+    return parts[0], parts[1], int(parts[2] or 0), parts[3] or None
+
+
+def build_writes(line, policy, event_type, event_status, available, trace_id, time, schema=None):
+    """스키마 설정에 따라 기록할 (버킷, 포인트) 목록 (dual이면 두 형식 모두)"""
+    schema = schema or write_schema()
+    writes = []
+    if schema in ("legacy", "dual"):
+        writes.append((legacy_bucket(line), (
+            Point(LEGACY_MEASUREMENT)
+            .tag("process", line)
+            .tag("policy", policy)
+            .field("event_type", event_type)
+            .field("event_status", event_status)
+            .field("available", int(available))
+            .field("trace_id", trace_id)
+            .time(time)
+        )))
+    if schema in ("consolidated", "dual"):
+        writes.append((STATUS_BUCKET, (
+            Point(MEASUREMENT)
+            .tag("line", line)
+            .tag("policy", policy)
+            .field("state", encode_state(event_type, event_status, available, trace_id))
+            .time(time)
+        )))
+    return writes
+
+
+class StatusLogReader:
+    """
+    상태 로그 조회 추상화. consolidated는 전체 라인을 한 번의 쿼리로 읽고,
+    legacy는 기존처럼 라인별 버킷을 pivot해 같은 StatusEvent 형태로 반환.
+    """
+    def __init__(self, query_api, org=None, schema=None):
+        self._query_api = query_api
+        self._org = org
+        self.schema = schema or read_schema()
+
+    def _query(self, query):
+        if self._org:
+            return self._query_api.query(org=self._org, query=query)
+        return self._query_api.query(query=query)
+
+    # ---------- consolidated ----------
+    def _consolidated_flux(self, lines, range_clause):
+        line_set = ", ".join(f'"{line}"' for line in lines)
+        return f'''
+        from(bucket: "{STATUS_BUCKET}")
+          {range_clause}
+          |> filter(fn: (r) => r._measurement == "{MEASUREMENT}" and r._field == "state")
+          |> filter(fn: (r) => contains(value: r.line, set: [{line_set}]))
+        '''
+
+    @staticmethod
+    def _consolidated_event(record):
+        event_type, event_status, available, trace_id = decode_state(record.get_value())
+        return StatusEvent(record.get_time(), event_type, event_status, available, trace_id, record.values.get("policy"))
+
+    # ---------- legacy ----------
+    @staticmethod
+    def _legacy_flux(line, range_clause):
+        return f'''
+        from(bucket: "{legacy_bucket(line)}")
+          {range_clause}
+          |> filter(fn: (r) => r._measurement == "{LEGACY_MEASUREMENT}")
+          |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+          |> group()
+          |> sort(columns: ["_time"])
+        '''
+
+    @staticmethod
+    def _legacy_event(record):
+        values = record.values
+        return StatusEvent(
+            record.get_time(),
+            values.get("event_type") or "",
+            values.get("event_status") or "",
+            int(values.get("available") or 0),
+            values.get("trace_id"),
+            values.get("policy"),
+        )
+
+    # ---------- 조회 ----------
+    def _events_queries(self, lines):
+        """events()가 실행할 [(라인 또는 None, Flux 생성 함수)] (consolidated는 쿼리 하나)"""
+        if self.schema == "consolidated":
+            return [(None, lambda range_clause: self._consolidated_flux(lines, range_clause))]
+        return [(line, lambda range_clause, line=line: self._legacy_flux(line, range_clause)) for line in lines]
+
+    def _collect_events(self, lines, results):
+        """[(라인 또는 None, 쿼리 결과)] → {line: [StatusEvent, ...]}"""
+        result = {line: [] for line in lines}
+        for line, tables in results:
+            if line is not None:
+                result[line] = [self._legacy_event(record) for table in tables for record in table.records]
+                continue
+            for table in tables:
+                for record in table.records:
+                    result[record.values.get("line")].append(self._consolidated_event(record))
+            for events in result.values():
+                # policy 태그별 시리즈를 합쳐 시간순 정렬
+                events.sort(key=lambda e: e.time)
+        return result
+
+    @staticmethod
+    def _latest_of(events_by_line):
+        return {line: events[-1] for line, events in events_by_line.items() if events}
+
+    def _collect_latest(self, tables):
+        latest = {}
+        for table in tables:
+            for record in table.records:
+                line = record.values.get("line")
+                if line not in latest or record.get_time() > latest[line].time:
+                    latest[line] = self._consolidated_event(record)
+        return latest
+
+    def events(self, lines, range_clause):
+        """라인별 이벤트를 시간순으로: {line: [StatusEvent, ...]}"""
+        lines = list(lines)
+        if not lines:
+            return {}
+        results = [(line, self._query(flux(range_clause))) for line, flux in self._events_queries(lines)]
+        return self._collect_events(lines, results)
+
+    def latest(self, lines, range_clause="|> range(start: -30s)"):
+        """라인별 가장 최근 이벤트: {line: StatusEvent} (기간 안에 이벤트가 없는 라인은 제외)"""
+        lines = list(lines)
+        if not lines:
+            return {}
+        if self.schema != "consolidated":
+            return self._latest_of(self.events(lines, range_clause))
+        return self._collect_latest(self._query(self._consolidated_flux(lines, range_clause) + "  |> last()"))
+
+
+class AsyncStatusLogReader(StatusLogReader):
+    """
+    InfluxDBClientAsync용 StatusLogReader. legacy 스키마의 라인별 쿼리는 동시에 실행.
+    query_api는 async query(query=..., org=...)를 제공해야 함.
+    """
+    async def _query(self, query):
+        if self._org:
+            return await self._query_api.query(query=query, org=self._org)
+        return await self._query_api.query(query=query)
+
+    async def events(self, lines, range_clause):
+        lines = list(lines)
+        if not lines:
+            return {}
+        queries = self._events_queries(lines)
+        tables = await asyncio.gather(*(self._query(flux(range_clause)) for _, flux in queries))
+        return self._collect_events(lines, [(line, t) for (line, _), t in zip(queries, tables)])
+
+    async def latest(self, lines, range_clause="|> range(start: -30s)"):
+        lines = list(lines)
+        if not lines:
+            return {}
+        if self.schema != "consolidated":
+            return self._latest_of(await self.events(lines, range_clause))
+        return self._collect_latest(await self._query(self._consolidated_flux(lines, range_clause) + "  |> last()"))
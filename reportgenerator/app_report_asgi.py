@@ -0,0 +1,516 @@
+import os
+import json
+import time
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from fastapi.staticfiles import StaticFiles
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+import socketio
+import uvicorn
+import rollups
+import report_service
+from report_service import normalize_range
+from status_log import AsyncStatusLogReader
+from topology import Topology
+from metrics import instrument_influx_async, record_llm_call
+from replication import LeaderLease, connect_redis
+from status_protocol import AsyncStatusBroadcaster, StatusStore
+from asgi_support import EndpointRoute, flask_templates, create_socketio, metrics_response, poll_status
+from export_pool import pool as export_pool, ExportQueueFull
+from report_jobs import ReportJobStore, ReportCache, JobSlots, ReportJobsFull, REPORT_JOB_EVENT, job_room, public_status
+from report_warmer import ReportWarmer, cache_ttl, REPORT_WARM_ENABLED, REPORT_WARM_NARRATIVE, WARM_LEASE_TTL
+
+# ===============================
+# 보고서 서버 (ASGI: FastAPI + python-socketio)
+# ===============================
+# app_report.py와 같은 라우트/Socket.IO 이벤트를 asyncio로 제공.
+#  - Influx/OpenAI는 async 클라이언트를 사용해 보고서 한 건의 조회와 공정별 LLM 호출을 동시에 실행
+#  - 차트 렌더링과 DOCX/XLSX 조립은 export_pool 프로세스 풀에서 실행하고 결과 Future를 await
+#  - 표준 기간 보고서 재료는 report_warmer가 주기적으로 미리 생성 (eventlet 서버와 리스/캐시 공유)
+#   uvicorn app_report_asgi:asgi_app --host 0.0.0.0 --port 5000
+load_dotenv()
+
+INFLUX_URL = os.getenv("INFLUX_URL")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
+INFLUX_ORG = os.getenv("INFLUX_ORG")
+openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# 공장 토폴로지 (설비 라인 목록)
+topology = Topology.load()
+LINES = topology.equipment_lines
+# 생산 실적에 쓰는 투입/산출 공정 (산출은 토폴로지의 sink 단계)
+PRODUCTION_PROCESSES = topology.production_processes
+
+# InfluxDBClientAsync는 이벤트 루프 안에서 만들어야 하므로 lifespan에서 설정
+influx = {}
+
+redis_client = connect_redis()
+status_lease = LeaderLease(redis_client, "report_emit_status")
+sio = create_socketio("facman-report")
+status_broadcaster = AsyncStatusBroadcaster(sio, StatusStore(redis_client, "report"), status_lease, LINES)
+# 표준 기간 보고서 재료 캐시 (report_warmer가 주기적으로 미리 채움, eventlet 서버와 같은 키)
+report_cache = ReportCache(redis_client, "report")
+
+
+async def warm_range(range_str):
+    entries = await collect_entries(LINES, range_str)
+    if REPORT_WARM_NARRATIVE:
+        narrated = await asyncio.gather(*(narrate(entry) for entry in entries.values()))
+        entries = dict(zip(entries, narrated))
+    production_rows = await query_production_rows(range_str)
+    await asyncio.to_thread(report_cache.put_entries, range_str, entries, cache_ttl(range_str))
+    await asyncio.to_thread(report_cache.put_production_rows, range_str, production_rows, cache_ttl(range_str))
+
+
+report_warmer = ReportWarmer(report_cache, LeaderLease(redis_client, "report_warmer", ttl=WARM_LEASE_TTL), warm_range)
+
+
+def query_api():
+    return influx["client"].query_api()
+
+
+def status_reader():
+    return AsyncStatusLogReader(query_api(), INFLUX_ORG)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    influx["client"] = instrument_influx_async(
+        InfluxDBClientAsync(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG, timeout=60_000))
+    tasks = [
+        asyncio.create_task(poll_status(status_broadcaster, status_lease, lambda: status_reader().latest(LINES))),
+        asyncio.create_task(status_broadcaster.run()),
+    ]
+    if REPORT_WARM_ENABLED:
+        tasks.append(asyncio.create_task(report_warmer.run_async()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.to_thread(status_lease.release)
+        await influx["client"].close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = EndpointRoute
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.mount("/static", StaticFiles(directory="static"), name="static")
+templates = flask_templates("templates", app)
+
+
+# ===============================
+# 실시간 상태 (Socket.IO)
+# ===============================
+@sio.on("subscribe_status")
+async def handle_subscribe_status(sid, data):
+    await status_broadcaster.subscribe(sid, data)
+
+
+@sio.on("disconnect")
+async def handle_disconnect(sid):
+    await status_broadcaster.unsubscribe(sid)
+
+
+@sio.on("status_ack")
+async def handle_status_ack(sid, data):
+    status_broadcaster.acknowledge(data)
+
+
+# ===============================
+# 라우팅
+# ===============================
+@app.get("/")
+async def index(request: Request):
+    return templates.TemplateResponse(request, "index.html", {"lines": LINES})
+
+
+@app.get("/report")
+async def report_page(request: Request):
+    return templates.TemplateResponse(request, "report.html", {"lines": LINES})
+
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+# ===============================
+# 보고서 생성 API (다중 공정 대응)
+# ===============================
+async def collect_entries(processes, range_str):
+    """LLM 서술 전의 공정별 보고서 재료: {process: entry}"""
+    # ✅ 긴 기간(7d/31d 등)은 롤업 버킷, 짧은 기간은 원본 버킷을 자동 선택
+    start_utc, stop_utc = rollups.parse_range(range_str)
+    api = query_api()
+    # ✅ 생산실적과 선택 공정 전체의 상태 데이터를 동시에 조회 (긴 기간은 MTBF/MTTR/다운타임도 롤업 집계로 계산)
+    process_counts, status = await asyncio.gather(
+        rollups.query_process_counts_async(api, INFLUX_ORG, start_utc, stop_utc),
+        rollups.query_status_report_async(api, INFLUX_ORG, processes, start_utc, stop_utc),
+    )
+    production = report_service.summarize_production(process_counts, PRODUCTION_PROCESSES)
+    return {
+        process: report_service.report_entry(process, range_str, production, *status[process])
+        for process in processes
+    }
+
+
+async def narrate(entry):
+    started = time.perf_counter()
+    response = await openai_client.chat.completions.create(
+        model="gpt-4-1106-preview",
+        messages=[{"role": "system", "content": report_service.REPORT_SYSTEM_PROMPT},
+                  {"role": "user", "content": entry["prompt"]}]
+    )
+    record_llm_call("report", time.perf_counter() - started, response)
+    return report_service.with_narrative(entry, response.choices[0].message.content)
+
+
+async def query_production_rows(range_str):
+    """엑셀 생산 실적 시트 행 (투입/산출 공정). 긴 기간은 롤업 건수로 집계"""
+    start_utc, stop_utc = rollups.parse_range(range_str)
+    return report_service.production_rows(*await rollups.query_production_async(
+        query_api(), INFLUX_ORG, PRODUCTION_PROCESSES, start_utc, stop_utc))
+
+
+async def generate_reports(processes, range_str, on_process=None):
+    """
+    공정별 보고서와 재료: (reports, entries)
+    표준 기간은 미리 생성된 캐시 재료를 쓰고, 없는 공정만 조회한 뒤 결과를 캐시에 저장.
+    on_process(process)는 공정 하나가 끝날 때마다 await (작업 진행률 표시용)
+    """
+    cacheable = range_str in report_service.STANDARD_RANGES
+    entries = await asyncio.to_thread(report_cache.get_entries, range_str, processes) if cacheable else {}
+    missing = [process for process in processes if process not in entries]
+    if missing:
+        entries.update(await collect_entries(missing, range_str))
+
+    changed = {}
+
+    async def one(process):
+        if not entries[process]["narrated"]:
+            entries[process] = changed[process] = await narrate(entries[process])
+        if on_process:
+            await on_process(process)
+
+    # ✅ 공정별 LLM 호출을 동시에 실행 (응답 순서는 요청 순서 유지)
+    await asyncio.gather(*(one(process) for process in processes))
+    changed.update({process: entries[process] for process in missing})
+    if cacheable and changed:
+        await asyncio.to_thread(report_cache.put_entries, range_str, changed, cache_ttl(range_str))
+    return [entries[process]["report"] for process in processes], entries
+
+
+@app.post("/generate_report")
+async def generate_report(request: Request):
+    try:
+        data = await request.json()
+        all_reports, _ = await generate_reports(data.get("processes", []), normalize_range(data.get("range")))
+        return {"reports": all_reports}
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ===============================
+# 보고서 작업 API (백그라운드 생성 + 서버 보관 산출물)
+# ===============================
+report_jobs = ReportJobStore(redis_client, "report")
+job_slots = JobSlots()
+# 실행 중인 작업 태스크 (가비지 컬렉션으로 취소되지 않도록 참조 유지)
+job_tasks = set()
+
+
+async def run_report_job(job_id, processes, range_str):
+    # 단계: 공정별 보고서 N개 + 엑셀 데이터 + 차트 렌더링
+    total = len(processes) + 2
+    done = 0
+
+    async def advance(stage):
+        nonlocal done
+        done += 1
+        job = await asyncio.to_thread(report_jobs.progress, job_id, stage, done, total)
+        await sio.emit(REPORT_JOB_EVENT, public_status(job), to=job_room(job_id))
+
+    try:
+        job = await asyncio.to_thread(report_jobs.progress, job_id, "query", 0, total)
+        await sio.emit(REPORT_JOB_EVENT, public_status(job), to=job_room(job_id))
+        reports, entries = await generate_reports(
+            processes, range_str, on_process=lambda process: advance(f"report:{process}"))
+
+        # ✅ 엑셀용 행도 작업 중에 준비 (다운로드 시 Influx 재조회 없음, 표준 기간은 캐시 사용)
+        log_rows = [row for process in processes for row in entries[process]["log_rows"]]
+        cacheable = range_str in report_service.STANDARD_RANGES
+        prod_rows = await asyncio.to_thread(report_cache.get_production_rows, range_str) if cacheable else None
+        if prod_rows is None:
+            prod_rows = await query_production_rows(range_str)
+            if cacheable:
+                await asyncio.to_thread(report_cache.put_production_rows, range_str, prod_rows, cache_ttl(range_str))
+        await advance("excel")
+
+        # ✅ 차트 렌더링은 동기 내보내기 요청과 같은 export_pool 자리를 잡고 실행
+        with export_pool.admit():
+            specs_by_rep, pngs_by_rep = await report_service.render_charts_async(reports)
+        await advance("charts")
+
+        job = await asyncio.to_thread(report_jobs.finish, job_id, {"reports": reports}, {
+            "specs": specs_by_rep,
+            "charts": pngs_by_rep,
+            "log_rows": log_rows,
+            "prod_rows": prod_rows,
+        })
+    except ExportQueueFull:
+        job = await asyncio.to_thread(report_jobs.fail, job_id, EXPORT_BUSY["error"])
+    except Exception as e:
+        traceback.print_exc()
+        job = await asyncio.to_thread(report_jobs.fail, job_id, str(e))
+    finally:
+        job_slots.release()
+    await sio.emit(REPORT_JOB_EVENT, public_status(job), to=job_room(job_id))
+
+
+@app.post("/report_jobs")
+async def create_report_job(request: Request):
+    data = await request.json() or {}
+    processes = data.get("processes", [])
+    range_str = normalize_range(data.get("range") or "1h")
+    if not processes:
+        return JSONResponse({"error": "Missing processes"}, status_code=400)
+
+    try:
+        job_slots.acquire()
+    except ReportJobsFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+    try:
+        job = await asyncio.to_thread(report_jobs.create, {"processes": processes, "range": range_str})
+    except Exception:
+        job_slots.release()
+        raise
+    task = asyncio.create_task(run_report_job(job["job_id"], processes, range_str))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+    return JSONResponse(public_status(job), status_code=202)
+
+
+@app.get("/report_jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = await asyncio.to_thread(report_jobs.get, job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown or expired job"}, status_code=404)
+    status = public_status(job)
+    if job["status"] == "done":
+        status["result"] = await asyncio.to_thread(report_jobs.result, job_id)
+    return status
+
+
+@sio.on("subscribe_report_job")
+async def handle_subscribe_report_job(sid, data):
+    job_id = (data or {}).get("job_id")
+    job = await asyncio.to_thread(report_jobs.get, job_id) if job_id else None
+    if job is None:
+        return
+    await sio.enter_room(sid, job_room(job_id))
+    # 구독 전에 지나간 진행 상황은 현재 상태로 한 번 보내줌
+    await sio.emit(REPORT_JOB_EVENT, public_status(job), to=sid)
+
+
+async def stored_artifacts(job_id):
+    artifacts, result = await asyncio.gather(
+        asyncio.to_thread(report_jobs.artifacts, job_id), asyncio.to_thread(report_jobs.result, job_id))
+    if artifacts is None or result is None:
+        return None
+    return result["reports"], artifacts
+
+
+# ===============================
+# 생산실적 계산 API
+# ===============================
+@app.post("/get_production_data")
+async def get_production_data(request: Request):
+    try:
+        data = await request.json()
+        range_str = data.get("range")
+
+        if not range_str:
+            return JSONResponse({"error": "Missing range parameter"}, status_code=400)
+
+        start_utc, stop_utc = rollups.parse_range(range_str)
+        api = query_api()
+        hours = (stop_utc - start_utc).total_seconds() / 3600
+        range_clause = f"|> range(start: {rollups._flux_time(start_utc)}, stop: {rollups._flux_time(stop_utc)})"
+
+        process_counts, cycle_tables = await asyncio.gather(
+            rollups.query_process_counts_async(api, INFLUX_ORG, start_utc, stop_utc),
+            api.query(query=report_service.cycle_time_flux(range_clause), org=INFLUX_ORG),
+        )
+        production = report_service.summarize_production(process_counts, PRODUCTION_PROCESSES, hours)
+        cycle_times = report_service.cycle_time_stats(record for table in cycle_tables for record in table.records)
+        for line_id, stats in cycle_times.items():
+            production["lines"].setdefault(line_id, {})["cycle_time"] = stats
+
+        return production
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ===============================
+# 다운타임 / MTBF / MTTR 계산 API
+# ===============================
+async def process_status(request):
+    """요청 본문의 process/range로 상태 지표(report_service.status_report) 계산. 파라미터가 없으면 None"""
+    data = await request.json()
+    process = data.get("process")
+    range_str = data.get("range")
+    if not process or not range_str:
+        return None
+    start_utc, stop_utc = rollups.parse_range(range_str)
+    status = await rollups.query_status_report_async(query_api(), INFLUX_ORG, [process], start_utc, stop_utc)
+    return report_service.status_report(process, *status[process])
+
+
+@app.post("/get_downtime_data")
+async def get_downtime_data(request: Request):
+    status = await process_status(request)
+    if status is None:
+        return JSONResponse({"error": "Missing process or range"}, status_code=400)
+    return status["downtime"]
+
+
+@app.post("/get_mtbf_data")
+async def get_mtbf_data(request: Request):
+    try:
+        status = await process_status(request)
+        if status is None:
+            return JSONResponse({"error": "Missing process or range"}, status_code=400)
+        return status["mtbf"]
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@app.post("/get_mttr_data")
+async def get_mttr_data(request: Request):
+    try:
+        status = await process_status(request)
+        if status is None:
+            return JSONResponse({"error": "Missing process or range"}, status_code=400)
+        return status["mttr"]
+    except Exception as e:
+        traceback.print_exc()
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ===============================
+# DOCX / XLSX 다운로드 API
+# ===============================
+EXPORT_BUSY = {"error": "보고서 생성 요청이 많습니다. 잠시 후 다시 시도하세요."}
+
+
+def attachment(data, filename, media_type):
+    return Response(data, media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+    })
+
+
+@app.get("/report_jobs/{job_id}/docx")
+async def download_report_docx(job_id: str):
+    stored = await stored_artifacts(job_id)
+    if stored is None:
+        return JSONResponse({"error": "Unknown or unfinished job"}, status_code=404)
+    reports, artifacts = stored
+    failure_labels = [label for rep in reports for label in rep.get("failureLabels", [])]
+    failure_counts = [count for rep in reports for count in rep.get("failureCounts", [])]
+    try:
+        # ✅ 차트는 작업 중에 렌더링해 두었으므로 문서 조립만 수행
+        with export_pool.admit():
+            docx = await export_pool.run_async("docx", report_service.build_docx,
+                                               failure_labels, failure_counts, reports, artifacts["specs"], artifacts["charts"])
+        return attachment(docx, "제조_보고서.docx", report_service.DOCX_MIMETYPE)
+    except ExportQueueFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+
+
+@app.get("/report_jobs/{job_id}/xlsx")
+async def download_report_xlsx(job_id: str):
+    stored = await stored_artifacts(job_id)
+    if stored is None:
+        return JSONResponse({"error": "Unknown or unfinished job"}, status_code=404)
+    _, artifacts = stored
+    try:
+        with export_pool.admit():
+            xlsx = await export_pool.run_async("xlsx", report_service.build_excel, artifacts["log_rows"], artifacts["prod_rows"])
+        return attachment(xlsx, "제조_기초데이터.xlsx", report_service.XLSX_MIMETYPE)
+    except ExportQueueFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+
+
+@app.post("/generate_docx")
+async def generate_docx(request: Request):
+    try:
+        form = await request.form()
+        failure_labels = json.loads(form.get("failureLabels", "[]"))
+        failure_counts = json.loads(form.get("failureCounts", "[]"))
+        report_data = json.loads(form.get("reportData", "[]"))
+        with export_pool.admit():
+            specs_by_rep, pngs_by_rep = await report_service.render_charts_async(report_data)
+            docx = await export_pool.run_async("docx", report_service.build_docx,
+                                               failure_labels, failure_counts, report_data, specs_by_rep, pngs_by_rep)
+        return attachment(docx, "제조_보고서.docx", report_service.DOCX_MIMETYPE)
+
+    except ExportQueueFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+    except Exception as e:
+        print("📄 DOCX 생성 오류:", e)
+        return JSONResponse({"error": "파일 생성 실패"}, status_code=500)
+
+
+@app.post("/generate_excel")
+async def generate_excel(request: Request):
+    try:
+        form = await request.form()
+        report_data = json.loads(form.get("reportData", "[]"))
+        api = query_api()
+
+        async def fetch(rep):
+            process = rep["process"]
+            range_str = rep.get("range", "1h")
+            start_utc, stop_utc = rollups.parse_range(range_str)
+            status, production = await asyncio.gather(
+                rollups.query_status_report_async(api, INFLUX_ORG, [process], start_utc, stop_utc),
+                rollups.query_production_async(api, INFLUX_ORG, PRODUCTION_PROCESSES, start_utc, stop_utc),
+            )
+            prod_rows = report_service.production_rows(*production)
+            return report_service.status_report(process, *status[process])["log_rows"], prod_rows
+
+        with export_pool.admit():
+            log_rows, prod_rows = [], []
+            for rep_logs, rep_prod in await asyncio.gather(*(fetch(rep) for rep in report_data)):
+                log_rows += rep_logs
+                prod_rows += rep_prod
+
+            xlsx = await export_pool.run_async("xlsx", report_service.build_excel, log_rows, prod_rows)
+        return attachment(xlsx, "제조_기초데이터.xlsx", report_service.XLSX_MIMETYPE)
+
+    except ExportQueueFull:
+        return JSONResponse(EXPORT_BUSY, status_code=503)
+    except Exception as e:
+        print("❌ Excel 생성 오류:", e)
+        return JSONResponse({"error": "엑셀 파일 다운로드 실패"}, status_code=500)
+
+
+# Socket.IO(/socket.io)와 FastAPI 라우트를 한 ASGI 앱으로 제공
+asgi_app = socketio.ASGIApp(sio, other_asgi_app=app)
+
+# ===============================
+# 서버 실행
+# ===============================
+if __name__ == "__main__":
+    uvicorn.run(asgi_app, host="0.0.0.0", port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,69 @@
+import asyncio
+from fastapi import Response
+from fastapi.routing import APIRoute
+from fastapi.templating import Jinja2Templates
+import socketio
+from metrics import current_endpoint, metrics_payload
+from replication import redis_url
+
+# ===============================
+# ASGI(FastAPI + python-socketio) 서버 공통
+# ===============================
+# dashboard+chatbot/과 reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# eventlet 버전(app.py, app_report.py)과 같은 템플릿/Socket.IO 채널/메트릭을 쓰도록 맞추는 부분.
+# 같은 REDIS_URL/채널을 쓰면 eventlet 레플리카와 ASGI 레플리카를 섞어 배포할 수 있음.
+
+class EndpointRoute(APIRoute):
+    """요청 처리 중 메트릭 endpoint 라벨을 라우트 이름(Flask endpoint와 같은 함수 이름)으로 설정"""
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        name = self.name
+
+        async def route_handler(request):
+            token = current_endpoint.set(name)
+            try:
+                return await handler(request)
+            finally:
+                current_endpoint.reset(token)
+        return route_handler
+
+
+def flask_templates(directory, app):
+    """Flask 문법(url_for('static', filename=...))을 쓰는 기존 템플릿을 그대로 렌더링"""
+    templates = Jinja2Templates(directory=directory)
+
+    def url_for(endpoint, **values):
+        if endpoint == "static":
+            return f"/static/{values['filename']}"
+        return app.url_path_for(endpoint, **values)
+
+    templates.env.globals["url_for"] = url_for
+    return templates
+
+
+def create_socketio(channel):
+    """flask_socketio.SocketIO(message_queue=REDIS_URL, channel=...)와 같은 채널을 쓰는 AsyncServer"""
+    url = redis_url()
+    manager = socketio.AsyncRedisManager(url, channel=channel) if url else None
+    return socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*", client_manager=manager)
+
+
+def metrics_response():
+    body, content_type = metrics_payload()
+    return Response(body, media_type=content_type)
+
+
+async def poll_status(broadcaster, lease, get_latest, interval=1.0):
+    """emit_status의 asyncio 버전. 리더만 Influx를 폴링하고 변경분은 broadcaster가 tick마다 전송"""
+    while True:
+        try:
+            if not await asyncio.to_thread(lease.acquire_or_renew):
+                broadcaster.reset()
+                await asyncio.sleep(interval)
+                continue
+            await broadcaster.ensure_loaded()
+            for line, event in (await get_latest()).items():
+                broadcaster.record(line, event.event_type, event.trace_id, event.time)
+        except Exception as e:
+            print(f"[Status] poll error: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,224 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import matplotlib.font_manager as fm
+import export_pool
+
+# ===============================
+# 한글 폰트 탐색 (Windows/macOS/Linux 공통)
+# ===============================
+# dashboard+chatbot/과 reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+KOREAN_FONT_FAMILIES = [
+    "Malgun Gothic", "NanumGothic", "NanumBarunGothic", "Noto Sans CJK KR",
+    "Noto Sans KR", "AppleGothic", "UnDotum", "Baekmuk Dotum",
+]
+KOREAN_FONT_FILE_HINTS = ["malgun", "nanum", "notosanscjk", "notosanskr", "applegothic", "undotum", "baekmuk"]
+
+
+def find_korean_font():
+    """KOREAN_FONT_PATH 환경 변수 → 설치된 폰트 이름 → 시스템 폰트 파일명 순으로 한글 폰트를 찾음"""
+    font_path = os.getenv("KOREAN_FONT_PATH")
+    if font_path and os.path.exists(font_path):
+        fm.fontManager.addfont(font_path)
+        return fm.FontProperties(fname=font_path).get_name()
+
+    installed = {font.name for font in fm.fontManager.ttflist}
+    for family in KOREAN_FONT_FAMILIES:
+        if family in installed:
+            return family
+
+    for path in fm.findSystemFonts():
+        name = os.path.basename(path).lower().replace(" ", "").replace("-", "")
+        if any(hint in name for hint in KOREAN_FONT_FILE_HINTS):
+            fm.fontManager.addfont(path)
+            return fm.FontProperties(fname=path).get_name()
+    return None
+
+
+def setup_korean_font():
+    family = find_korean_font()
+    if family:
+        plt.rc("font", family=family, size=12)
+    else:
+        print("⚠️ 한글 폰트를 찾을 수 없습니다. KOREAN_FONT_PATH 환경 변수를 설정하세요.")
+    plt.rc("axes", unicode_minus=False)
+    return family
+
+
+# ===============================
+# 차트 템플릿
+# ===============================
+def _draw_donut(ax, percent, labels, colors):
+    ax.pie([percent, 100 - percent], labels=labels, colors=colors,
+           startangle=90, wedgeprops={"width": 0.4})
+    ax.set(aspect="equal")
+
+
+def _draw_production_bar(ax, input_cnt, output_cnt):
+    ax.bar(["투입량", "산출량"], [input_cnt, output_cnt], color=["blue", "green"])
+    ax.set_title("생산실적")
+
+
+def _draw_failure_line(ax, labels, values):
+    ax.plot(labels, values, marker='o', color='red')
+    ax.set_title("고장 발생 분포")
+    ax.set_xlabel("시간대")
+    ax.set_ylabel("건수")
+    ax.grid(True)
+    ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+
+
+def _draw_downtime_pie(ax, failure_min, repair_min, operating_min):
+    labels = ['고장 시간', '수리 시간', '운영 시간']
+    values = [failure_min, repair_min, operating_min]
+    colors = ['#ff6b6b', '#ffa94d', '#8ce99a']
+    ax.pie(values, labels=labels, colors=colors, startangle=90, autopct='%1.1f%%')
+    ax.set(aspect="equal")
+
+
+def _draw_downtime_bar(ax, labels, failureData):
+    ax.bar(labels, failureData, color="red")
+    ax.set_title("시간대별 고장 다운타임")
+    ax.set_xlabel("시간대")
+    ax.set_ylabel("다운타임 (분)")
+    ax.grid(True)
+    ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+
+
+# 템플릿 이름 → (그리기 함수, figsize)
+TEMPLATES = {
+    "donut": (_draw_donut, (2.5, 2.5)),
+    "production_bar": (_draw_production_bar, (3, 2.5)),
+    "failure_line": (_draw_failure_line, (4, 3)),
+    "downtime_pie": (_draw_downtime_pie, (3, 3)),
+    "downtime_bar": (_draw_downtime_bar, (5, 3)),
+}
+
+# 워커 프로세스마다 템플릿별 Figure를 한 번만 만들고 재사용
+_figures = {}
+_font_ready = False
+
+
+def _render(template, params):
+    global _font_ready
+    if not _font_ready:
+        # 워커 프로세스에서 처음 렌더링할 때 한글 폰트 설정
+        setup_korean_font()
+        _font_ready = True
+    draw, figsize = TEMPLATES[template]
+    fig = _figures.get(template)
+    if fig is None:
+        fig = plt.figure(figsize=figsize, dpi=100)
+        _figures[template] = fig
+    fig.clf()
+    draw(fig.add_subplot(), **params)
+    buf = BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+# ===============================
+# 렌더링 서비스 (export_pool 프로세스 풀 + PNG 캐시)
+# ===============================
+class ChartRenderer:
+    def __init__(self, pool, cache_size=256):
+        self._pool = pool
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(template, params):
+        payload = json.dumps([template, params], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _start(self, specs):
+        """캐시에 있는 차트는 결과로, 나머지는 (진행 중이면 재사용해) 풀에 제출: (keys, results, futures)"""
+        keys = [self.cache_key(template, params) for template, params in specs]
+        results, futures = {}, {}
+        with self._lock:
+            for key, (template, params) in zip(keys, specs):
+                if key in results or key in futures:
+                    continue
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[key] = self._cache[key]
+                    continue
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pool.submit("chart", _render, template, params)
+                    self._pending[key] = future
+                futures[key] = future
+        return keys, results, futures
+
+    def _finish(self, key, png):
+        with self._lock:
+            self._pending.pop(key, None)
+            if png is not None:
+                self._cache[key] = png
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+    def _settle(self, futures, outcomes, results):
+        """
+        시작한 키를 모두 진행 목록에서 빼고, 성공한 PNG는 캐시와 results에 반영.
+        outcomes: {key: future 결과 또는 예외} (중단되어 결과가 없는 키는 빠짐). 첫 렌더링 오류를 반환
+        """
+        error = None
+        for key in futures:
+            outcome = outcomes.get(key)
+            if outcome is None or isinstance(outcome, BaseException):
+                self._finish(key, None)
+                error = error or outcome
+                continue
+            results[key], _ = outcome
+            self._finish(key, results[key])
+        return error
+
+    def render_many(self, specs):
+        """
+        specs: [(template, params), ...]
+        같은 데이터의 차트는 캐시나 진행 중인 작업을 재사용하고, 나머지는 프로세스 풀에서 병렬 렌더링.
+        입력 순서대로 PNG bytes 목록을 반환. 일부가 실패해도 나머지를 끝까지 기다려 정리한 뒤 첫 오류를 발생.
+        """
+        keys, results, futures = self._start(specs)
+        outcomes = {}
+        try:
+            for key, future in futures.items():
+                try:
+                    outcomes[key] = future.result()
+                except Exception as e:
+                    outcomes[key] = e
+        finally:
+            error = self._settle(futures, outcomes, results)
+        if error is not None:
+            raise error
+        return [results[key] for key in keys]
+
+    async def render_many_async(self, specs):
+        keys, results, futures = self._start(specs)
+        outcomes = {}
+        try:
+            done = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures.values()),
+                                        return_exceptions=True)
+            outcomes = dict(zip(futures, done))
+        finally:
+            # 요청이 취소되어도 시작한 키는 진행 목록에서 정리
+            error = self._settle(futures, outcomes, results)
+        if error is not None:
+            raise error
+        return [results[key] for key in keys]
+
+    def render(self, template, **params):
+        return self.render_many([(template, params)])[0]
+
+
+renderer = ChartRenderer(export_pool.pool)
@@ -0,0 +1,21 @@
+from flask import Response, has_request_context, request
+from metrics import metrics_payload, register_endpoint_resolver
+
+# ===============================
+# Flask 서버 전용 메트릭 연결
+# ===============================
+# dashboard+chatbot/과 reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# metrics.py는 ASGI 서버도 쓰므로 Flask 의존 부분(요청 엔드포인트 조회, /metrics 뷰)만 여기에 둠.
+# 이 모듈을 import하면 Flux 쿼리 지연이 Flask 엔드포인트별로 기록됨.
+
+
+def _flask_endpoint():
+    return request.endpoint if has_request_context() else None
+
+
+register_endpoint_resolver(_flask_endpoint)
+
+
+def metrics_view():
+    body, content_type = metrics_payload()
+    return Response(body, content_type=content_type)
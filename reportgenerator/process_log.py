@@ -0,0 +1,92 @@
+import os
+from influxdb_client import Point
+
+# ===============================
+# process 버킷 제품 이벤트 스키마
+# ===============================
+# simulation/, dashboard+chatbot/, reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# v1  process_log    tags: product_id, process_id, line_id   field: status
+#     제품마다 새 시리즈가 생겨 생산량에 비례해 카디널리티가 계속 늘어남.
+# v2  process_event  tags: process_id, line_id, status       field: product_id
+#     태그는 라인/공정/상태처럼 개수가 정해진 값만 사용.
+# 전환 순서: 쓰기 dual → ProcessLogMigration으로 과거 데이터 백필 → 읽기 v2 → 쓰기 v2 → v1 삭제
+#   PROCESS_LOG_WRITE = v1 | dual | v2   (시뮬레이터, 기본 dual)
+#   PROCESS_LOG_READ  = v1 | v2          (대시보드/리포트, 기본 v1)
+
+PROCESS_BUCKET = "process"
+MEASUREMENT_V1 = "process_log"
+MEASUREMENT_V2 = "process_event"
+WRITE_SCHEMAS = ("v1", "dual", "v2")
+READ_SCHEMAS = ("v1", "v2")
+# 조건 필터를 Flux 본문 들여쓰기에 맞춰 줄바꿈
+_INDENT = "\n      "
+
+
+def write_schema():
+    schema = os.getenv("PROCESS_LOG_WRITE", "dual")
+    if schema not in WRITE_SCHEMAS:
+        raise ValueError(f"Invalid PROCESS_LOG_WRITE: {schema}")
+    return schema
+
+
+def read_schema():
+    schema = os.getenv("PROCESS_LOG_READ", "v1")
+    if schema not in READ_SCHEMAS:
+        raise ValueError(f"Invalid PROCESS_LOG_READ: {schema}")
+    return schema
+
+
+def build_points(product_id, process_id, line_id, status, time, schema=None):
+    """스키마 설정에 따라 기록할 포인트 목록 (dual이면 두 형식 모두)"""
+    schema = schema or write_schema()
+    points = []
+    if schema in ("v1", "dual"):
+        points.append(
+            Point(MEASUREMENT_V1)
+            .tag("product_id", product_id)
+            .tag("process_id", process_id)
+            .tag("line_id", line_id)
+            .field("status", status)
+            .time(time)
+        )
+    if schema in ("v2", "dual"):
+        points.append(
+            Point(MEASUREMENT_V2)
+            .tag("process_id", process_id)
+            .tag("line_id", line_id)
+            .tag("status", status)
+            .field("product_id", product_id)
+            .time(time)
+        )
+    return points
+
+
+def events_flux(range_clause, statuses=None, where=None, schema=None, bucket=PROCESS_BUCKET):
+    """
+    제품 이벤트를 스키마와 무관하게 v1 모양(_value=status, product_id/process_id/line_id 컬럼)으로 반환하는 Flux.
+    statuses/where(예: 'r.line_id == "P1-A"')는 v2에서 태그 조건이라 저장소 단계에서 걸러짐.
+    """
+    schema = schema or read_schema()
+    conditions = []
+    if where:
+        conditions.append(f"|> filter(fn: (r) => {where})")
+
+    if schema == "v1":
+        if statuses:
+            conditions.append("|> filter(fn: (r) => " + " or ".join(f'r._value == "{s}"' for s in statuses) + ")")
+        return f'''
+    from(bucket: "{bucket}")
+      {range_clause}
+      |> filter(fn: (r) => r._measurement == "{MEASUREMENT_V1}" and r._field == "status")
+      {_INDENT.join(conditions)}
+    '''
+
+    if statuses:
+        conditions.append("|> filter(fn: (r) => " + " or ".join(f'r.status == "{s}"' for s in statuses) + ")")
+    return f'''
+    from(bucket: "{bucket}")
+      {range_clause}
+      |> filter(fn: (r) => r._measurement == "{MEASUREMENT_V2}" and r._field == "product_id")
+      {_INDENT.join(conditions)}
+      |> map(fn: (r) => ({{r with product_id: r._value, _value: r.status, _field: "status"}}))
+    '''
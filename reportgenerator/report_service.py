@@ -0,0 +1,540 @@
+from io import BytesIO
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from docx import Document
+from docx.shared import Inches
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from openpyxl import Workbook
+from process_log import events_flux
+from chart_renderer import renderer
+
+# ===============================
+# 보고서 계산/문서 생성 (웹 프레임워크 무관)
+# ===============================
+# Flask(app_report.py)와 ASGI(app_report_asgi.py) 서버가 같은 응답을 만들도록
+# 조회 쿼리 구성, 이벤트 집계, DOCX/XLSX 생성을 이 모듈에 모아 둠. 조회 자체는 각 서버가 수행.
+
+KST = timezone(timedelta(hours=9))
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# 표준 기간 (report.js 선택지): 단기 기간은 매시, 주간/월간은 야간에 미리 생성 (report_warmer.py)
+HOURLY_RANGES = ["1h", "3h", "6h", "9h"]
+NIGHTLY_RANGES = ["7d", "31d"]
+STANDARD_RANGES = HOURLY_RANGES + NIGHTLY_RANGES
+
+
+def normalize_range(range_str):
+    """한글 기간 문자열을 Flux duration으로 변환"""
+    kor_to_influx = {
+        "1시간": "1h", "3시간": "3h", "6시간": "6h", "9시간": "9h",
+        "1일": "1d", "7일": "7d", "31일": "31d"
+    }
+    return kor_to_influx.get(range_str, range_str)
+
+
+def _to_kst(dt):
+    return dt.astimezone(KST).replace(tzinfo=None)
+
+
+# ===============================
+# 생산실적
+# ===============================
+def summarize_production(process_counts, production_processes, hours=None):
+    """
+    공정/라인/상태별 건수({(process_id, line_id, status): count})로 투입/산출과 라인별 처리량, WIP 계산
+    production_processes: 토폴로지의 [투입 공정, 산출(sink) 공정] (Topology.production_processes)
+    """
+    source, sink = production_processes
+    input_count = sum(cnt for (proc_id, _, _), cnt in process_counts.items() if proc_id == source)
+    output_count = sum(cnt for (proc_id, _, _), cnt in process_counts.items() if proc_id == sink)
+    ratio = round((output_count / input_count) * 100, 1) if input_count else 0
+
+    lines = defaultdict(lambda: defaultdict(int))
+    for (_, line_id, status), cnt in process_counts.items():
+        if line_id:
+            lines[line_id][status] += cnt
+
+    per_line = {}
+    for line_id, status_counts in sorted(lines.items()):
+        per_line[line_id] = {
+            "arrival": status_counts["arrival"],
+            "finish": status_counts["finish"],
+            "interrupt": status_counts["interrupt"],
+            "wip": status_counts["arrival"] - status_counts["finish"],
+            "throughput_per_hour": round(status_counts["finish"] / hours, 2) if hours else None,
+        }
+
+    return {"input": input_count, "output": output_count, "rate": ratio, "lines": per_line}
+
+
+def cycle_time_flux(range_clause):
+    return events_flux(range_clause, statuses=["start", "finish"]) + '''
+      |> keep(columns: ["_time", "_value", "product_id", "line_id"])
+    '''
+
+
+def cycle_time_stats(records):
+    """라인별 start → finish 소요 시간(초)을 product_id 기준으로 매칭해 통계 계산"""
+    started = {}
+    durations = defaultdict(list)
+    for record in sorted(records, key=lambda r: r.get_time()):
+        key = (record.values.get("product_id"), record.values.get("line_id"))
+        if record.get_value() == "start":
+            started[key] = record.get_time()
+        elif key in started:
+            durations[key[1]].append((record.get_time() - started.pop(key)).total_seconds())
+
+    stats = {}
+    for line_id, values in sorted(durations.items()):
+        values.sort()
+        stats[line_id] = {
+            "count": len(values),
+            "mean_sec": round(sum(values) / len(values), 2),
+            "p50_sec": round(values[len(values) // 2], 2),
+            "p90_sec": round(values[min(len(values) - 1, int(len(values) * 0.9))], 2),
+            "max_sec": round(values[-1], 2),
+        }
+    return stats
+
+
+# ===============================
+# 상태 이벤트 집계
+# ===============================
+def status_series(rows):
+    """rollups 상태 행으로 가동률(시간 가중)/고장 시계열과 시간대별 고장 수 계산"""
+    observed, available, failure_count = 0.0, 0.0, 0
+    time_labels, available_values, failure_values = [], [], []
+    failure_hourly = defaultdict(int)
+
+    for row in rows:
+        record_time = _to_kst(row["time"])
+        hour_label = record_time.strftime("%H시대")
+
+        observed += row["observed_seconds"]
+        available += row["available_seconds"]
+        if row["failure_count"]:
+            failure_count += row["failure_count"]
+            failure_hourly[hour_label] += row["failure_count"]
+        if not row["observed_seconds"]:
+            # 길이 0인 상태(수리 완료 직후 processing 등)는 차트 점으로 표시하지 않음
+            continue
+
+        time_labels.append(record_time.strftime("%H:%M"))
+        available_values.append(round(row["available_seconds"] / row["observed_seconds"], 2))
+        failure_values.append(row["failure_count"])
+
+    return {
+        "avg_avail": round((available / observed) * 100, 1) if observed else 0,
+        "failure_count": failure_count,
+        "labels": time_labels,
+        "available": available_values,
+        "failures": failure_values,
+        "failureLabels": list(failure_hourly.keys()),
+        "failureCounts": list(failure_hourly.values()),
+    }
+
+
+def report_prompt(process, range_str, series, production):
+    return f"""
+공정명: {process}
+기간: 최근 {range_str}
+가동률 평균: {series["avg_avail"]}%
+고장 횟수: {series["failure_count"]}회
+생산실적: 투입 {production["input"]}개 → 산출 {production["output"]}개 (양품률 {production["rate"]}%)
+
+위 데이터를 바탕으로 제조 공정 보고서를 작성해줘.
+아래 각 항목에 대해 글머리 기호 '-'로 중요한 내용을 포함하도록 작성하고, '보고서 작성자:', '이상입니다' 등의 표현은 절대 포함하지 마.
+항목:
+1. 공정 요약
+2. 주요 이슈
+3. 대응 조치
+4. 향후 제언
+"""
+
+
+REPORT_SYSTEM_PROMPT = "너는 제조공정 보고서를 작성하는 AI 비서야."
+SUMMARY_SYSTEM_PROMPT = "너는 간결한 제조 보고서 요약가야."
+
+
+def process_report(process, series, production, report_text, mtbf, mttr):
+    return {
+        "process": process,
+        "summary": report_text.strip(),
+        "report": report_text,
+        "labels": series["labels"],
+        "available": series["available"],
+        "failures": series["failures"],
+        "failureLabels": series["failureLabels"],
+        "failureCounts": series["failureCounts"],
+        "production": {
+            "input": production["input"],
+            "output": production["output"],
+            "rate": production["rate"]
+        },
+        **mtbf,
+        **mttr
+    }
+
+
+def status_report(process, rows, events=None):
+    """
+    상태 지표 묶음: series, mtbf, mttr, downtime, log_rows.
+    events가 있으면(짧은 기간) MTBF/MTTR/다운타임/엑셀 행을 원본 이벤트로, 없으면(롤업 구간이 있는 긴 기간) 집계 행으로 계산
+    """
+    if events is None:
+        mtbf, mttr = rollup_mtbf_summary(rows), rollup_mttr_summary(rows)
+        downtime, log_rows = rollup_downtime_summary(rows), rollup_log_rows(process, rows)
+    else:
+        mtbf, mttr = mtbf_summary(events), mttr_summary(events)
+        downtime, log_rows = downtime_summary(events), status_log_rows(process, events)
+    return {"series": status_series(rows), "mtbf": mtbf, "mttr": mttr, "downtime": downtime, "log_rows": log_rows}
+
+
+def report_entry(process, range_str, production, rows, events=None):
+    """
+    LLM 서술 전의 공정 보고서 재료. 보고서 작업과 표준 기간 캐시가 같은 형태로 저장.
+    report: 화면/DOCX용 지표(MTBF/MTTR/다운타임 포함), prompt: 서술 생성용, log_rows: 엑셀 공정 이력 행
+    """
+    status = status_report(process, rows, events)
+    report = process_report(process, status["series"], production, "", status["mtbf"], status["mttr"])
+    report["range"] = range_str
+    report["generated_at"] = datetime.now(KST).strftime("%Y-%m-%d %H:%M")
+    report["downtime"] = status["downtime"]
+    return {
+        "report": report,
+        "prompt": report_prompt(process, range_str, status["series"], production),
+        "log_rows": status["log_rows"],
+        "narrated": False,
+    }
+
+
+def with_narrative(entry, report_text):
+    report = {**entry["report"], "summary": report_text.strip(), "report": report_text}
+    return {**entry, "report": report, "narrated": True}
+
+
+def downtime_summary(events):
+    """
+    다운타임 상태(고장 감지 → 수리 시작, 수리 시작 → 완료, 블록 시작 → 해제)가 다음 이벤트까지 이어진 시간을
+    상태 시작 시각의 시간대별로 합산
+    """
+    failure_by_hour = defaultdict(float)
+    repair_by_hour = defaultdict(float)
+    blocked_by_hour = defaultdict(float)
+
+    for event, next_event in zip(events, events[1:]):
+        start = _to_kst(event.time)
+        diff = (_to_kst(next_event.time) - start).total_seconds() / 60
+        hour_label = start.strftime("%H시")
+
+        if event.event_type == "failure":
+            failure_by_hour[hour_label] += diff
+        elif event.event_type == "repair" and event.event_status == "start":
+            repair_by_hour[hour_label] += diff
+        elif event.event_type == "blocked" and event.event_status == "start":
+            # 하류 버퍼 포화로 인한 대기 시간
+            blocked_by_hour[hour_label] += diff
+
+    return _downtime_result(failure_by_hour, repair_by_hour, blocked_by_hour)
+
+
+def _downtime_result(failure_by_hour, repair_by_hour, blocked_by_hour):
+    """시간대(또는 날짜) 라벨별 분 단위 다운타임 → 응답 형식"""
+    hours = sorted(set(failure_by_hour) | set(repair_by_hour) | set(blocked_by_hour))
+    return {
+        "failure_total": round(sum(failure_by_hour.values()), 1),
+        "repair_total": round(sum(repair_by_hour.values()), 1),
+        "blocked_total": round(sum(blocked_by_hour.values()), 1),
+        "hourly_labels": hours,
+        "failure_by_hour": [round(failure_by_hour.get(h, 0), 1) for h in hours],
+        "repair_by_hour": [round(repair_by_hour.get(h, 0), 1) for h in hours],
+        "blocked_by_hour": [round(blocked_by_hour.get(h, 0), 1) for h in hours]
+    }
+
+
+def mtbf_summary(events):
+    # ✅ 총 가동 시간 / 고장 횟수 (롤업 집계 rollup_mtbf_summary와 같은 기준)
+    #    가동 시간 = 가동(processing)과 병목 대기(blocked) 상태가 다음 이벤트까지 이어진 시간, 수리/유지보수 제외
+    running_states = ["processing", "blocked"]
+    total_processing_minutes = sum(
+        (next_event.time - event.time).total_seconds() / 60
+        for event, next_event in zip(events, events[1:])
+        if event.event_type in running_states
+    )
+    failure_count = sum(1 for event in events if event.event_type == "failure")
+    return _mtbf_result(failure_count, total_processing_minutes)
+
+
+def _mtbf_result(failure_count, total_processing_minutes):
+    mtbf = round(total_processing_minutes / failure_count, 1) if failure_count else 0
+    return {
+        "failure_count": failure_count,
+        "total_processing_minutes": round(total_processing_minutes, 1),
+        "mtbf_minutes": mtbf,
+        "summary_text": f"""🔁 MTBF 요약
+---------------------------
+고장 횟수: {failure_count}회
+총 운영 시간: {round(total_processing_minutes, 1)}분
+고장 간 평균 시간 (MTBF): {mtbf}분"""
+    }
+
+
+def mttr_summary(events):
+    # ✅ 수리(repair) start → finish만 짝지음 (블록/정비 start/finish는 수리가 아님)
+    repair_durations = []
+    repair_start = None
+    for event in events:
+        if event.event_type != "repair":
+            continue
+        if event.event_status == "start":
+            repair_start = _to_kst(event.time)
+        elif event.event_status == "finish" and repair_start is not None:
+            repair_durations.append((_to_kst(event.time) - repair_start).total_seconds() / 60)
+            repair_start = None
+
+    return _mttr_result(len(repair_durations), sum(repair_durations))
+
+
+def _mttr_result(repair_count, total_repair_time):
+    mttr = round(total_repair_time / repair_count, 1) if repair_count else 0
+    return {
+        "repair_count": repair_count,
+        "total_repair_minutes": round(total_repair_time, 1),
+        "mttr_minutes": mttr,
+        "summary_text": f"""🔧 MTTR 요약
+---------------------------
+수리 횟수: {repair_count}회
+총 수리 시간: {round(total_repair_time, 1)}분
+평균 수리 시간 (MTTR): {mttr}분"""
+    }
+
+
+def rollup_downtime_summary(rows):
+    """집계 행의 상태별 시간으로 다운타임 계산. 긴 기간이라 시간대 대신 날짜(KST)별로 나눔"""
+    failure_by_day = defaultdict(float)
+    repair_by_day = defaultdict(float)
+    blocked_by_day = defaultdict(float)
+    for row in rows:
+        day_label = _to_kst(row["time"]).strftime("%m/%d")
+        if row["failure_seconds"]:
+            failure_by_day[day_label] += row["failure_seconds"] / 60
+        if row["repair_seconds"]:
+            repair_by_day[day_label] += row["repair_seconds"] / 60
+        if row["blocked_seconds"]:
+            blocked_by_day[day_label] += row["blocked_seconds"] / 60
+    return _downtime_result(failure_by_day, repair_by_day, blocked_by_day)
+
+
+def rollup_mtbf_summary(rows):
+    # ✅ 가동 시간 = available(가동) + blocked(병목 대기), 유지보수/수리 시간 제외
+    uptime_seconds = sum(row["available_seconds"] + row["blocked_seconds"] for row in rows)
+    return _mtbf_result(int(sum(row["failure_count"] for row in rows)), uptime_seconds / 60)
+
+
+def rollup_mttr_summary(rows):
+    return _mttr_result(int(sum(row["repair_count"] for row in rows)), sum(row["repair_seconds"] for row in rows) / 60)
+
+
+# ===============================
+# DOCX 생성
+# ===============================
+# ✅ Downtime 기준에서 maintenance 제외
+def chart_specs(rep):
+    """보고서 한 건에 들어갈 차트 목록: {이름: (템플릿, 파라미터)}"""
+    specs = {}
+    if "available" in rep and rep["available"]:
+        avg = round(sum(rep["available"]) / len(rep["available"]) * 100, 1)
+        specs["donut"] = ("donut", {"percent": avg, "labels": ["가동률", "비가동률"], "colors": ["green", "#e0e0e0"]})
+    if "production" in rep:
+        specs["production"] = ("production_bar", {"input_cnt": rep["production"]["input"], "output_cnt": rep["production"]["output"]})
+    if "failureLabels" in rep and "failureCounts" in rep:
+        specs["failure_line"] = ("failure_line", {"labels": rep["failureLabels"], "values": rep["failureCounts"]})
+    if "failure_total" in rep and "maintenance_total" in rep and "total_processing_minutes" in rep:
+        specs["downtime_pie"] = ("downtime_pie", {
+            "failure_min": rep["failure_total"], "repair_min": rep["maintenance_total"],
+            "operating_min": rep["total_processing_minutes"]
+        })
+    if "downtime_hour_labels" in rep and "failure_by_hour" in rep:
+        specs["downtime_bar"] = ("downtime_bar", {"labels": rep["downtime_hour_labels"], "failureData": rep["failure_by_hour"]})
+    return specs
+
+
+def _flat_specs(report_data):
+    specs_by_rep = [chart_specs(rep) for rep in report_data]
+    return specs_by_rep, [spec for specs in specs_by_rep for spec in specs.values()]
+
+
+def _split_images(specs_by_rep, flat_pngs):
+    flat_pngs = iter(flat_pngs)
+    return [{name: next(flat_pngs) for name in specs} for specs in specs_by_rep]
+
+
+def render_charts(report_data):
+    """
+    보고서별 차트를 ({이름: 스펙} 목록, {이름: PNG bytes} 목록)으로 반환.
+    모든 공정의 차트를 모아 export_pool에서 병렬 렌더링 (동일 데이터 차트는 캐시 재사용)
+    """
+    specs_by_rep, flat_specs = _flat_specs(report_data)
+    return specs_by_rep, _split_images(specs_by_rep, renderer.render_many(flat_specs))
+
+
+async def render_charts_async(report_data):
+    specs_by_rep, flat_specs = _flat_specs(report_data)
+    return specs_by_rep, _split_images(specs_by_rep, await renderer.render_many_async(flat_specs))
+
+
+def build_docx(failure_labels, failure_counts, report_data, specs_by_rep, pngs_by_rep):
+    """렌더링된 차트로 DOCX를 조립해 bytes로 반환 (export_pool 워커에서 실행)"""
+    images_by_rep = [{name: BytesIO(png) for name, png in pngs.items()} for pngs in pngs_by_rep]
+
+    doc = Document()
+    title = doc.add_heading("스마트 제조 보고서", level=0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    author = doc.add_paragraph("작성자 :        ")
+    author.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    for rep, specs, images in zip(report_data, specs_by_rep, images_by_rep):
+        doc.add_heading(f"{rep['process']} 공정 보고서", level=1)
+        doc.add_paragraph(f"분석 기간: {rep.get('range', '')}")
+
+        if "summary" in rep:
+            doc.add_paragraph("요약", style="Heading 1")
+            doc.add_paragraph(rep["summary"])
+
+        if "donut" in images:
+            doc.add_paragraph(f"평균 가동률: {specs['donut'][1]['percent']}%")
+            doc.add_picture(images["donut"], width=Inches(2.5))
+
+        if "production" in rep:
+            p0 = rep["production"]["input"]
+            p3 = rep["production"]["output"]
+            rate = rep["production"]["rate"]
+            doc.add_paragraph(f"생산실적: 투입 {p0} → 산출 {p3} (양품률 {rate}%)")
+            doc.add_picture(images["production"], width=Inches(3))
+
+        if "mtbf_minutes" in rep and "total_processing_minutes" in rep and "failure_count" in rep:
+            doc.add_paragraph("MTBF 요약")
+            doc.add_paragraph("---------------------------")
+            doc.add_paragraph(f"고장 횟수: {rep['failure_count']}회")
+            doc.add_paragraph(f"총 운영 시간: {rep['total_processing_minutes']}분")
+            doc.add_paragraph(f"고장 간 평균 시간 (MTBF): {rep['mtbf_minutes']}분")
+
+        if "mttr_minutes" in rep and "total_repair_minutes" in rep and "repair_count" in rep:
+            doc.add_paragraph("MTTR 요약")
+            doc.add_paragraph("---------------------------")
+            doc.add_paragraph(f"수리 횟수: {rep['repair_count']}회")
+            doc.add_paragraph(f"총 수리 시간: {rep['total_repair_minutes']}분")
+            doc.add_paragraph(f"평균 수리 시간 (MTTR): {rep['mttr_minutes']}분")
+
+        if "failureLabels" in rep and "failureCounts" in rep:
+            doc.add_paragraph("고장 발생 분포")
+            doc.add_picture(images["failure_line"], width=Inches(4))
+
+        if "failure_total" in rep and "maintenance_total" in rep and "total_processing_minutes" in rep:
+            doc.add_paragraph("총 다운타임 분석")
+            doc.add_picture(images["downtime_pie"], width=Inches(3))
+
+        if "downtime_hour_labels" in rep and "failure_by_hour" in rep:
+            doc.add_paragraph("시간대별 고장 다운타임")
+            doc.add_picture(images["downtime_bar"], width=Inches(4.5))
+
+        if "maintenance_total" in rep:
+            doc.add_paragraph("정비 요약")
+            doc.add_paragraph(f"총 정비 시간: {rep['maintenance_total']}분")
+
+    # 부록: 고장 분포 테이블
+    doc.add_page_break()
+    doc.add_heading("전체 고장 발생 분포 테이블", level=1)
+    hour_map = {}
+    for label, count in zip(failure_labels, failure_counts):
+        hour = label[:2] + "시대"
+        hour_map[hour] = hour_map.get(hour, 0) + count
+
+    table = doc.add_table(rows=1, cols=2)
+    table.style = "Table Grid"
+    hdr = table.rows[0].cells
+    hdr[0].text = "시간대"
+    hdr[1].text = "고장 수"
+    for hour, cnt in sorted(hour_map.items()):
+        row = table.add_row().cells
+        row[0].text = hour
+        row[1].text = str(cnt)
+
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+# ===============================
+# XLSX 생성
+# ===============================
+def status_log_rows(process, events):
+    """공정 이력 시트 행: [시간, 가동여부, 이벤트 타입, 공정, 다운타임 여부, 시대]"""
+    downtime_states = ["failure", "repair"]
+    rows = []
+    for event in events:
+        time_obj = event.time.astimezone(KST)
+        rows.append([
+            time_obj.strftime("%Y-%m-%d %H:%M:%S"),
+            event.available,
+            event.event_type,
+            process,
+            "O" if event.event_type in downtime_states else "X",
+            time_obj.strftime("%H시대")
+        ])
+    return rows
+
+
+def rollup_log_rows(process, rows):
+    """긴 기간의 공정 이력 시트 행: 이벤트 대신 집계 구간마다 한 행 (가동여부 자리에 구간 가동률)"""
+    log_rows = []
+    for row in rows:
+        if not row["observed_seconds"]:
+            continue
+        time_obj = row["time"].astimezone(KST)
+        downtime = row["failure_seconds"] + row["repair_seconds"]
+        log_rows.append([
+            time_obj.strftime("%Y-%m-%d %H:%M:%S"),
+            round(row["available_seconds"] / row["observed_seconds"], 3),
+            f"집계 (고장 {int(row['failure_count'])}회, 수리 {int(row['repair_count'])}회)",
+            process,
+            "O" if downtime else "X",
+            time_obj.strftime("%H시대")
+        ])
+    return log_rows
+
+
+def production_rows(aggregated, results):
+    """
+    생산 실적 시트 행: [시간, 공정 ID, 제품 ID]. results는 rollups.query_production 결과.
+    긴 기간(aggregated)은 제품 대신 집계 구간마다 한 행 (제품 ID 자리에 건수)
+    """
+    rows = []
+    for tables in results:
+        for table in tables:
+            for record in table.records:
+                product = f"집계 {int(record.get_value() or 0)}개" if aggregated else record.values["product_id"]
+                rows.append([record.get_time().astimezone(KST).strftime("%Y-%m-%d %H:%M:%S"),
+                             record.values["process_id"], product])
+    return rows
+
+
+def build_excel(log_rows, prod_rows):
+    """공정 이력/생산 실적 시트를 최신순으로 정렬해 XLSX bytes로 반환 (export_pool 워커에서 실행)"""
+    wb = Workbook()
+
+    log_sheet = wb.active
+    log_sheet.title = "공정 이력"
+    log_sheet.append(["시간", "가동여부", "이벤트 타입", "공정", "다운타임 여부", "시대"])
+    for row in sorted(log_rows, key=lambda r: r[0], reverse=True):
+        log_sheet.append(row)
+
+    prod_ws = wb.create_sheet(title="생산 실적")
+    prod_ws.append(["시간", "공정 ID", "제품 ID"])
+    for row in sorted(prod_rows, key=lambda r: r[0], reverse=True):
+        prod_ws.append(row)
+
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+from datetime import datetime, timedelta
+from report_service import KST, HOURLY_RANGES, NIGHTLY_RANGES, STANDARD_RANGES
+from metrics import REPORT_WARM_SECONDS
+
+# ===============================
+# 표준 보고서 미리 생성 (캐시 워밍)
+# ===============================
+# 모든 라인 × 표준 기간의 보고서 재료(지표, 다운타임, 엑셀 행)를 정해진 주기에 미리 계산해 ReportCache에 저장.
+#  - 단기 기간(1h/3h/6h/9h): 매시 정각 이후 첫 점검 때
+#  - 주간/월간(7d/31d): 야간(REPORT_WARM_NIGHTLY_HOUR시, KST)부터 NIGHTLY_WINDOW_HOURS 안에 하루 한 번
+#    (낮에 서버가 시작돼도 바로 돌리지 않고 다음 야간까지 기다려 Influx 부하를 한가한 시간으로 옮김)
+# REPORT_WARM_NARRATIVE=1이면 LLM 서술까지 미리 생성 (아니면 클릭 시 서술만 생성).
+# 리스를 잡은 레플리카 하나만 생성하고, 마지막 생성 시각을 캐시에 남겨 리더가 바뀌어도 중복 생성하지 않음.
+REPORT_WARM_ENABLED = os.getenv("REPORT_WARM_ENABLED", "1") == "1"
+REPORT_WARM_NARRATIVE = os.getenv("REPORT_WARM_NARRATIVE", "0") == "1"
+REPORT_WARM_NIGHTLY_HOUR = int(os.getenv("REPORT_WARM_NIGHTLY_HOUR", "2"))
+NIGHTLY_WINDOW_HOURS = 4
+CHECK_INTERVAL = 60
+# 다음 갱신이 늦어져도 잠시 버틸 여유를 둔 캐시 TTL (갱신을 놓치면 만료되어 조회로 대체)
+HOURLY_TTL = 3600 + 600
+NIGHTLY_TTL = 86400 + 3600
+# 기간 하나를 생성하는 동안 리스가 끊기지 않을 만큼 길게
+WARM_LEASE_TTL = 600
+
+
+def cache_ttl(range_str):
+    return NIGHTLY_TTL if range_str in NIGHTLY_RANGES else HOURLY_TTL
+
+
+def current_slot(range_str, now):
+    """now(KST)가 속한 생성 슬롯의 시작 시각. 야간 기간이 생성 창 밖이면 None"""
+    if range_str in HOURLY_RANGES:
+        return now.replace(minute=0, second=0, microsecond=0)
+    slot = now.replace(hour=REPORT_WARM_NIGHTLY_HOUR, minute=0, second=0, microsecond=0)
+    if slot <= now < slot + timedelta(hours=NIGHTLY_WINDOW_HOURS):
+        return slot
+    return None
+
+
+class ReportWarmer:
+    """
+    warm_range(range_str)는 모든 라인의 재료를 계산해 캐시에 넣는 함수 (서버마다 동기/async 구현).
+    run()은 eventlet 서버, run_async()는 ASGI 서버에서 백그라운드로 실행.
+    """
+    def __init__(self, cache, lease, warm_range, ranges=STANDARD_RANGES):
+        self._cache = cache
+        self._lease = lease
+        self._warm_range = warm_range
+        self._ranges = ranges
+
+    def due_ranges(self, now=None):
+        now = now or datetime.now(KST)
+        due = []
+        for range_str in self._ranges:
+            slot = current_slot(range_str, now)
+            if slot is None:
+                continue
+            last = self._cache.last_warmed(range_str)
+            if last is None or last < slot.timestamp():
+                due.append(range_str)
+        return due
+
+    def _finish(self, range_str, started):
+        self._cache.mark_warmed(range_str, cache_ttl(range_str))
+        elapsed = time.perf_counter() - started
+        REPORT_WARM_SECONDS.labels(range=range_str).observe(elapsed)
+        print(f"[Warm] {range_str} 보고서 재료 생성 완료 ({elapsed:.1f}s)")
+
+    def run(self, sleep=time.sleep):
+        while True:
+            try:
+                for range_str in self.due_ranges():
+                    # 기간마다 리스를 갱신 (생성 중 다른 레플리카가 같은 기간을 시작하지 않도록)
+                    if not self._lease.acquire_or_renew():
+                        break
+                    started = time.perf_counter()
+                    self._warm_range(range_str)
+                    self._finish(range_str, started)
+            except Exception as e:
+                print(f"[Warm] error: {e}")
+            sleep(CHECK_INTERVAL)
+
+    async def run_async(self):
+        while True:
+            try:
+                for range_str in await asyncio.to_thread(self.due_ranges):
+                    if not await asyncio.to_thread(self._lease.acquire_or_renew):
+                        break
+                    started = time.perf_counter()
+                    await self._warm_range(range_str)
+                    await asyncio.to_thread(self._finish, range_str, started)
+            except Exception as e:
+                print(f"[Warm] error: {e}")
+            await asyncio.sleep(CHECK_INTERVAL)
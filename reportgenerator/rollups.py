@@ -0,0 +1,564 @@
+import os
+import asyncio
+import argparse
+from datetime import datetime, timezone, timedelta
+from influxdb_client import InfluxDBClient, BucketRetentionRules
+from dotenv import load_dotenv
+from topology import Topology
+from process_log import events_flux
+from status_log import StatusLogReader, AsyncStatusLogReader, read_schema as status_read_schema, STATUS_BUCKET, MEASUREMENT as STATUS_MEASUREMENT
+
+# ===============================
+# 롤업(다운샘플링) 설정
+# ===============================
+LINES = Topology.load().equipment_lines
+
+HOURLY_BUCKET = "rollup_1h"
+DAILY_BUCKET = "rollup_1d"
+HOURLY_RETENTION = timedelta(days=90)
+DAILY_RETENTION = None  # 일 단위 롤업은 무기한 보관
+
+TASK_PREFIX = "facman_rollup"
+
+# 이 길이 이상인 구간만 롤업을 사용 (짧은 기간은 원본 그대로 조회)
+HOURLY_MIN_RANGE = timedelta(days=1)
+DAILY_MIN_RANGE = timedelta(days=7)
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# 태스크 offset(5m/15m)만큼 지나야 직전 윈도우가 롤업 버킷에 기록됨
+HOURLY_TASK_LAG = timedelta(minutes=10)
+DAILY_TASK_LAG = timedelta(minutes=30)
+
+
+def _flux_time(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# ===============================
+# 롤업 Flux 스크립트
+# ===============================
+# 상태 롤업은 윈도우(1시간)마다 라인별로 각 상태가 다음 이벤트까지 이어진 시간을 윈도우 안으로 잘라 합산.
+# 윈도우 시작 전 마지막 상태(최근 STATE_CARRY 안)부터 이어서 계산해 긴 상태도 시간대별로 나뉘어 들어감.
+#   observed_seconds   상태가 확인된 시간       available_seconds  available=1 (가동/수리·정비 완료)
+#   blocked_seconds    blocked:start ~         failure_seconds    failure ~ repair:start (감지 대기)
+#   repair_seconds     repair:start ~ finish   failure_count      고장 횟수
+#   repair_count       수리 완료 횟수
+# 모두 합산 가능한 값이라 일 롤업은 시간 롤업의 합. 보고서의 가동률(시간 가중)/MTBF/MTTR/다운타임을 이 값으로 계산.
+STATE_CARRY = timedelta(hours=6)
+STATE_FIELDS = ("observed_seconds", "available_seconds", "blocked_seconds", "failure_seconds",
+                "repair_seconds", "failure_count", "repair_count")
+
+# 태스크는 직전 정시 1시간을 집계 (태스크의 now()는 예약 시각)
+TASK_WINDOW_START = "date.sub(d: 1h, from: date.truncate(t: now(), unit: 1h))"
+TASK_WINDOW_STOP = "date.truncate(t: now(), unit: 1h)"
+
+
+def _state_rollup_flux(imports, source, start, stop, bucket):
+    """
+    source: line/event_type/event_status/available 열의 상태 이벤트 행을 라인별 테이블로 만드는
+    Flux 함수 source(start, stop) 정의. start/stop은 윈도우 경계 Flux 시각 표현식.
+    """
+    carry = f"{int(STATE_CARRY.total_seconds())}s"
+    return f'''
+import "date"
+import "contrib/tomhollingworth/events"
+{imports}
+window_start = {start}
+window_stop = {stop}
+ws = int(v: window_start)
+
+{source}
+
+carry = source(start: date.sub(d: {carry}, from: window_start), stop: window_start)
+  |> sort(columns: ["_time"])
+  |> tail(n: 1)
+
+states = union(tables: [carry, source(start: window_start, stop: window_stop)])
+  |> group(columns: ["line"])
+  |> sort(columns: ["_time"])
+  |> events.duration(unit: 1ns, columnName: "span", stop: window_stop)
+  |> map(fn: (r) => {{
+      t = int(v: r._time)
+      s = if t < ws then ws else t
+      e = t + r.span
+      return {{r with seconds: if e > s then float(v: e - s) / 1000000000.0 else 0.0, in_window: t >= ws}}
+  }})
+  |> filter(fn: (r) => r.in_window or r.seconds > 0.0)
+
+total = (name, fn) => states
+  |> map(fn: (r) => ({{line: r.line, _value: fn(r: r)}}))
+  |> sum()
+  |> map(fn: (r) => ({{r with _time: window_start, _field: name}}))
+
+union(tables: [
+    total(name: "observed_seconds", fn: (r) => r.seconds),
+    total(name: "available_seconds", fn: (r) => if r.available == 1 then r.seconds else 0.0),
+    total(name: "blocked_seconds", fn: (r) => if r.event_type == "blocked" and r.event_status == "start" then r.seconds else 0.0),
+    total(name: "failure_seconds", fn: (r) => if r.event_type == "failure" then r.seconds else 0.0),
+    total(name: "repair_seconds", fn: (r) => if r.event_type == "repair" and r.event_status == "start" then r.seconds else 0.0),
+    total(name: "failure_count", fn: (r) => if r.in_window and r.event_type == "failure" then 1.0 else 0.0),
+    total(name: "repair_count", fn: (r) => if r.in_window and r.event_type == "repair" and r.event_status == "finish" then 1.0 else 0.0),
+])
+  |> set(key: "_measurement", value: "status_rollup")
+  |> group(columns: ["_measurement", "_field", "line"])
+  |> to(bucket: "{bucket}")
+'''
+
+
+def status_rollup_flux(line, start, stop, bucket):
+    """{line}_status 원본 이벤트로 윈도우 [start, stop)의 상태별 시간/고장/수리 집계"""
+    return _state_rollup_flux("", f'''source = (start, stop) => from(bucket: "{line}_status")
+  |> range(start: start, stop: stop)
+  |> filter(fn: (r) => r._measurement == "status_log")
+  |> filter(fn: (r) => r._field == "event_type" or r._field == "event_status" or r._field == "available")
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> map(fn: (r) => ({{
+      _time: r._time, line: "{line}", event_type: r.event_type,
+      event_status: if exists r.event_status then r.event_status else "", available: r.available
+  }}))
+  |> group(columns: ["line"])''', start, stop, bucket)
+
+
+def consolidated_status_rollup_flux(start, stop, bucket):
+    """통합 status 버킷의 전체 라인 이벤트를 한 번에 집계 (status_rollup_flux와 같은 출력)"""
+    return _state_rollup_flux('import "strings"', f'''source = (start, stop) => from(bucket: "{STATUS_BUCKET}")
+  |> range(start: start, stop: stop)
+  |> filter(fn: (r) => r._measurement == "{STATUS_MEASUREMENT}" and r._field == "state")
+  |> map(fn: (r) => {{
+      parts = strings.split(v: r._value, t: "|")
+      return {{_time: r._time, line: r.line, event_type: parts[0], event_status: parts[1], available: int(v: parts[2])}}
+  }})
+  |> group(columns: ["line"])''', start, stop, bucket)
+
+
+def process_rollup_flux(start, stop, every, bucket):
+    """process 버킷의 제품 이벤트를 공정/라인/상태별 건수로 변환 (product_id 차원은 제거)"""
+    return events_flux(f"|> range(start: {start}, stop: {stop})") + f'''
+  |> map(fn: (r) => ({{
+      _start: r._start, _stop: r._stop, _time: r._time,
+      _measurement: "process_rollup", _field: "count", _value: 1,
+      process_id: r.process_id, line_id: r.line_id, status: r._value
+  }}))
+  |> group(columns: ["_measurement", "_field", "process_id", "line_id", "status"])
+  |> aggregateWindow(every: {every}, fn: sum, timeSrc: "_start", createEmpty: false)
+  |> keep(columns: ["_time", "_measurement", "_field", "_value", "process_id", "line_id", "status"])
+  |> to(bucket: "{bucket}")
+'''
+
+
+def daily_rollup_flux(start, stop, bucket):
+    """시간 단위 롤업을 다시 일 단위로 합산"""
+    return f'''
+from(bucket: "{HOURLY_BUCKET}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r._measurement == "status_rollup" or r._measurement == "process_rollup")
+  |> aggregateWindow(every: 1d, fn: sum, timeSrc: "_start", createEmpty: false)
+  |> drop(columns: ["_start", "_stop"])
+  |> to(bucket: "{bucket}")
+'''
+
+
+def task_definitions(lines=LINES):
+    """(태스크 이름, 주기, offset, Flux) 목록"""
+    tasks = []
+    if status_read_schema() == "consolidated":
+        # 통합 버킷은 태스크 하나로 전체 라인을 집계 (라인이 늘어도 태스크 추가 불필요)
+        tasks.append((
+            f"{TASK_PREFIX}_1h_status", "1h", "5m",
+            consolidated_status_rollup_flux(TASK_WINDOW_START, TASK_WINDOW_STOP, HOURLY_BUCKET),
+        ))
+    else:
+        for line in lines:
+            tasks.append((
+                f"{TASK_PREFIX}_1h_status_{line}", "1h", "5m",
+                status_rollup_flux(line, TASK_WINDOW_START, TASK_WINDOW_STOP, HOURLY_BUCKET),
+            ))
+    tasks.append((
+        f"{TASK_PREFIX}_1h_process", "1h", "5m",
+        process_rollup_flux("-task.every", "now()", "1h", HOURLY_BUCKET),
+    ))
+    tasks.append((
+        f"{TASK_PREFIX}_1d", "1d", "15m",
+        daily_rollup_flux("-task.every", "now()", DAILY_BUCKET),
+    ))
+    return tasks
+
+
+# ===============================
+# 버킷/태스크 설치 및 백필
+# ===============================
+def ensure_buckets(client, org):
+    buckets_api = client.buckets_api()
+    for name, retention in [(HOURLY_BUCKET, HOURLY_RETENTION), (DAILY_BUCKET, DAILY_RETENTION), (STATUS_BUCKET, None)]:
+        if buckets_api.find_bucket_by_name(name):
+            continue
+        rules = []
+        if retention:
+            rules.append(BucketRetentionRules(type="expire", every_seconds=int(retention.total_seconds())))
+        buckets_api.create_bucket(bucket_name=name, retention_rules=rules, org=org)
+        print(f"버킷 생성: {name}")
+
+
+def install_tasks(client, org, lines=LINES):
+    tasks_api = client.tasks_api()
+    organization = client.organizations_api().find_organizations(org=org)[0]
+    for name, every, offset, flux in task_definitions(lines):
+        for existing in tasks_api.find_tasks(name=name):
+            tasks_api.delete_task(existing.id)
+        task = tasks_api.create_task_every(name=name, flux=flux, every=every, organization=organization)
+        task.offset = offset
+        tasks_api.update_task(task)
+        print(f"태스크 등록: {name} (every {every}, offset {offset})")
+
+
+def backfill(client, org, days, lines=LINES):
+    """태스크 설치 이전 구간을 롤업 버킷에 채움 (완료된 시간/일 단위까지만)"""
+    query_api = client.query_api()
+    now = datetime.now(timezone.utc)
+    hour_stop = _floor(now, HOUR)
+    day_stop = _floor(now, DAY)
+    start = day_stop - timedelta(days=days)
+
+    # 상태 롤업은 윈도우 하나(1시간)씩, 제품 롤업은 하루 단위로 나눠서 실행해 한 번의 쿼리가 너무 커지지 않도록 함
+    cursor = start
+    while cursor < hour_stop:
+        chunk_stop = min(cursor + DAY, hour_stop)
+        window = cursor
+        while window < chunk_stop:
+            if status_read_schema() == "consolidated":
+                query_api.query(org=org, query=consolidated_status_rollup_flux(
+                    _flux_time(window), _flux_time(window + HOUR), HOURLY_BUCKET))
+            else:
+                for line in lines:
+                    query_api.query(org=org, query=status_rollup_flux(
+                        line, _flux_time(window), _flux_time(window + HOUR), HOURLY_BUCKET))
+            window += HOUR
+        query_api.query(org=org, query=process_rollup_flux(
+            _flux_time(cursor), _flux_time(chunk_stop), "1h", HOURLY_BUCKET))
+        print(f"시간 롤업 백필: {cursor} ~ {chunk_stop}")
+        cursor = chunk_stop
+
+    query_api.query(org=org, query=daily_rollup_flux(_flux_time(start), _flux_time(day_stop), DAILY_BUCKET))
+    print(f"일 롤업 백필: {start} ~ {day_stop}")
+
+
+# ===============================
+# 조회 라우터
+# ===============================
+def _floor(dt, unit):
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return epoch + ((dt - epoch) // unit) * unit
+
+
+def _ceil(dt, unit):
+    floored = _floor(dt, unit)
+    return floored if floored == dt else floored + unit
+
+
+def parse_range(range_str, now=None):
+    """'1h', '7d', '시작/끝(ISO8601)' 형식을 UTC (start, stop)으로 변환"""
+    now = now or datetime.now(timezone.utc)
+    if "/" in range_str:
+        start_str, end_str = range_str.split("/")
+        start = datetime.fromisoformat(start_str.replace("Z", "+00:00"))
+        stop = datetime.fromisoformat(end_str.replace("Z", "+00:00"))
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone(timedelta(hours=9)))
+        if stop.tzinfo is None:
+            stop = stop.replace(tzinfo=timezone(timedelta(hours=9)))
+        return start.astimezone(timezone.utc), stop.astimezone(timezone.utc)
+
+    units = {"m": "minutes", "h": "hours", "d": "days"}
+    amount, unit = int(range_str[:-1]), range_str[-1]
+    return now - timedelta(**{units[unit]: amount}), now
+
+
+def plan_segments(start, stop, now=None):
+    """
+    조회 구간을 (source, start, stop) 조각으로 분할.
+    source는 "raw", "1h", "1d" 중 하나이며, 완료된 롤업 구간만 롤업 버킷에서 읽고
+    앞뒤 자투리와 아직 집계되지 않은 최근 구간은 원본 버킷에서 읽는다.
+    """
+    now = now or datetime.now(timezone.utc)
+    duration = stop - start
+    if duration < HOURLY_MIN_RANGE:
+        return [("raw", start, stop)]
+
+    # 태스크가 아직 집계하지 않은 최근 구간은 롤업에 없으므로 원본으로 처리
+    rolled_hour_stop = min(_floor(stop, HOUR), _floor(now - HOURLY_TASK_LAG, HOUR))
+    rolled_day_stop = min(_floor(stop, DAY), _floor(now - DAILY_TASK_LAG, DAY))
+
+    hour_start = _ceil(start, HOUR)
+    if hour_start >= rolled_hour_stop:
+        return [("raw", start, stop)]
+
+    middle = [("1h", hour_start, rolled_hour_stop)]
+    if duration >= DAILY_MIN_RANGE:
+        day_start = _ceil(start, DAY)
+        if day_start < rolled_day_stop:
+            middle = [
+                ("1h", hour_start, day_start),
+                ("1d", day_start, rolled_day_stop),
+                ("1h", rolled_day_stop, rolled_hour_stop),
+            ]
+
+    segments = [("raw", start, hour_start)] + middle + [("raw", rolled_hour_stop, stop)]
+    return [(source, s, e) for source, s, e in segments if s < e]
+
+
+def uses_rollups(start, stop):
+    return any(source != "raw" for source, _, _ in plan_segments(start, stop))
+
+
+def status_rows(events, start, stop, carry=None):
+    """
+    원본 이벤트를 롤업과 같은 필드의 행으로 변환 (상태 구간마다 한 행, 시간순).
+    carry는 start 이전 마지막 이벤트로, 구간 시작부터 첫 이벤트까지의 상태. 롤업 Flux와 같은 기준으로 계산.
+    """
+    timeline = ([carry] if carry is not None and carry.time < start else []) + [
+        event for event in events if start <= event.time < stop
+    ]
+    rows = []
+    for event, next_event in zip(timeline, timeline[1:] + [None]):
+        seg_start = max(event.time, start)
+        seconds = max(((next_event.time if next_event else stop) - seg_start).total_seconds(), 0.0)
+        state = (event.event_type, event.event_status)
+        in_range = event.time >= start
+        rows.append({
+            "time": seg_start,
+            "observed_seconds": seconds,
+            "available_seconds": seconds if event.available else 0.0,
+            "blocked_seconds": seconds if state == ("blocked", "start") else 0.0,
+            "failure_seconds": seconds if event.event_type == "failure" else 0.0,
+            "repair_seconds": seconds if state == ("repair", "start") else 0.0,
+            "failure_count": 1 if in_range and event.event_type == "failure" else 0,
+            "repair_count": 1 if in_range and state == ("repair", "finish") else 0,
+        })
+    return rows
+
+
+def query_status(query_api, org, line, start, stop):
+    """
+    상태 집계 행을 조회. 원본 구간은 상태 구간 단위, 롤업 구간은 윈도우 단위 행을 반환.
+    각 행: {"time", STATE_FIELDS...}
+    """
+    return query_status_many(query_api, org, [line], start, stop)[line]
+
+
+def _segment_range(seg_start, seg_stop):
+    return f"|> range(start: {_flux_time(seg_start)}, stop: {_flux_time(seg_stop)})"
+
+
+def _carry_range(seg_start):
+    return _segment_range(seg_start - STATE_CARRY, seg_start)
+
+
+def _status_rollup_query(lines, source, seg_start, seg_stop):
+    bucket = HOURLY_BUCKET if source == "1h" else DAILY_BUCKET
+    line_set = ", ".join(f'"{line}"' for line in lines)
+    field_set = ", ".join(f'"{field}"' for field in STATE_FIELDS)
+    return f'''
+    from(bucket: "{bucket}")
+      {_segment_range(seg_start, seg_stop)}
+      |> filter(fn: (r) => r._measurement == "status_rollup" and contains(value: r.line, set: [{line_set}]))
+      |> filter(fn: (r) => contains(value: r._field, set: [{field_set}]))
+      |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+
+
+def _collect_status_rows(lines, segment_results):
+    """[("raw", (start, stop, {line: carry}, {line: [StatusEvent]})) | ("rollup", 쿼리 결과)] → {line: [행, ...]} (시간순)"""
+    rows = {line: [] for line in lines}
+    for kind, result in segment_results:
+        if kind == "raw":
+            seg_start, seg_stop, carry, events = result
+            for line in lines:
+                rows[line].extend(status_rows(events.get(line, []), seg_start, seg_stop, carry.get(line)))
+            continue
+        for table in result:
+            for record in table.records:
+                row = {"time": record.values["_time"]}
+                row.update({field: record.values.get(field) or 0 for field in STATE_FIELDS})
+                rows[record.values["line"]].append(row)
+    for line_rows in rows.values():
+        line_rows.sort(key=lambda r: r["time"])
+    return rows
+
+
+def query_status_many(query_api, org, lines, start, stop):
+    """여러 라인을 구간마다 한 번씩 조회: {line: [행, ...]}"""
+    lines = list(lines)
+    reader = StatusLogReader(query_api, org)
+    results = []
+    for source, seg_start, seg_stop in plan_segments(start, stop):
+        if source == "raw":
+            carry = reader.latest(lines, _carry_range(seg_start))
+            results.append(("raw", (seg_start, seg_stop, carry, reader.events(lines, _segment_range(seg_start, seg_stop)))))
+        else:
+            results.append(("rollup", query_api.query(org=org, query=_status_rollup_query(lines, source, seg_start, seg_stop))))
+    return _collect_status_rows(lines, results)
+
+
+async def query_status_many_async(query_api, org, lines, start, stop):
+    """query_status_many의 InfluxDBClientAsync 버전. 구간별 쿼리를 동시에 실행"""
+    lines = list(lines)
+    reader = AsyncStatusLogReader(query_api, org)
+
+    async def segment(source, seg_start, seg_stop):
+        if source == "raw":
+            carry, events = await asyncio.gather(
+                reader.latest(lines, _carry_range(seg_start)),
+                reader.events(lines, _segment_range(seg_start, seg_stop)),
+            )
+            return "raw", (seg_start, seg_stop, carry, events)
+        return "rollup", await query_api.query(query=_status_rollup_query(lines, source, seg_start, seg_stop), org=org)
+
+    results = await asyncio.gather(*(segment(*seg) for seg in plan_segments(start, stop)))
+    return _collect_status_rows(lines, results)
+
+
+def query_status_report(query_api, org, lines, start, stop):
+    """
+    보고서용 상태 데이터: {line: (행, 원본 이벤트 또는 None)}.
+    롤업을 쓰지 않는 짧은 기간은 원본 이벤트 한 번 조회로 행과 이벤트를 함께 만들고,
+    롤업 구간이 있는 긴 기간은 집계 행만 반환 (원본은 앞뒤 자투리 구간만 읽음)
+    """
+    lines = list(lines)
+    if uses_rollups(start, stop):
+        rows = query_status_many(query_api, org, lines, start, stop)
+        return {line: (rows[line], None) for line in lines}
+    reader = StatusLogReader(query_api, org)
+    carry = reader.latest(lines, _carry_range(start))
+    events = reader.events(lines, _segment_range(start, stop))
+    return {line: (status_rows(events[line], start, stop, carry.get(line)), events[line]) for line in lines}
+
+
+async def query_status_report_async(query_api, org, lines, start, stop):
+    """query_status_report의 InfluxDBClientAsync 버전"""
+    lines = list(lines)
+    if uses_rollups(start, stop):
+        rows = await query_status_many_async(query_api, org, lines, start, stop)
+        return {line: (rows[line], None) for line in lines}
+    reader = AsyncStatusLogReader(query_api, org)
+    carry, events = await asyncio.gather(
+        reader.latest(lines, _carry_range(start)),
+        reader.events(lines, _segment_range(start, stop)),
+    )
+    return {line: (status_rows(events[line], start, stop, carry.get(line)), events[line]) for line in lines}
+
+
+def _process_count_queries(start, stop):
+    queries = []
+    for source, seg_start, seg_stop in plan_segments(start, stop):
+        if source == "raw":
+            queries.append(events_flux(_segment_range(seg_start, seg_stop)) + '''
+              |> map(fn: (r) => ({r with status: r._value}))
+              |> group(columns: ["process_id", "line_id", "status"])
+              |> count()
+            ''')
+        else:
+            bucket = HOURLY_BUCKET if source == "1h" else DAILY_BUCKET
+            queries.append(f'''
+            from(bucket: "{bucket}")
+              {_segment_range(seg_start, seg_stop)}
+              |> filter(fn: (r) => r._measurement == "process_rollup" and r._field == "count")
+              |> group(columns: ["process_id", "line_id", "status"])
+              |> sum()
+            ''')
+    return queries
+
+
+def _collect_process_counts(results):
+    counts = {}
+    for tables in results:
+        for table in tables:
+            for record in table.records:
+                key = (record.values.get("process_id", ""), record.values.get("line_id", ""), record.values.get("status", ""))
+                counts[key] = counts.get(key, 0) + int(record.get_value() or 0)
+    return counts
+
+
+def query_process_counts(query_api, org, start, stop):
+    """공정/라인/상태별 제품 이벤트 건수: {(process_id, line_id, status): count}"""
+    return _collect_process_counts(
+        query_api.query(org=org, query=query) for query in _process_count_queries(start, stop)
+    )
+
+
+async def query_process_counts_async(query_api, org, start, stop):
+    """query_process_counts의 InfluxDBClientAsync 버전"""
+    return _collect_process_counts(await asyncio.gather(
+        *(query_api.query(query=query, org=org) for query in _process_count_queries(start, stop))
+    ))
+
+
+# 생산 실적 시트의 제품 이벤트: 투입 공정의 input, sink 공정의 arrival (소스 폐기 reject 제외)
+PRODUCTION_STATUSES = ["input", "arrival"]
+
+
+def _production_queries(processes, start, stop):
+    """
+    (집계 여부, 쿼리 목록). 롤업을 쓰지 않는 짧은 기간은 제품별 원본 이벤트를,
+    긴 기간은 롤업 구간과 원본 자투리 모두 공정별 시간(일 롤업 구간은 일) 단위 건수를 조회
+    """
+    process_set = ", ".join(f'"{process}"' for process in processes)
+    where = f"contains(value: r.process_id, set: [{process_set}])"
+    if not uses_rollups(start, stop):
+        return False, [events_flux(_segment_range(start, stop), statuses=PRODUCTION_STATUSES, where=where) + '''
+          |> keep(columns: ["_time", "process_id", "product_id"])
+        ''']
+
+    status_set = ", ".join(f'"{status}"' for status in PRODUCTION_STATUSES)
+    queries = []
+    for source, seg_start, seg_stop in plan_segments(start, stop):
+        if source == "raw":
+            queries.append(events_flux(_segment_range(seg_start, seg_stop), statuses=PRODUCTION_STATUSES, where=where) + '''
+              |> group(columns: ["process_id"])
+              |> aggregateWindow(every: 1h, fn: count, timeSrc: "_start", createEmpty: false)
+            ''')
+        else:
+            bucket = HOURLY_BUCKET if source == "1h" else DAILY_BUCKET
+            queries.append(f'''
+            from(bucket: "{bucket}")
+              {_segment_range(seg_start, seg_stop)}
+              |> filter(fn: (r) => r._measurement == "process_rollup" and r._field == "count")
+              |> filter(fn: (r) => {where} and contains(value: r.status, set: [{status_set}]))
+              |> group(columns: ["process_id"])
+              |> aggregateWindow(every: {source}, fn: sum, timeSrc: "_start", createEmpty: false)
+            ''')
+    return True, queries
+
+
+def query_production(query_api, org, processes, start, stop):
+    """생산 실적 시트 조회: (집계 여부, [tables, ...]). 집계면 레코드 값이 구간 건수"""
+    aggregated, queries = _production_queries(processes, start, stop)
+    return aggregated, [query_api.query(org=org, query=query) for query in queries]
+
+
+async def query_production_async(query_api, org, processes, start, stop):
+    """query_production의 InfluxDBClientAsync 버전"""
+    aggregated, queries = _production_queries(processes, start, stop)
+    return aggregated, await asyncio.gather(*(query_api.query(query=query, org=org) for query in queries))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="InfluxDB 롤업 버킷/태스크 관리")
+    parser.add_argument("--install", action="store_true", help="롤업 버킷 생성 및 태스크 등록")
+    parser.add_argument("--backfill_days", type=int, default=0, help="과거 N일 구간을 롤업 버킷에 채움")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    load_dotenv()
+    org = os.getenv("INFLUX_ORG")
+    client = InfluxDBClient(url=os.getenv("INFLUX_URL"), token=os.getenv("INFLUX_TOKEN"), org=org)
+
+    if args.install:
+        ensure_buckets(client, org)
+        install_tasks(client, org)
+    if args.backfill_days:
+        backfill(client, org, args.backfill_days)
@@ -1,6 +1,10 @@
 let gaugeCharts = {};
 let lineCharts = {};
 let fullReportData = [];
+// 완료된 보고서 작업 ID (다운로드는 서버에 저장된 산출물로 생성)
+let currentJobId = null;
+// 진행 중인 보고서 작업과 화면 옵션
+let pendingJob = null;
 
 function updateClock() {
   const now = new Date();
@@ -90,237 +94,255 @@ function generateReport() {
     }
   }
 
-  fetch("/generate_report", {
+  fetch("/report_jobs", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ processes, range: rangeParam, options: includeOptions }),
   })
     .then(res => res.json())
-    .then(data => {
-      if (data.error) {
-        reportBox.textContent = "❌ " + data.error;
+    .then(job => {
+      if (job.error) {
+        reportBox.textContent = "❌ " + job.error;
         return;
       }
-      data.reports = data.reports.map(rep => ({
-        ...rep,
-        range: rangeParam
-      }));
-
-      let resultText = "✅ 보고서 생성 완료\n";
-      const tabs = document.getElementById("tabs");       // ✅ 탭 컨테이너
-      const chartsArea = document.getElementById("chartsArea");  // ✅ 실제 내용 보여줄 영역
-      tabs.innerHTML = "";
-      chartsArea.innerHTML = "";
-    
-      fullReportData = data.reports;
-        // ✅ 1. 여기서 탭을 생성
-      data.reports.forEach((rep, idx) => {
-        const tabBtn = document.createElement("div");
-        tabBtn.className = "tab";
-        tabBtn.textContent = rep.process;
-        if (idx === 0) tabBtn.classList.add("active");
-        tabBtn.dataset.target = `tab-${rep.process}`;
-        tabs.appendChild(tabBtn);
-
-        tabBtn.addEventListener("click", () => {
-          document.querySelectorAll(".tab").forEach(t => t.classList.remove("active"));
-          document.querySelectorAll(".tab-content").forEach(c => c.classList.remove("active"));
-          tabBtn.classList.add("active");
-          document.getElementById(`tab-${rep.process}`).classList.add("active");
-        });
-      });
-      // ✅ 2. 여기서 각 공정별 콘텐츠 div를 만들고 기존 append → chartsArea → content 로 바꿈
-      data.reports.forEach((rep, idx) => {
-        resultText += `\n\n📌 [${rep.process}] 공정\n${rep.report}\n`;
-
-        const content = document.createElement("div");
-        content.className = "tab-content";
-        content.id = `tab-${rep.process}`;
-
-        const periodInfo = document.createElement("p");
-        periodInfo.textContent = `📅 분석 기간: ${rep.range || ''}`;
-        periodInfo.style.fontSize = "13px";
-        periodInfo.style.marginBottom = "8px";
-        content.appendChild(periodInfo);
-
-        if (idx === 0) content.classList.add("active");
-        chartsArea.appendChild(content);
-
-        // 1. 가동률
-        if (includeOptions.availability && rep.available) {
-          const availContainer = document.createElement("div");
-          availContainer.innerHTML = `<h4 class="report-subtitle">📈 가동률</h4>`;
-          
-          const gaugeCanvas = document.createElement("canvas");
-          gaugeCanvas.width = 200;
-          gaugeCanvas.height = 200;
-          gaugeCanvas.id = `availabilityImage-${rep.process}`;
-          availContainer.appendChild(gaugeCanvas);     
-          content.appendChild(availContainer);         
-        
-          drawGaugeChart(gaugeCanvas, rep.available, rep.process);
-        }
+      // ✅ 작업이 끝나기 전에는 이전 보고서를 다운로드하지 않도록 초기화
+      currentJobId = null;
+      fullReportData = [];
+      pendingJob = { jobId: job.job_id, includeOptions, startTime, endTime };
+      reportSocket.emit("subscribe_report_job", { job_id: job.job_id });
+    })
+    .catch(err => {
+      reportBox.textContent = "❌ 보고서 생성 실패";
+      console.error("Error while generating report:", err);
+    });
+}
 
-        // 2. 생산실적
-        if (includeOptions.production && rep.production) {
-          const prodBox = document.createElement("div");
-          prodBox.innerHTML = `
-            <h4 class="report-subtitle">📦 생산실적</h4>
-            <p>투입량(P0): ${rep.production.input}개</p>
-            <p>생산량(P3): ${rep.production.output}개</p>
-            <p>생산실적률: ${rep.production.rate}%</p>
-          `;
-          content.appendChild(prodBox);
-        }
+// ✅ 보고서 작업 진행 상황 수신 (완료되면 서버에 저장된 결과를 받아 화면에 그림)
+const reportSocket = io({ transports: ["websocket"] });
 
-        // 3. 다운타임
-        if (includeOptions.downtime) {
-          fetch("/get_downtime_data", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ process: rep.process, range: rangeParam })
-          })
-            .then(res => res.json())
-            .then(downtime => {
-              const downtimeWrapper = document.createElement("div");
-              downtimeWrapper.innerHTML = `<h4 class="report-subtitle">📉 다운타임 분석</h4>`;
-
-              const pieCanvas = document.createElement("canvas");
-              pieCanvas.id = `downtimePie-${rep.process}`;
-              pieCanvas.style.width = "300px";
-              pieCanvas.style.height = "200px";
-
-              const barCanvas = document.createElement("canvas");
-              barCanvas.id = `downtimeBar-${rep.process}`;
-              barCanvas.style.width = "300px";
-              barCanvas.style.height = "200px";
-
-              const downtimeContainer = document.createElement("div");
-              downtimeContainer.className = "downtime-chart-group";
-              downtimeContainer.style.display = "flex";
-              downtimeContainer.style.justifyContent = "flex-start";  // 왼쪽 정렬
-              downtimeContainer.style.alignItems = "center";          // 높이 맞춤
-              downtimeContainer.style.gap = "20px";
-              downtimeContainer.style.marginBottom = "40px";
-
-              downtimeContainer.appendChild(pieCanvas);
-              downtimeContainer.appendChild(barCanvas);
-              downtimeWrapper.appendChild(downtimeContainer);  
-              content.appendChild(downtimeWrapper);     
-
-              drawDowntimePieChart(pieCanvas, downtime.failure_total, rep.total_processing_minutes);
-              drawDowntimeBarChart(barCanvas, downtime.hourly_labels, downtime.failure_by_hour, downtime.repair_by_hour);
-            });
-        }
-        
-        // 4. 고장 건수
-        if (includeOptions.failureCount && rep.failures) {
-          const startHour = startTime ? parseInt(startTime.substring(11, 13)) : 0;
-          const endHour = endTime ? parseInt(endTime.substring(11, 13)) : 23;
-
-          const hourMap = {};
-          rep.labels.forEach((label, i) => {
-            if (!label || label.length < 2) return;
-            const hour = parseInt(label.substring(0, 2));
-            if (hour < startHour || hour > endHour) return;
-
-            const hourKey = `${hour.toString().padStart(2, "0")}시대`;
-            if (!hourMap[hourKey]) hourMap[hourKey] = 0;
-            hourMap[hourKey] += rep.failures[i];
-          });
-
-          const hourlyLabels = Object.keys(hourMap);
-          const hourlyFailures = Object.values(hourMap);
-
-          const failureWrapper = document.createElement("div");
-          failureWrapper.innerHTML = `<h4 class="report-subtitle">📊 고장 발생 분포</h4>`;
-
-          const rowContainer = document.createElement("div");
-          rowContainer.className = "report-row-container";
-
-          const lineCanvas = document.createElement("canvas");
-          lineCanvas.width = 400;
-          lineCanvas.height = 300;
-          lineCanvas.id = `failureLineChart-${rep.process}`;
-          rowContainer.appendChild(lineCanvas);
-
-          const tableWrapper = document.createElement("div");
-          tableWrapper.style.display = "grid";
-          tableWrapper.style.gridTemplateColumns = "120px 120px";
-          tableWrapper.style.gap = "6px";
-          tableWrapper.style.alignContent = "start";
-
-          hourlyLabels.forEach((label, i) => {
-            const cell = document.createElement("div");
-            cell.style.border = "1px solid #999";
-            cell.style.padding = "6px";
-            cell.textContent = `${label}: ${hourlyFailures[i]}건`;
-            tableWrapper.appendChild(cell);
-          });
-
-          rowContainer.appendChild(tableWrapper);
-          failureWrapper.appendChild(rowContainer);  // ✅ wrapper에 rowContainer 삽입
-          content.appendChild(failureWrapper);       
-
-          drawLineChart(lineCanvas, hourlyLabels, hourlyFailures, rep.process);
-        }
+reportSocket.on("connect", () => {
+  // 재연결 시 진행 중인 작업을 다시 구독 (서버가 현재 상태를 바로 보내줌)
+  if (pendingJob) reportSocket.emit("subscribe_report_job", { job_id: pendingJob.jobId });
+});
 
-        // 5. MTBF  
-        if (includeOptions.mtbf) {
-          fetch("/get_mtbf_data", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ process: rep.process, range: rangeParam })
-          })
-            .then(res => res.json())
-            .then(mtbfData => {
-              const mtbfContainer = document.createElement("div");
-              mtbfContainer.innerHTML = `<h4 class="report-subtitle">🔁 MTBF(고장 구간 사이 평균시간)</h4>`;
-        
-              const infoBox = document.createElement("div");
-              infoBox.style.marginBottom = "20px";
-              infoBox.innerHTML = `
-                <p style="font-size:28px; font-weight:bold;">${mtbfData.mtbf_minutes}분</p>
-                <p><strong>총 가동 시간:</strong> ${mtbfData.total_processing_minutes}분</p>
-                <p><strong>고장 횟수:</strong> ${mtbfData.failure_count}회</p>
-              `;
-        
-              mtbfContainer.appendChild(infoBox);
-              content.appendChild(mtbfContainer);
-            });
-        }
+reportSocket.on("report_job", job => {
+  if (!pendingJob || job.job_id !== pendingJob.jobId) return;
+  const reportBox = document.getElementById("reportBox");
 
-        // 6. MTTR
-        if (includeOptions.mttr) {
-          fetch("/get_mttr_data", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ process: rep.process, range: rangeParam })
-          })
-            .then(res => res.json())
-            .then(mttrData => {
-              const mttrContainer = document.createElement("div");
-              mttrContainer.innerHTML = `<h4 class="report-subtitle">🔧 MTTR(복구에 걸리는 평균 시간)</h4>`;
-        
-              const infoBox = document.createElement("div");
-              infoBox.style.marginBottom = "20px";
-              infoBox.innerHTML = `
-                <p style="font-size:28px; font-weight:bold;">${mttrData.mttr_minutes}분</p>
-                <p>고장 ${mttrData.repair_count}회<br>총 수리 시간 ${mttrData.total_repair_minutes}분</p>
-              `;
-        
-              mttrContainer.appendChild(infoBox);
-              content.appendChild(mttrContainer);
-            });
-        }
-      });
+  if (job.status === "error") {
+    pendingJob = null;
+    reportBox.textContent = "❌ " + job.error;
+    return;
+  }
+  if (job.status !== "done") {
+    reportBox.textContent = `📄 보고서 생성 중... (${job.done}/${job.total || "?"})`;
+    return;
+  }
 
-      reportBox.innerHTML = `<pre>${resultText}</pre>`;
+  const request = pendingJob;
+  pendingJob = null;
+  fetch(`/report_jobs/${job.job_id}`)
+    .then(res => res.json())
+    .then(data => {
+      currentJobId = job.job_id;
+      renderReports(data.result.reports, request);
     })
     .catch(err => {
       reportBox.textContent = "❌ 보고서 생성 실패";
-      console.error("Error while generating report:", err);
+      console.error("Error while loading report:", err);
+    });
+});
+
+function renderReports(reports, { includeOptions, startTime, endTime }) {
+  const reportBox = document.getElementById("reportBox");
+  let resultText = "✅ 보고서 생성 완료\n";
+  const tabs = document.getElementById("tabs");       // ✅ 탭 컨테이너
+  const chartsArea = document.getElementById("chartsArea");  // ✅ 실제 내용 보여줄 영역
+  tabs.innerHTML = "";
+  chartsArea.innerHTML = "";
+
+  fullReportData = reports;
+  // ✅ 1. 여기서 탭을 생성
+  reports.forEach((rep, idx) => {
+    const tabBtn = document.createElement("div");
+    tabBtn.className = "tab";
+    tabBtn.textContent = rep.process;
+    if (idx === 0) tabBtn.classList.add("active");
+    tabBtn.dataset.target = `tab-${rep.process}`;
+    tabs.appendChild(tabBtn);
+
+    tabBtn.addEventListener("click", () => {
+      document.querySelectorAll(".tab").forEach(t => t.classList.remove("active"));
+      document.querySelectorAll(".tab-content").forEach(c => c.classList.remove("active"));
+      tabBtn.classList.add("active");
+      document.getElementById(`tab-${rep.process}`).classList.add("active");
     });
+  });
+  // ✅ 2. 여기서 각 공정별 콘텐츠 div를 만들고 기존 append → chartsArea → content 로 바꿈
+  reports.forEach((rep, idx) => {
+    resultText += `\n\n📌 [${rep.process}] 공정\n${rep.report}\n`;
+
+    const content = document.createElement("div");
+    content.className = "tab-content";
+    content.id = `tab-${rep.process}`;
+
+    const periodInfo = document.createElement("p");
+    // 미리 생성된 표준 기간 보고서는 기준 시각까지의 데이터
+    periodInfo.textContent = `📅 분석 기간: ${rep.range || ''}` + (rep.generated_at ? ` (기준 ${rep.generated_at})` : "");
+    periodInfo.style.fontSize = "13px";
+    periodInfo.style.marginBottom = "8px";
+    content.appendChild(periodInfo);
+
+    if (idx === 0) content.classList.add("active");
+    chartsArea.appendChild(content);
+
+    // 1. 가동률
+    if (includeOptions.availability && rep.available) {
+      const availContainer = document.createElement("div");
+      availContainer.innerHTML = `<h4 class="report-subtitle">📈 가동률</h4>`;
+
+      const gaugeCanvas = document.createElement("canvas");
+      gaugeCanvas.width = 200;
+      gaugeCanvas.height = 200;
+      gaugeCanvas.id = `availabilityImage-${rep.process}`;
+      availContainer.appendChild(gaugeCanvas);
+      content.appendChild(availContainer);
+
+      drawGaugeChart(gaugeCanvas, rep.available, rep.process);
+    }
+
+    // 2. 생산실적
+    if (includeOptions.production && rep.production) {
+      const prodBox = document.createElement("div");
+      prodBox.innerHTML = `
+        <h4 class="report-subtitle">📦 생산실적</h4>
+        <p>투입량: ${rep.production.input}개</p>
+        <p>생산량: ${rep.production.output}개</p>
+        <p>생산실적률: ${rep.production.rate}%</p>
+      `;
+      content.appendChild(prodBox);
+    }
+
+    // 3. 다운타임 (작업 결과에 함께 저장됨)
+    if (includeOptions.downtime && rep.downtime) {
+      const downtime = rep.downtime;
+      const downtimeWrapper = document.createElement("div");
+      downtimeWrapper.innerHTML = `<h4 class="report-subtitle">📉 다운타임 분석</h4>`;
+
+      const pieCanvas = document.createElement("canvas");
+      pieCanvas.id = `downtimePie-${rep.process}`;
+      pieCanvas.style.width = "300px";
+      pieCanvas.style.height = "200px";
+
+      const barCanvas = document.createElement("canvas");
+      barCanvas.id = `downtimeBar-${rep.process}`;
+      barCanvas.style.width = "300px";
+      barCanvas.style.height = "200px";
+
+      const downtimeContainer = document.createElement("div");
+      downtimeContainer.className = "downtime-chart-group";
+      downtimeContainer.style.display = "flex";
+      downtimeContainer.style.justifyContent = "flex-start";  // 왼쪽 정렬
+      downtimeContainer.style.alignItems = "center";          // 높이 맞춤
+      downtimeContainer.style.gap = "20px";
+      downtimeContainer.style.marginBottom = "40px";
+
+      downtimeContainer.appendChild(pieCanvas);
+      downtimeContainer.appendChild(barCanvas);
+      downtimeWrapper.appendChild(downtimeContainer);
+      content.appendChild(downtimeWrapper);
+
+      drawDowntimePieChart(pieCanvas, downtime.failure_total, rep.total_processing_minutes);
+      drawDowntimeBarChart(barCanvas, downtime.hourly_labels, downtime.failure_by_hour, downtime.repair_by_hour);
+    }
+
+    // 4. 고장 건수
+    if (includeOptions.failureCount && rep.failures) {
+      const startHour = startTime ? parseInt(startTime.substring(11, 13)) : 0;
+      const endHour = endTime ? parseInt(endTime.substring(11, 13)) : 23;
+
+      const hourMap = {};
+      rep.labels.forEach((label, i) => {
+        if (!label || label.length < 2) return;
+        const hour = parseInt(label.substring(0, 2));
+        if (hour < startHour || hour > endHour) return;
+
+        const hourKey = `${hour.toString().padStart(2, "0")}시대`;
+        if (!hourMap[hourKey]) hourMap[hourKey] = 0;
+        hourMap[hourKey] += rep.failures[i];
+      });
+
+      const hourlyLabels = Object.keys(hourMap);
+      const hourlyFailures = Object.values(hourMap);
+
+      const failureWrapper = document.createElement("div");
+      failureWrapper.innerHTML = `<h4 class="report-subtitle">📊 고장 발생 분포</h4>`;
+
+      const rowContainer = document.createElement("div");
+      rowContainer.className = "report-row-container";
+
+      const lineCanvas = document.createElement("canvas");
+      lineCanvas.width = 400;
+      lineCanvas.height = 300;
+      lineCanvas.id = `failureLineChart-${rep.process}`;
+      rowContainer.appendChild(lineCanvas);
+
+      const tableWrapper = document.createElement("div");
+      tableWrapper.style.display = "grid";
+      tableWrapper.style.gridTemplateColumns = "120px 120px";
+      tableWrapper.style.gap = "6px";
+      tableWrapper.style.alignContent = "start";
+
+      hourlyLabels.forEach((label, i) => {
+        const cell = document.createElement("div");
+        cell.style.border = "1px solid #999";
+        cell.style.padding = "6px";
+        cell.textContent = `${label}: ${hourlyFailures[i]}건`;
+        tableWrapper.appendChild(cell);
+      });
+
+      rowContainer.appendChild(tableWrapper);
+      failureWrapper.appendChild(rowContainer);  // ✅ wrapper에 rowContainer 삽입
+      content.appendChild(failureWrapper);
+
+      drawLineChart(lineCanvas, hourlyLabels, hourlyFailures, rep.process);
+    }
+
+    // 5. MTBF (보고서 생성 시 함께 계산됨)
+    if (includeOptions.mtbf) {
+      const mtbfContainer = document.createElement("div");
+      mtbfContainer.innerHTML = `<h4 class="report-subtitle">🔁 MTBF(고장 구간 사이 평균시간)</h4>`;
+
+      const infoBox = document.createElement("div");
+      infoBox.style.marginBottom = "20px";
+      infoBox.innerHTML = `
+        <p style="font-size:28px; font-weight:bold;">${rep.mtbf_minutes}분</p>
+        <p><strong>총 가동 시간:</strong> ${rep.total_processing_minutes}분</p>
+        <p><strong>고장 횟수:</strong> ${rep.failure_count}회</p>
+      `;
+
+      mtbfContainer.appendChild(infoBox);
+      content.appendChild(mtbfContainer);
+    }
+
+    // 6. MTTR (보고서 생성 시 함께 계산됨)
+    if (includeOptions.mttr) {
+      const mttrContainer = document.createElement("div");
+      mttrContainer.innerHTML = `<h4 class="report-subtitle">🔧 MTTR(복구에 걸리는 평균 시간)</h4>`;
+
+      const infoBox = document.createElement("div");
+      infoBox.style.marginBottom = "20px";
+      infoBox.innerHTML = `
+        <p style="font-size:28px; font-weight:bold;">${rep.mttr_minutes}분</p>
+        <p>고장 ${rep.repair_count}회<br>총 수리 시간 ${rep.total_repair_minutes}분</p>
+      `;
+
+      mttrContainer.appendChild(infoBox);
+      content.appendChild(mttrContainer);
+    }
+  });
+
+  reportBox.innerHTML = `<pre>${resultText}</pre>`;
 }
 
 
@@ -498,90 +520,39 @@ async function waitForCanvasRendered(canvasId, timeout = 2000) {
   return null;
 }
 
-// ✅ Docx 파일 다운로드
-async function downloadDocx() {
-  if (!fullReportData || fullReportData.length === 0) {
-    alert("⚠️ 먼저 보고서를 생성하세요.");
-    return;
-  }
-
-  const formData = new FormData();
-
-  // 1. 전체 요약 텍스트 생성
-  let combinedReport = "";
-  let combinedFailureLabels = [];
-  let combinedFailureCounts = [];
-
-  for (let rep of fullReportData) {
-    combinedReport += `\n\n📌 [${rep.process}] 공정\n📅 분석 기간: ${rep.range}\n${rep.report}\n`;
-
-
-    if (rep.failureLabels && rep.failureCounts) {
-      combinedFailureLabels = combinedFailureLabels.concat(rep.failureLabels);
-      combinedFailureCounts = combinedFailureCounts.concat(rep.failureCounts);
-    }
-  }
-
-  // 2. 데이터 추가 (텍스트, 고장 테이블, 전체 reportData)
-  formData.append("report", combinedReport);
-  formData.append("failureLabels", JSON.stringify(combinedFailureLabels));
-  formData.append("failureCounts", JSON.stringify(combinedFailureCounts));
-  formData.append("reportData", JSON.stringify(fullReportData));  
-
-  // 3. 서버로 전송
-  const res = await fetch("/generate_docx", {
-    method: "POST",
-    body: formData,
-  });
-
-  if (!res.ok) {
-    alert("❌ 보고서 다운로드 실패");
-    return;
-  }
-
-  const blob = await res.blob();
-  const url = window.URL.createObjectURL(blob);
-  const link = document.createElement("a");
-  link.href = url;
-  link.download = "제조_보고서.docx";
-  link.click();
-  window.URL.revokeObjectURL(url);
-}
-
-// ✅ 엑셀 다운로드 요청
-async function downloadExcel() {
-  console.log("📥 엑셀 다운로드 버튼 클릭됨");
-  if (!fullReportData || fullReportData.length === 0) {
+// ✅ 완료된 작업의 산출물을 서버에서 받아 저장 (보고서 데이터 재업로드 없음)
+async function downloadArtifact(kind, filename, errorMessage) {
+  if (!currentJobId) {
     alert("⚠️ 먼저 보고서를 생성하세요.");
     return;
   }
 
-  const formData = new FormData();
-  formData.append("reportData", JSON.stringify(fullReportData));
-  console.log("📤 전송할 데이터", fullReportData);
-
   try {
-    const res = await fetch("/generate_excel", {
-      method: "POST",
-      body: formData,
-    });
-
-    console.log("📩 서버 응답", res);
-
+    const res = await fetch(`/report_jobs/${currentJobId}/${kind}`);
     if (!res.ok) {
-      alert("❌ 엑셀 파일 다운로드 실패");
+      alert(errorMessage);
       return;
     }
 
     const blob = await res.blob();
     const url = window.URL.createObjectURL(blob);
-    const a = document.createElement("a");
-    a.href = url;
-    a.download = "제조_기초데이터.xlsx";
-    a.click();
+    const link = document.createElement("a");
+    link.href = url;
+    link.download = filename;
+    link.click();
     window.URL.revokeObjectURL(url);
   } catch (error) {
     alert("❌ 다운로드 중 오류가 발생했습니다.");
-    console.error("Excel download error:", error);
+    console.error(`${kind} download error:`, error);
   }
 }
+
+// ✅ Docx 파일 다운로드
+function downloadDocx() {
+  return downloadArtifact("docx", "제조_보고서.docx", "❌ 보고서 다운로드 실패");
+}
+
+// ✅ 엑셀 다운로드
+function downloadExcel() {
+  return downloadArtifact("xlsx", "제조_기초데이터.xlsx", "❌ 엑셀 파일 다운로드 실패");
+}
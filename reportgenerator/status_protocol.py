@@ -0,0 +1,378 @@
+import os
+import time
+import asyncio
+import uuid
+import random
+import redis
+from metrics import SOCKETIO_EMITS, observe_hop, observe_e2e
+
+# ===============================
+# 설비 상태 Socket.IO 프로토콜 (v1)
+# ===============================
+# dashboard+chatbot/과 reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+# client → server  subscribe_status {v, lines: [...] | null(전체), since: seq | null, epoch}
+#                  lines는 토폴로지 라인 ID만 남기고(전체와 같으면 전체), since는 정수가 아니면 무시(스냅샷)
+# server → client  status_snapshot  {v, epoch, seq, lines: {line: event_type}}   구독한 sid에게만
+#                  status_delta     {v, epoch, seq, lines: {line: event_type}}   tick마다 변경분만, 뷰(room)별
+#                                   + traces: {line: {id, t_event, emitted_at}}   추적 샘플링된 델타에만
+# client → server  status_ack       {traces: [...]}   traces가 있는 델타를 화면에 반영한 뒤 그대로 돌려보냄
+# seq는 변경이 있는 tick마다 1씩 증가. 재연결 시 epoch가 같고 since <= seq이면
+# since 이후 바뀐 라인만 델타로 보내고, 아니면(서버 상태 초기화 등) 스냅샷을 다시 보냄.
+# 같은 라인 집합을 보는 클라이언트는 같은 room에 묶이므로 tick당 emit 횟수는 뷰 종류 수에 비례.
+# 구독 sid → 뷰는 sid가 연결된 레플리카가 메모리에 들고(연결이 끊기면 지움), 쓰는 뷰를 VIEW_HEARTBEAT마다 Redis
+# 정렬 집합(점수 = 마지막 확인 시각)에 다시 알림. 리더는 flush 때 VIEW_TTL 동안 알림이 없던 뷰(레플리카가 죽은 경우
+# 포함)를 지우고 남은 뷰에만 델타를 만듦. 종류가 MAX_STATUS_VIEWS를 넘으면 새 뷰는 전체 뷰에 묶음
+# (클라이언트가 구독 라인만 반영).
+# ack에 시각이 모두 담겨 있어 클라이언트가 어느 레플리카에 연결돼 있든 서버 상태 없이 지연을 계산.
+
+PROTOCOL_VERSION = 1
+ALL_LINES = "*"
+STATUS_TICK = float(os.getenv("STATUS_TICK_MS", "100")) / 1000
+# 추적 정보를 실어 보낼(=ack를 받을) 델타 비율. 시청자가 많으면 낮춰 ack 트래픽을 줄임
+TRACE_ACK_SAMPLE = float(os.getenv("TRACE_ACK_SAMPLE", "1.0"))
+MAX_ACK_TRACES = 64
+# 리더가 tick마다 델타를 만드는 뷰(라인 집합) 종류 상한
+MAX_STATUS_VIEWS = int(os.getenv("MAX_STATUS_VIEWS", "32"))
+VIEW_HEARTBEAT = 10.0
+VIEW_TTL = 30.0
+
+KEY_PREFIX = "facman:status:"
+
+# seq 증가와 상태/변경 seq 기록을 원자적으로 처리 (읽는 쪽이 seq만 보고 상태를 못 보는 틈이 없도록)
+COMMIT_CHANGES = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('SETNX', KEYS[4], ARGV[1])
+for i = 2, #ARGV, 2 do
+  redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+  redis.call('HSET', KEYS[3], ARGV[i], seq)
+end
+return seq
+"""
+
+
+def view_key(lines):
+    return ALL_LINES if not lines else ",".join(sorted(set(lines)))
+
+
+def normalize_lines(lines, known_lines):
+    """구독 라인 목록을 알려진 라인 ID로 제한. 전체 구독(None 포함)이면 None"""
+    if not isinstance(lines, list):
+        return None
+    selected = sorted({line for line in lines if isinstance(line, str) and line in known_lines})
+    if not selected or len(selected) == len(known_lines):
+        return None
+    return selected
+
+
+def view_room(view):
+    return f"status:{view}"
+
+
+class StatusStore:
+    """라인별 최신 상태, 변경 seq, 구독 뷰. Redis가 있으면 레플리카 간 공유 (sid별 뷰는 레플리카 메모리)"""
+    def __init__(self, redis_client, app_name):
+        self._redis_client = redis_client
+        self.app_name = app_name
+        # 같은 Redis를 쓰는 앱끼리 seq/뷰가 섞이지 않도록 앱 이름으로 구분
+        self._keys = {key: f"{KEY_PREFIX}{app_name}:{key}" for key in ("epoch", "seq", "latest", "changed", "views_seen")}
+        self._epoch = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._latest = {}
+        self._changed = {}
+        self._views = {}
+        if redis_client is not None:
+            self._commit = redis_client.register_script(COMMIT_CHANGES)
+
+    def commit(self, changes):
+        """변경분을 저장하고 새 seq를 반환"""
+        if self._redis_client is None:
+            self._seq += 1
+            self._latest.update(changes)
+            self._changed.update({line: self._seq for line in changes})
+            return self._seq
+
+        keys = [self._keys["seq"], self._keys["latest"], self._keys["changed"], self._keys["epoch"]]
+        args = [self._epoch]
+        for line, event_type in changes.items():
+            args += [line, event_type]
+        return int(self._commit(keys=keys, args=args))
+
+    def read(self):
+        """(epoch, seq, {line: event_type}, {line: changed_seq})를 한 번에 읽음"""
+        if self._redis_client is None:
+            return self._epoch, self._seq, dict(self._latest), dict(self._changed)
+
+        pipe = self._redis_client.pipeline()
+        pipe.setnx(self._keys["epoch"], self._epoch)
+        pipe.get(self._keys["epoch"])
+        pipe.get(self._keys["seq"])
+        pipe.hgetall(self._keys["latest"])
+        pipe.hgetall(self._keys["changed"])
+        _, epoch, seq, latest, changed = pipe.execute()
+        return epoch, int(seq or 0), latest, {line: int(s) for line, s in changed.items()}
+
+    def add_view(self, sid, view):
+        """
+        sid의 구독 뷰를 등록하고 실제로 등록한 뷰를 반환.
+        뷰 종류가 상한에 이르면 새 뷰 대신 전체 뷰로 등록 (여러 레플리카가 동시에 등록하면 조금 넘을 수 있음)
+        """
+        views = self.views()
+        if view not in views and view != ALL_LINES and len(views) >= MAX_STATUS_VIEWS:
+            view = ALL_LINES
+        self._views[sid] = view
+        if self._redis_client is not None:
+            self._redis_client.zadd(self._keys["views_seen"], {view: time.time()})
+        return view
+
+    def remove_view(self, sid):
+        # 다른 레플리카가 같은 뷰를 쓰지 않으면 VIEW_TTL 뒤 리더가 지움
+        self._views.pop(sid, None)
+
+    def local_views(self):
+        """이 레플리카에 연결된 구독자가 쓰는 뷰"""
+        return set(self._views.values())
+
+    def heartbeat(self, views):
+        """local_views()를 다시 알림. Redis 호출 (ASGI 서버는 루프에서 뷰를 읽고 스레드에서 호출)"""
+        if self._redis_client is not None and views:
+            now = time.time()
+            self._redis_client.zadd(self._keys["views_seen"], {view: now for view in views})
+
+    def views(self):
+        """VIEW_TTL 안에 알림이 있던 뷰 (오래된 뷰는 지움). Redis 호출"""
+        if self._redis_client is None:
+            return self.local_views()
+        pipe = self._redis_client.pipeline()
+        pipe.zremrangebyscore(self._keys["views_seen"], "-inf", time.time() - VIEW_TTL)
+        pipe.zrange(self._keys["views_seen"], 0, -1)
+        _, views = pipe.execute()
+        return set(views)
+
+
+class StatusBroadcaster:
+    """
+    리더 레플리카에서 상태 변경을 모았다가 tick마다 뷰별 델타 한 건으로 전송.
+    구독 처리는 클라이언트가 연결된 레플리카 어디서든 가능.
+    """
+    def __init__(self, socketio, store, lease, lines, tick=STATUS_TICK):
+        self._socketio = socketio
+        self._store = store
+        self._lines = set(lines)
+        self._lease = lease
+        self._tick = tick
+        self._state = None
+        self._epoch = None
+        self._pending = {}
+        self._traces = {}
+        self._trace_path = store.app_name
+        self._heartbeat_at = time.monotonic()
+
+    def _load(self):
+        self._epoch, _, self._state, _ = self._store.read()
+
+    def reset(self):
+        """리더를 잃으면 호출. 다시 리더가 되면 저장소 상태부터 읽어 중복 전송을 막음"""
+        self._state = None
+        self._pending = {}
+        self._traces = {}
+
+    def record(self, line, event_type, trace_id=None, event_time=None):
+        """event_time은 상태 로그의 포인트 시각(datetime). trace_id가 있으면 이벤트 → 폴링 구간을 기록"""
+        if self._state is None:
+            self._load()
+        # tick 안에서 바뀌었다가 되돌아온 라인은 보내지 않음
+        if self._state.get(line) == event_type:
+            self._pending.pop(line, None)
+            self._traces.pop(line, None)
+        elif self._pending.get(line) != event_type:
+            self._pending[line] = event_type
+            self._traces.pop(line, None)
+            if trace_id and event_time is not None:
+                polled_at = time.time()
+                trace = {"id": trace_id, "t_event": event_time.timestamp(), "polled_at": polled_at}
+                observe_hop(self._trace_path, "event_to_poll", polled_at - trace["t_event"])
+                self._traces[line] = trace
+
+    def _take_pending(self):
+        changes, self._pending = self._pending, {}
+        traces, self._traces = self._traces, {}
+        return changes, traces
+
+    def _restore_pending(self, changes, traces, error):
+        print(f"[Status] Redis error: {error}")
+        self._pending = {**changes, **self._pending}
+        self._traces = {**traces, **self._traces}
+
+    def _commit(self, changes):
+        """(seq, 구독 뷰 목록). Redis 호출"""
+        return self._store.commit(changes), self._store.views()
+
+    def _delta_messages(self, changes, traces, seq, views):
+        """커밋된 변경분을 뷰(room)별 status_delta 메시지 [(message, room)]로 변환"""
+        # commit 도중 리더를 잃어 reset됐을 수 있음
+        if self._state is not None:
+            self._state.update(changes)
+
+        emitted_at = time.time()
+        for trace in traces.values():
+            observe_hop(self._trace_path, "poll_to_emit", emitted_at - trace["polled_at"])
+        # 샘플링된 tick에만 추적 정보를 실어 브라우저 ack를 받음
+        if random.random() >= TRACE_ACK_SAMPLE:
+            traces = {}
+
+        messages = []
+        for view in views:
+            if view == ALL_LINES:
+                lines = changes
+            else:
+                lines = {line: changes[line] for line in view.split(",") if line in changes}
+            if lines:
+                message = {"v": PROTOCOL_VERSION, "epoch": self._epoch, "seq": seq, "lines": lines}
+                view_traces = {
+                    line: {"id": traces[line]["id"], "t_event": traces[line]["t_event"], "emitted_at": emitted_at}
+                    for line in lines if line in traces
+                }
+                if view_traces:
+                    message["traces"] = view_traces
+                messages.append((message, view_room(view)))
+        return messages
+
+    def flush(self):
+        if not self._pending:
+            return
+        changes, traces = self._take_pending()
+        try:
+            seq, views = self._commit(changes)
+        except redis.exceptions.RedisError as e:
+            self._restore_pending(changes, traces, e)
+            return
+        for message, room in self._delta_messages(changes, traces, seq, views):
+            self._socketio.emit("status_delta", message, to=room)
+            SOCKETIO_EMITS.labels(event="status_delta").inc()
+
+    def _heartbeat_due(self):
+        now = time.monotonic()
+        if now - self._heartbeat_at < VIEW_HEARTBEAT:
+            return False
+        self._heartbeat_at = now
+        return True
+
+    def run(self):
+        while True:
+            self._socketio.sleep(self._tick)
+            if self._heartbeat_due():
+                try:
+                    self._store.heartbeat(self._store.local_views())
+                except redis.exceptions.RedisError as e:
+                    print(f"[Status] Redis error: {e}")
+            if self._lease.is_leader:
+                self.flush()
+
+    def _subscription(self, data):
+        """(뷰 키, 구독 라인 목록 또는 None(전체), since 또는 None, epoch)"""
+        data = data if isinstance(data, dict) else {}
+        lines = normalize_lines(data.get("lines"), self._lines)
+        since = data.get("since")
+        if not isinstance(since, int) or isinstance(since, bool) or since < 0:
+            since = None
+        return view_key(lines), lines, since, data.get("epoch")
+
+    def _subscription_message(self, lines, since, client_epoch):
+        """(이벤트 이름, 스냅샷 또는 since 이후 델타)를 만듦. Redis 호출"""
+        epoch, seq, latest, changed = self._store.read()
+        selected = latest if lines is None else {line: latest[line] for line in lines if line in latest}
+
+        if since is not None and client_epoch == epoch and since <= seq:
+            event = "status_delta"
+            selected = {line: value for line, value in selected.items() if changed.get(line, 0) > since}
+        else:
+            event = "status_snapshot"
+        return event, {"v": PROTOCOL_VERSION, "epoch": epoch, "seq": seq, "lines": selected}
+
+    def subscribe(self, sid, data):
+        view, lines, since, epoch = self._subscription(data)
+        view = self._store.add_view(sid, view)
+
+        # 이전 구독 room을 떠나고 새 뷰에 참여한 뒤 상태를 읽어야 그 사이 변경을 놓치지 않음
+        server = self._socketio.server
+        for room in server.rooms(sid, namespace="/"):
+            if room.startswith("status:"):
+                server.leave_room(sid, room, namespace="/")
+        server.enter_room(sid, view_room(view), namespace="/")
+
+        event, message = self._subscription_message(lines, since, epoch)
+        self._socketio.emit(event, message, to=sid)
+        SOCKETIO_EMITS.labels(event=event).inc()
+
+    def unsubscribe(self, sid):
+        """연결이 끊긴 sid의 뷰 등록 해제 (구독자가 없는 뷰는 델타를 만들지 않음)"""
+        self._store.remove_view(sid)
+
+    def acknowledge(self, data):
+        """
+        브라우저가 추적 델타를 화면에 반영한 뒤 보낸 ack 처리.
+        emit_to_ack는 서버 → 브라우저 렌더 → 서버 왕복 시간, 종단 지연은 이벤트 시각부터 ack 수신까지.
+        """
+        received_at = time.time()
+        traces = (data or {}).get("traces") if isinstance(data, dict) else None
+        if not isinstance(traces, list):
+            return
+        for trace in traces[:MAX_ACK_TRACES]:
+            try:
+                t_event, emitted_at = float(trace["t_event"]), float(trace["emitted_at"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            observe_hop(self._trace_path, "emit_to_ack", received_at - emitted_at)
+            observe_e2e(self._trace_path, received_at - t_event)
+
+
+class AsyncStatusBroadcaster(StatusBroadcaster):
+    """
+    python-socketio AsyncServer(ASGI)용 StatusBroadcaster.
+    델타/구독 메시지 구성은 같고, StatusStore의 Redis 호출은 스레드에서 실행해 이벤트 루프를 막지 않음.
+    """
+    async def ensure_loaded(self):
+        """record() 전에 호출. 리더가 된 직후 저장소 상태를 읽어 둠"""
+        if self._state is None:
+            self._epoch, _, self._state, _ = await asyncio.to_thread(self._store.read)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        changes, traces = self._take_pending()
+        try:
+            seq, views = await asyncio.to_thread(self._commit, changes)
+        except redis.exceptions.RedisError as e:
+            self._restore_pending(changes, traces, e)
+            return
+        for message, room in self._delta_messages(changes, traces, seq, views):
+            await self._socketio.emit("status_delta", message, to=room)
+            SOCKETIO_EMITS.labels(event="status_delta").inc()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self._tick)
+            if self._heartbeat_due():
+                try:
+                    await asyncio.to_thread(self._store.heartbeat, self._store.local_views())
+                except redis.exceptions.RedisError as e:
+                    print(f"[Status] Redis error: {e}")
+            if self._lease.is_leader:
+                await self.flush()
+
+    async def subscribe(self, sid, data):
+        view, lines, since, epoch = self._subscription(data)
+        view = await asyncio.to_thread(self._store.add_view, sid, view)
+
+        server = self._socketio
+        for room in server.rooms(sid, namespace="/"):
+            if room.startswith("status:"):
+                await server.leave_room(sid, room, namespace="/")
+        await server.enter_room(sid, view_room(view), namespace="/")
+
+        event, message = await asyncio.to_thread(self._subscription_message, lines, since, epoch)
+        await server.emit(event, message, to=sid)
+        SOCKETIO_EMITS.labels(event=event).inc()
+
+    async def unsubscribe(self, sid):
+        await asyncio.to_thread(self._store.remove_view, sid)
@@ -0,0 +1,135 @@
+import os
+import json
+import random
+import itertools
+
+# ===============================
+# 공장 토폴로지 (공정 단계 × 병렬 라인, 라우팅 규칙, 버퍼 용량)
+# ===============================
+# simulation/, dashboard+chatbot/, reportgenerator/에 같은 파일을 둠. 고친 뒤 check_shared_modules.py로 사본 일치 확인.
+DEFAULT_TOPOLOGY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "topology.json")
+
+ROUTING_POLICIES = ("same_suffix", "round_robin", "shortest_queue", "weighted")
+# 소스 라인이 제품을 투입(input)/폐기(reject)할 때 기록하는 가상 공정 ID (어느 단계에도 속하지 않음)
+SOURCE_PROCESS = "P0"
+
+
+class Stage:
+    def __init__(self, data, index):
+        self.id = data["id"]
+        self.index = index
+        self.sink = bool(data.get("sink", False))
+        self.routing = data.get("routing", "round_robin")
+        if self.routing not in ROUTING_POLICIES:
+            raise ValueError(f"Invalid routing policy for {self.id}: {self.routing}")
+        self.lines = [line["id"] for line in data["lines"]]
+        self.capacity = {line["id"]: line.get("capacity") for line in data["lines"]}
+        self.weight = {line["id"]: line.get("weight", 1) for line in data["lines"]}
+        self.tag = {line["id"]: line.get("tag", line["id"][-1]) for line in data["lines"]}
+
+
+class Topology:
+    """
+    topology.json(또는 .yaml)에 정의된 공정 흐름.
+    stages 순서대로 제품이 흐르며, 첫 단계 라인은 producer, 마지막(sink) 단계는 consumer, 나머지는 relay로 동작.
+    """
+    def __init__(self, data):
+        self.stages = [Stage(stage, i) for i, stage in enumerate(data["stages"])]
+        self._line_stage = {line: stage for stage in self.stages for line in stage.lines}
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or os.getenv("TOPOLOGY_PATH") or DEFAULT_TOPOLOGY_PATH
+        with open(path, encoding="utf-8") as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml
+                return cls(yaml.safe_load(f))
+            return cls(json.load(f))
+
+    def stage_of(self, line):
+        return self._line_stage[line]
+
+    def process_of(self, line):
+        return self._line_stage[line].id
+
+    def mode_of(self, line):
+        stage = self._line_stage[line]
+        if stage.sink:
+            return "consumer"
+        return "producer" if stage.index == 0 else "relay"
+
+    def next_stage(self, line):
+        index = self._line_stage[line].index + 1
+        return self.stages[index] if index < len(self.stages) else None
+
+    def capacity_of(self, line):
+        return self._line_stage[line].capacity.get(line)
+
+    def tag_of(self, line):
+        return self._line_stage[line].tag[line]
+
+    def is_sink(self, line):
+        return self._line_stage[line].sink
+
+    @property
+    def sink_process(self):
+        """산출(sink 도착)이 기록되는 공정 ID (sink 표시가 없으면 마지막 단계)"""
+        return next((stage.id for stage in self.stages if stage.sink), self.stages[-1].id)
+
+    @property
+    def production_processes(self):
+        """투입/산출 공정 ID"""
+        return [SOURCE_PROCESS, self.sink_process]
+
+    @property
+    def queues(self):
+        return [line for stage in self.stages for line in stage.lines]
+
+    @property
+    def equipment_lines(self):
+        """상태 버킷({line}_status)을 가지는 설비 라인 (sink 제외)"""
+        return [line for stage in self.stages if not stage.sink for line in stage.lines]
+
+
+class Router:
+    """한 라인에서 다음 단계의 어느 라인으로 보낼지 결정"""
+    def __init__(self, topology, line, redis_client=None):
+        self._line = line
+        self._stage = topology.next_stage(line)
+        self._redis_client = redis_client
+        if self._stage is not None:
+            self._cycle = itertools.cycle(self._stage.lines)
+
+    @property
+    def needs_depths(self):
+        """shortest_queue 라우팅은 후보 라인의 큐 길이가 필요 (비동기 엔진은 직접 조회해 choose에 전달)"""
+        return self._stage is not None and len(self._stage.lines) > 1 and self._stage.routing == "shortest_queue"
+
+    @property
+    def candidates(self):
+        return list(self._stage.lines) if self._stage is not None else []
+
+    def choose(self, depths=None):
+        stage = self._stage
+        if stage is None:
+            return None
+        if len(stage.lines) == 1:
+            return stage.lines[0]
+
+        if stage.routing == "same_suffix":
+            suffix = self._line.rsplit("-", 1)[-1]
+            for candidate in stage.lines:
+                if candidate.rsplit("-", 1)[-1] == suffix:
+                    return candidate
+            return next(self._cycle)
+        if stage.routing == "shortest_queue" and (depths is not None or self._redis_client is not None):
+            if depths is None:
+                pipe = self._redis_client.pipeline(transaction=False)
+                for candidate in stage.lines:
+                    pipe.llen(candidate)
+                depths = pipe.execute()
+            shortest = min(depths)
+            return random.choice([c for c, d in zip(stage.lines, depths) if d == shortest])
+        if stage.routing == "weighted":
+            return random.choices(stage.lines, weights=[stage.weight[c] for c in stage.lines])[0]
+        return next(self._cycle)
@@ -0,0 +1,447 @@
+import time
+import uuid
+import asyncio
+from datetime import datetime, timezone
+import redis.asyncio as aioredis
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+from metrics import ITEMS_PROCESSED, influx_write_timer, observe_hop
+from topology import Router, SOURCE_PROCESS
+from failure_model import FailureModel, FAILURE_DETECT_DELAY
+from process_log import build_points, write_schema as process_write_schema, PROCESS_BUCKET
+from status_log import build_writes, write_schema as status_write_schema
+from event_stream import event_fields, publish_event
+from ProcessSimulator import (
+    ProcessSimulator,
+    SimulatorState,
+    ItemIDGenerator,
+    MAINTENANCE_POLICIES,
+    QUEUE_STATS_PREFIX,
+    BUFFER_CAPACITY_KEY,
+    PUSH_IF_SPACE,
+    RECOVER_IN_FLIGHT,
+)
+
+# ===============================
+# asyncio 기반 시뮬레이터 엔진
+# ===============================
+# ProcessSimulator와 생성자/run() 동작이 같고, 라인당 스레드 대신 코루틴 하나로 동작.
+# 같은 이벤트 루프의 라인들은 Redis/Influx 클라이언트와 정비 채널 pub/sub 연결을 공유하므로
+# 수천 개 라인을 한 프로세스에서 돌릴 수 있음 (run_many).
+# 대기 중인 BLMOVE는 연결을 점유하므로 블로킹 pop 전용 클라이언트를 따로 두어 일반 명령이 막히지 않도록 함.
+
+# (이벤트 루프, 접속 정보) → 공유 클라이언트
+_shared_clients = {}
+
+
+def _shared(key, factory):
+    key = (id(asyncio.get_running_loop()),) + key
+    if key not in _shared_clients:
+        _shared_clients[key] = factory()
+    return _shared_clients[key]
+
+
+class MaintenanceListener:
+    """연결 하나로 여러 라인의 정비 채널을 구독하고 채널별 핸들러로 분배"""
+    def __init__(self, redis_client):
+        self._pubsub = redis_client.pubsub()
+        self._handlers = {}
+        self._task = None
+
+    async def register(self, channel, handler):
+        self._handlers[channel] = handler
+        await self._pubsub.subscribe(channel)
+        # 구독이 하나 이상 있어야 listen()이 바로 끝나지 않음
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        try:
+            async for message in self._pubsub.listen():
+                if message['type'] == 'message':
+                    handler = self._handlers.get(message['channel'])
+                    if handler is not None:
+                        handler(message['data'])
+        except Exception as e:
+            print(f"Maintenance listener error: {e}")
+
+
+class AsyncProcessSimulator(SimulatorState):
+    def __init__(
+        self,
+        mode: str,
+        process_name: str,
+        process_next: str = None,
+        influxdb_url: str = None,
+        influxdb_token: str = None,
+        influxdb_org: str = None,
+        redis_url: str = "redis://localhost:6379",
+        agent_url: str = None,
+        sim_speed: float = 5.0,
+        buffer_capacity: int = None,
+        overflow: str = "block",
+        topology=None,
+        policy: str = None,
+        maintenance_interval: float = 30.0,
+        resume: bool = True,
+    ):
+        self._process_name = process_name
+        self._process_next = process_next
+        self._topology = topology
+        self._influxdb_args = (influxdb_url, influxdb_token, influxdb_org)
+        self._redis_url = redis_url or "redis://localhost:6379"
+        self._agent_url = agent_url
+        self._buffer_capacity = buffer_capacity
+        self._resume_state = resume
+
+        self._policy = policy or ("agent" if agent_url else "reactive")
+        if self._policy not in MAINTENANCE_POLICIES:
+            raise ValueError("Invalid maintenance policy")
+        self._maintenance_interval = maintenance_interval
+        self._process_log_schema = process_write_schema()
+        self._status_log_schema = status_write_schema()
+        if overflow not in ("block", "reject"):
+            raise ValueError("Invalid overflow mode")
+        self._overflow = overflow
+
+        if self._topology is not None:
+            self._process_id = self._topology.process_of(process_name)
+            self._item_tag = self._topology.tag_of(process_name)
+            self._router = Router(self._topology, process_name)
+        else:
+            self._process_id = process_name[:-2]
+            self._item_tag = process_name[-1]
+            self._router = None
+
+        self._is_broken = False
+        self._runtime = 0.0
+        self._failure_prob = 0.0
+        self._is_maintenance = False
+        self._is_blocked = False
+        self._pending_handoff = None
+
+        self.sim_speed = sim_speed
+        self._failure_model = FailureModel(sim_speed)
+        self._mode = mode
+        self._item_id_generator = ItemIDGenerator()
+
+        if self._mode == "producer":
+            self._run_loop = self._run_producer
+        elif self._mode == "relay":
+            self._run_loop = self._run_relay
+        elif self._mode == "consumer":
+            self._run_loop = self._run_consumer
+        else:
+            raise ValueError("Invalid mode")
+
+        # 클라이언트는 이벤트 루프 안에서 만들어야 하므로 _setup()에서 연결
+        self._redis_client = None
+        self._blocking_client = None
+        self._write_api = None
+        self._push_if_space = None
+        self._recover_in_flight = None
+
+    @property
+    def _step_time(self):
+        return self._failure_model.step_time()
+    @property
+    def _maintain_time(self):
+        return self._failure_model.maintain_time()
+    @property
+    def _repair_time(self):
+        return self._failure_model.repair_time()
+    @property
+    def _blocked_poll_time(self):
+        return 1.0 / self.sim_speed
+
+    async def _setup(self):
+        self._redis_client = _shared(
+            ("redis", self._redis_url),
+            lambda: aioredis.from_url(self._redis_url, decode_responses=True),
+        )
+        self._blocking_client = _shared(
+            ("redis-blocking", self._redis_url),
+            lambda: aioredis.from_url(self._redis_url, decode_responses=True),
+        )
+        influx_client = _shared(
+            ("influx",) + self._influxdb_args,
+            lambda: InfluxDBClientAsync(*self._influxdb_args),
+        )
+        self._write_api = influx_client.write_api()
+        self._push_if_space = self._redis_client.register_script(PUSH_IF_SPACE)
+        self._recover_in_flight = self._redis_client.register_script(RECOVER_IN_FLIGHT)
+
+        if self._buffer_capacity:
+            await self._redis_client.hset(BUFFER_CAPACITY_KEY, self._process_name, self._buffer_capacity)
+        else:
+            await self._redis_client.hdel(BUFFER_CAPACITY_KEY, self._process_name)
+        await self._restore(self._resume_state)
+
+        listener = _shared(("maintenance", self._redis_url), lambda: MaintenanceListener(self._redis_client))
+        await listener.register(f"{self._process_name}_maintenance", self._on_maintenance)
+
+    def _on_maintenance(self, data):
+        print(f"Received maintenance command: {data}")
+        ProcessSimulator._observe_maintenance_trace(data)
+        self._is_maintenance = True
+
+    # ---------- 체크포인트 (ProcessSimulator와 같은 키/스크립트) ----------
+    async def _restore(self, resume):
+        if resume:
+            self._apply_state(await self._redis_client.hgetall(self._state_key()))
+        else:
+            await self._redis_client.delete(self._state_key())
+        keys = [self._processing_key(), self._process_name, f"{QUEUE_STATS_PREFIX}{self._process_name}"]
+        recovered = await self._recover_in_flight(keys=keys, args=[self._pending_handoff or ""])
+        if recovered:
+            print(f"Recovered {recovered} in-flight item(s) to {self._process_name}")
+
+    async def _checkpoint(self, handoff=""):
+        await self._redis_client.hset(self._state_key(), mapping=self._state_fields(handoff))
+
+    async def _drop_in_flight(self, item):
+        pipe = self._redis_client.pipeline()
+        pipe.lrem(self._processing_key(), 1, item)
+        pipe.hset(self._state_key(), mapping=self._state_fields())
+        await pipe.execute()
+
+    async def _publish_event(self, kind, event, product_id=""):
+        # 이상 감지기(anomaly_detector.py)가 읽는 라인 이벤트. 실패해도 시뮬레이션은 계속
+        try:
+            await publish_event(self._redis_client, event_fields(self._process_name, kind, event, self._runtime, product_id))
+        except aioredis.RedisError as e:
+            print(f"Redis line event error: {e}")
+
+    async def _logging_status(self, event_type, event_status, available):
+        await self._publish_event("status", f"{event_type}:{event_status}")
+        event_time = datetime.now(timezone.utc)
+        # 스키마 전환 중에는 라인별 버킷과 통합 status 버킷에 함께 기록 (status_log.py)
+        writes = build_writes(
+            self._process_name, self._policy, event_type, event_status, available,
+            uuid.uuid4().hex[:16], event_time, self._status_log_schema
+        )
+        try:
+            with influx_write_timer("status"):
+                for bucket, point in writes:
+                    await self._write_api.write(bucket=bucket, record=point)
+            observe_hop("status", "influx_write", time.time() - event_time.timestamp())
+            print(f"Logging status: {event_type} {event_status} {available}")
+        except Exception as e:
+            print(f"InfluxDB status_log error: {e}")
+
+    async def _logging_process(self, product_id, process_id, line_id, status):
+        if line_id == self._process_name:
+            await self._publish_event("process", status, product_id)
+        # 스키마 전환 중에는 v1/v2 포인트를 한 번에 기록 (process_log.py)
+        points = build_points(
+            product_id, process_id, line_id, status, datetime.now(timezone.utc), self._process_log_schema
+        )
+        try:
+            with influx_write_timer("process"):
+                await self._write_api.write(bucket=PROCESS_BUCKET, record=points)
+            print(f"Logging process: process {product_id} {process_id} {line_id} {status}")
+        except Exception as e:
+            print(f"InfluxDB process_log error: {e}")
+
+    def _should_fail(self):
+        return self._failure_model.should_fail(self._runtime)
+
+    async def _repair(self):
+        await self._logging_status("repair", "start", False)
+        await asyncio.sleep(self._repair_time)
+        await self._reset()
+        await self._logging_status("repair", "finish", True)
+        await self._logging_status("processing", "", True)
+
+    async def _maintenance(self):
+        await self._logging_status("maintenance", "start", False)
+        await asyncio.sleep(self._maintain_time)
+        await self._reset()
+        await self._logging_status("maintenance", "finish", True)
+        await self._logging_status("processing", "", True)
+
+    async def _reset(self):
+        self._runtime = 0.0
+        self._failure_prob = 0.0
+        self._is_broken = False
+        self._is_maintenance = False
+        await self._checkpoint()
+
+    def _update_failure_rate(self):
+        self._failure_prob = self._failure_model.failure_prob(self._runtime)
+
+    async def _push_item(self, queue, item):
+        keys = [queue, f"{QUEUE_STATS_PREFIX}{queue}", BUFFER_CAPACITY_KEY, self._processing_key(), self._state_key()]
+        return bool(await self._push_if_space(keys=keys, args=[item] + self._state_args()))
+
+    async def _next_line(self):
+        if self._router is None:
+            return self._process_next
+        depths = None
+        if self._router.needs_depths:
+            pipe = self._redis_client.pipeline(transaction=False)
+            for candidate in self._router.candidates:
+                pipe.llen(candidate)
+            depths = await pipe.execute()
+        return self._router.choose(depths)
+
+    def _process_of(self, line):
+        if self._topology is not None:
+            return self._topology.process_of(line)
+        return line[:-2]
+
+    async def _log_arrival(self, item, line):
+        if self._topology is not None and self._topology.is_sink(line):
+            return
+        await self._logging_process(item, self._process_of(line), line, "arrival")
+
+    async def _hand_off(self, item):
+        next_line = await self._next_line()
+        if await self._push_item(next_line, item):
+            await self._log_arrival(item, next_line)
+            return True
+        if self._overflow == "reject":
+            await self._logging_process(item, self._process_of(next_line), next_line, "reject")
+            await self._drop_in_flight(item)
+            return False
+
+        self._is_blocked = True
+        await self._checkpoint(handoff=item)
+        await self._logging_status("blocked", "start", False)
+        while True:
+            await asyncio.sleep(self._blocked_poll_time)
+            next_line = await self._next_line()
+            if await self._push_item(next_line, item):
+                break
+        self._is_blocked = False
+        await self._logging_status("blocked", "finish", True)
+        await self._logging_status("processing", "", True)
+        await self._log_arrival(item, next_line)
+        return True
+
+    async def _feed_source(self, item):
+        if not await self._push_item(self._process_name, item):
+            if self._overflow == "reject":
+                await self._logging_process(item, SOURCE_PROCESS, "", "reject")
+                return False
+            self._is_blocked = True
+            await self._logging_status("blocked", "start", False)
+            while True:
+                await asyncio.sleep(self._blocked_poll_time)
+                if await self._push_item(self._process_name, item):
+                    break
+            self._is_blocked = False
+            await self._logging_status("blocked", "finish", True)
+            await self._logging_status("processing", "", True)
+        await self._logging_process(item, SOURCE_PROCESS, "", "input")
+        return True
+
+    async def _receive_item(self, process_name):
+        item = await self._blocking_client.blmove(process_name, self._processing_key(), 0, "LEFT", "RIGHT")
+        if item is None:
+            return None
+        await self._redis_client.hincrby(f"{QUEUE_STATS_PREFIX}{process_name}", "popped", 1)
+        return item
+
+    async def _process_step(self, item):
+        await self._logging_process(item, self._process_id, self._process_name, "start")
+        step_time = self._step_time
+        await asyncio.sleep(step_time)
+        self._runtime += step_time
+        self._update_failure_rate()
+        if self._policy == "rule_based" and self._runtime >= self._maintenance_interval:
+            self._is_maintenance = True
+        if self._should_fail():
+            self._is_broken = True
+            await self._logging_status("failure", "", False)
+            await self._logging_process(item, self._process_id, self._process_name, "interrupt")
+            ITEMS_PROCESSED.labels(line=self._process_name, status="interrupt").inc()
+            await self._drop_in_flight(item)
+            await asyncio.sleep(FAILURE_DETECT_DELAY)
+            await self._repair()
+            return False
+        await self._logging_process(item, self._process_id, self._process_name, "finish")
+        ITEMS_PROCESSED.labels(line=self._process_name, status="finish").inc()
+        return True
+
+    async def _run_producer(self):
+        while True:
+            try:
+                item = self._item_id_generator.generate() + self._item_tag
+                if await self._feed_source(item):
+                    print(f"Produced: {item}")
+                await asyncio.sleep(self._step_time)
+
+                if self._is_maintenance:
+                    await self._maintenance()
+                    continue
+
+                item = await self._receive_item(self._process_name)
+                await self._logging_process(item, self._process_id, self._process_name, "arrival")
+
+                if not await self._process_step(item):
+                    continue
+
+                await self._hand_off(item)
+
+                if self._is_maintenance:
+                    await self._maintenance()
+                    continue
+
+            except Exception as e:
+                print(e)
+
+    async def _run_relay(self):
+        while True:
+            try:
+                if self._is_maintenance:
+                    await self._maintenance()
+                    continue
+
+                item = await self._receive_item(self._process_name)
+                if item is None:
+                    continue
+                if not await self._process_step(item):
+                    continue
+                await self._hand_off(item)
+
+                if self._is_maintenance:
+                    await self._maintenance()
+                    continue
+
+            except Exception as e:
+                print(e)
+
+    async def _run_consumer(self):
+        while True:
+            try:
+                item = await self._receive_item(self._process_name)
+                if item is None:
+                    continue
+                process_id = self._process_id if self._topology is not None else self._process_name
+                await self._logging_process(item, process_id, "", "arrival")
+                await self._redis_client.lrem(self._processing_key(), 1, item)
+            except Exception as e:
+                print(e)
+
+    async def _resume(self):
+        if self._is_broken:
+            await self._repair()
+        if self._pending_handoff:
+            item, self._pending_handoff = self._pending_handoff, None
+            await self._hand_off(item)
+
+    async def run_async(self):
+        await self._setup()
+        print(f"Running {self._process_name} in {self._mode} mode (async)")
+        await self._resume()
+        await self._run_loop()
+
+    def run(self):
+        asyncio.run(self.run_async())
+
+
+def run_many(simulators):
+    """여러 라인을 한 이벤트 루프에서 실행 (클라이언트와 pub/sub 연결 공유)"""
+    async def main():
+        await asyncio.gather(*(sim.run_async() for sim in simulators))
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+import redis
+import time
+import os
+import argparse
+from dotenv import load_dotenv
+from metrics import LINE_FAILURE_RISK, start_metrics_server
+from event_stream import read_events
+from feature_store import LineFeatures, FeatureStore, RiskModel, ROLLING_WINDOW, RISK_MODEL_PATH
+from topology import Topology
+
+# ===============================
+# 라인별 피처 저장소 갱신
+# ===============================
+# 라인 이벤트 스트림을 읽어 라인별 LineFeatures를 이벤트마다 갱신하고, flush_interval마다 입력 큐 길이를 붙여
+# 위험 점수와 함께 FeatureStore(Redis)에 저장. 시작할 때 스트림의 최근 ROLLING_WINDOW초를 다시 읽어 누적 피처를 복원.
+# 피처/horizon은 실제 경과 시간(초)이라 모델은 학습한 sim_speed에서만 맞음. 실행 중인 시뮬레이터의 --sim_speed와
+# 다르면 경고하고 위험 점수 없이 피처만 저장.
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topology", type=str, default=None, help="Topology file (JSON/YAML)")
+    parser.add_argument("--flush_interval", type=float, default=1.0, help="Seconds between feature store writes")
+    parser.add_argument("--model", type=str, default=RISK_MODEL_PATH, help="Risk model JSON from RiskModelTraining.py")
+    parser.add_argument("--sim_speed", type=float, default=5.0, help="Simulation speed of the monitored lines")
+    parser.add_argument("--metrics_port", type=int, default=9103, help="Prometheus metrics port (0 = disabled)")
+    return parser.parse_args()
+
+
+def check_model_speed(model, sim_speed):
+    """모델이 학습된 sim_speed와 실행 중인 sim_speed가 다르면 경고하고 None (위험 점수 끔)"""
+    if model is None:
+        return None
+    if model.sim_speed is None:
+        print(f"[Risk] Model has no sim_speed; assuming it matches --sim_speed {sim_speed}")
+        return model
+    if model.sim_speed != sim_speed:
+        print(f"[Risk] Model trained at sim_speed {model.sim_speed} (horizon {model.horizon}s) "
+              f"but lines run at {sim_speed}; risk scores disabled. Retrain with RiskModelTraining.py.")
+        return None
+    return model
+
+
+class FeatureUpdater:
+    def __init__(self, redis_client, store, model=None, lines=None):
+        self._redis_client = redis_client
+        self._store = store
+        self._model = model
+        self._features = {line: LineFeatures() for line in lines or []}
+
+    def observe(self, event):
+        self._features.setdefault(event["line"], LineFeatures()).observe(event)
+
+    def flush(self):
+        lines = list(self._features)
+        if not lines:
+            return
+        # 라인 이름이 곧 입력 큐 (ProcessSimulator)
+        pipe = self._redis_client.pipeline(transaction=False)
+        for line in lines:
+            pipe.llen(line)
+        depths = pipe.execute()
+
+        now = time.time()
+        snapshots = {}
+        for line, depth in zip(lines, depths):
+            features = self._features[line]
+            features.queue_depth = depth
+            snapshot = features.snapshot(now)
+            if self._model is not None:
+                snapshot["risk"] = round(self._model.score(snapshot), 4)
+                snapshot["risk_horizon"] = self._model.horizon
+                LINE_FAILURE_RISK.labels(line=line).set(snapshot["risk"])
+            snapshot["updated_at"] = now
+            snapshots[line] = snapshot
+        self._store.write(snapshots)
+
+    def run(self, flush_interval=1.0):
+        # 스트림 ID는 밀리초 타임스탬프라 최근 구간부터 다시 읽을 수 있음
+        last_id = f"{int((time.time() - ROLLING_WINDOW) * 1000)}-0"
+        next_flush = time.monotonic()
+        print(f"Updating line features every {flush_interval}s (risk model: {'on' if self._model else 'off'})")
+        while True:
+            try:
+                events, last_id = read_events(self._redis_client, last_id, block_ms=int(flush_interval * 1000))
+                for _, event in events:
+                    self.observe(event)
+                if time.monotonic() >= next_flush:
+                    self.flush()
+                    next_flush = time.monotonic() + flush_interval
+            except redis.exceptions.RedisError as e:
+                print(f"Redis error: {e}")
+                time.sleep(flush_interval)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    load_dotenv()
+    start_metrics_server(args.metrics_port)
+
+    r = redis.from_url(
+        os.getenv("REDIS_URL"),
+        decode_responses=True
+    )
+    model = check_model_speed(RiskModel.load(args.model), args.sim_speed)
+    lines = Topology.load(args.topology).equipment_lines
+
+    FeatureUpdater(r, FeatureStore(r), model, lines).run(args.flush_interval)
@@ -13,17 +13,38 @@ from langchain_core.runnables import RunnableConfig
 import argparse
 import json
 import redis
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import time
 import re
+import queue
+import threading
+from metrics import record_llm_call, start_metrics_server, observe_hop, AGENT_EVALUATIONS
+from topology import Topology
+from status_log import StatusLogReader
+from event_stream import read_events
+from anomaly_detector import AnomalyDetector, AGENT_TRIGGER_COOLDOWN
+from inspection_optimizer import recommend, next_check_seconds
+from ProcessSimulator import STATE_PREFIX
+from feature_store import FeatureStore, describe
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--process_id", type=str, required=True)
+    parser.add_argument("--topology", type=str, default=None, help="Topology file (JSON/YAML)")
+    parser.add_argument("--metrics_port", type=int, default=0, help="Prometheus metrics port (0 = disabled)")
+    parser.add_argument("--trigger_cooldown", type=float, default=AGENT_TRIGGER_COOLDOWN,
+                        help="Seconds between anomaly-triggered evaluations of the same line")
+    parser.add_argument("--no_anomaly_trigger", action="store_true", help="Only evaluate at next_inspection")
+    parser.add_argument("--decision", choices=["llm", "optimizer"], default="llm",
+                        help="llm: LLM decides with the optimizer as a tool, optimizer: follow the optimizer without the LLM")
+    parser.add_argument("--sim_speed", type=float, default=5.0, help="Simulation speed of the monitored lines")
     return parser.parse_args()
 
 args = parse_args()
 p_id = args.process_id
+topology = Topology.load(args.topology)
+# 점검 대상이 될 수 있는 설비 라인 목록 (sink 제외)
+equipment_lines = topology.equipment_lines
 
 load_dotenv()
 
@@ -33,12 +54,16 @@ org = os.getenv("INFLUXDB_ORG")
 redis_url = os.getenv("REDIS_URL")
 client = InfluxDBClient(url=url, token=token, org=org)
 query_api = client.query_api()
+# 라인별 최신 피처/위험 점수 (FeatureUpdater.py가 갱신)
+feature_store = FeatureStore(redis.from_url(url=redis_url, decode_responses=True) if redis_url else None)
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
     db_outputs: list
     process_id: list  # 공정 ID를 저장하기 위한 필드 추가
     next_inspection: list
+    trace: list  # 판단에 사용한 최신 상태 이벤트의 추적 정보 (지연 측정용)
+    recommendation: list  # 점검 최적화 도구 출력 (JSON 문자열)
     
 graph_builder = StateGraph(State)
 llm = ChatOpenAI(model="gpt-4o", temperature=0)
@@ -48,11 +73,12 @@ from langchain_core.prompts import ChatPromptTemplate
 TEMPLATE = """You are the process operations manager for a factory.
 You want to refer to the process equipment status data in InfluxDB to decide whether or not to perform maintenance before a failure occurs.
 Based on the user's question, determine which process should be checked.
-The process name is one of P1-A, P1-B, P2-A, or P2-B. The answer must be one of these four only.
+The process name is one of {lines}. The answer must be one of these only.
 
 Below is the ID of the process for which inspection was requested.
 User: {question}
 process_id:"""
+TEMPLATE = TEMPLATE.replace("{lines}", ", ".join(equipment_lines))
 
 def PredictiveMaster(state: State):
     user_message = ""
@@ -62,7 +88,7 @@ def PredictiveMaster(state: State):
             break
     
     # 간단하게 정규식을 사용하여 공정 ID를 직접 찾기
-    process_pattern = re.compile(r'P[12]-[AB]', re.IGNORECASE)
+    process_pattern = re.compile("|".join(re.escape(line) for line in equipment_lines), re.IGNORECASE)
     matches = process_pattern.findall(user_message)
     
     if matches:
@@ -87,6 +113,7 @@ class InfluxNode:
     """
     def __init__(self):
         self.query_api = query_api
+        self.reader = StatusLogReader(query_api)
         
     def __call__(self, state: State):
         process_id = state.get("process_id", [])[-1]
@@ -97,36 +124,101 @@ class InfluxNode:
             return {"db_outputs": ["공정 ID를 찾을 수 없습니다."]}
             
         output = []
+        trace = None
         
         print(f"다음 공정 상태 조회: {process_id}")
-        query = f"""
-        from(bucket: "{process_id}_status")
-        |> range(start: -1h)
-        |> filter(fn: (r) => r["_measurement"] == "status_log")
-        |> sort(columns: ["_time"], desc: true)
-        """
         
         try:
-            result = self.query_api.query(query=query)
+            events = self.reader.events([process_id], "|> range(start: -1h)")[process_id]
             
-            for table in result:
-                for record in table.records:
-                    output.append(f"{record.get_time()}: {record.get_value()}")
+            # 최신순으로 이벤트마다 event_type / event_status / available 한 줄씩 (trace_id는 프롬프트에서 제외)
+            for event in reversed(events):
+                for value in (event.event_type, event.event_status, event.available):
+                    output.append(f"{event.time}: {value}")
+            latest = next((event for event in reversed(events) if event.trace_id), None)
+            if latest is not None:
+                read_at = time.time()
+                trace = {"id": latest.trace_id, "t_event": latest.time.timestamp(), "read_at": read_at}
+                observe_hop("agent", "event_to_read", read_at - trace["t_event"])
             
             if not output:
                 output.append("No data found")
                 
             db_output = "\n".join(output)
+
+            # 피처 저장소에 라인 요약(위험 점수 포함)이 있으면 로그 앞에 붙임
+            try:
+                features = feature_store.read(process_id)
+            except redis.exceptions.RedisError as e:
+                print(f"Feature store error: {e}")
+                features = None
+            if features:
+                db_output = f"LINE_FEATURES: {describe(process_id, features)}\n{db_output}"
             
         except Exception as e:
             print(f"Error querying InfluxDB: {e}")
             db_output = "Error querying database"
+            trace = None
         
-        return {"db_outputs": [db_output]}
+        if trace is None:
+            return {"db_outputs": [db_output]}
+        return {"db_outputs": [db_output], "trace": [trace]}
 
 influx_node = InfluxNode()
 graph_builder.add_node("InfluxNode", influx_node)
 
+# ===============================
+# 점검 시점 최적화 도구
+# ===============================
+# 시뮬레이터 체크포인트의 누적 가동시간으로 inspection_optimizer 권고를 계산 (캐시 적중 시 1ms 미만).
+# --decision llm: 권고를 판단/다음 점검 프롬프트에 함께 넘김, optimizer: LLM 호출 없이 권고를 그대로 따름.
+# 체크포인트가 없으면 권고 없이 LLM으로 판단.
+def line_runtime(process_id):
+    """시뮬레이터 체크포인트(sim_state:<라인>)의 마지막 리셋 이후 누적 가동시간. 없으면 None"""
+    redis_client = redis.from_url(url=redis_url, decode_responses=True)
+    runtime = redis_client.hget(f"{STATE_PREFIX}{process_id}", "runtime")
+    return float(runtime) if runtime is not None else None
+
+
+def inspection_recommendation(process_id):
+    runtime = line_runtime(process_id.strip())
+    if runtime is None:
+        return "No runtime checkpoint found"
+    return json.dumps(recommend(runtime, args.sim_speed))
+
+
+optimizer_tool = Tool(
+    name="inspection_optimizer",
+    func=inspection_recommendation,
+    description="Monte Carlo maintenance recommendation for a line from its runtime since the last reset. "
+                "Input: line ID. Output: JSON with maintain_now, wait_seconds, interval_after_reset, availability.",
+)
+
+
+def OptimizerNode(state: State):
+    process_id = state.get("process_id", [])[-1]
+    if not redis_url or not process_id:
+        return {}
+    try:
+        output = optimizer_tool.run(process_id)
+    except redis.exceptions.RedisError as e:
+        print(f"Optimizer error: {e}")
+        return {}
+    print(f"점검 최적화 권고: {output}")
+    return {"recommendation": [output]}
+
+
+def current_recommendation(state: State):
+    """이번 점검의 최적화 권고 dict. 없거나 체크포인트가 없었으면 None"""
+    output = (state.get("recommendation") or [None])[-1]
+    try:
+        return json.loads(output) if output else None
+    except json.JSONDecodeError:
+        return None
+
+
+graph_builder.add_node("OptimizerNode", OptimizerNode)
+
 # 의사결정 템플릿 수정
 DECISION_TEMPLATE = """You are the process operations manager for a factory.
 You want to refer to the process equipment status data in InfluxDB to decide whether or not to perform maintenance before a failure occurs.
@@ -138,6 +230,8 @@ Please answer whether to inspect with True or False, and also tell us the time w
 
 INFLUX_DB_OUTPUTS: {db_output}
 
+INSPECTION_OPTIMIZER (Monte Carlo simulation of the simulator's failure model; use it as a strong hint): {optimizer}
+
 Please respond in this format:
 {{"decision": true/false, "next_inspection": "time"}}
 """
@@ -151,11 +245,18 @@ def route_to_maintenance(state: State):
     db_output = state["db_outputs"][-1]
     
     print("####### 점검 여부 판단 #######")
+
+    recommendation = current_recommendation(state)
+    if args.decision == "optimizer" and recommendation is not None:
+        print(f"최적화 권고로 결정: maintain_now={recommendation['maintain_now']}")
+        return "request_maintenance" if recommendation["maintain_now"] else "final_answer"
     
     # 템플릿의 중괄호를 이스케이프하여 포맷팅 오류 방지
-    formatted_prompt = DECISION_TEMPLATE.format(db_output=db_output)
+    formatted_prompt = DECISION_TEMPLATE.format(db_output=db_output, optimizer=json.dumps(recommendation))
     
+    started = time.perf_counter()
     response = llm.invoke([HumanMessage(content=formatted_prompt)])
+    record_llm_call("agent_decision", time.perf_counter() - started, response)
     response_text = response.content.strip()
     
     print(f"결정 응답: {response_text}")
@@ -186,7 +287,7 @@ def route_to_maintenance(state: State):
         return "final_answer"
 
 graph_builder.add_conditional_edges(
-    "InfluxNode",
+    "OptimizerNode",
     route_to_maintenance,
     {"request_maintenance": "request_maintenance",
      "final_answer": "final_answer"}
@@ -199,7 +300,14 @@ def request_maintenance(state: State):
             decode_responses=True
         )
     channel = f"{process_id}_maintenance"
-    message = "maintenance_request"
+    # 판단 근거가 된 상태 이벤트의 추적 정보를 함께 보내 시뮬레이터가 수신 지연을 기록
+    trace = (state.get("trace") or [None])[-1]
+    payload = {"type": "maintenance_request"}
+    if trace:
+        published_at = time.time()
+        observe_hop("agent", "decision", published_at - trace["read_at"])
+        payload["trace"] = {**trace, "published_at": published_at}
+    message = json.dumps(payload)
     try:
         redis_client.publish(channel, message)
         print(f"Redis publish: {channel} -> {message}")
@@ -213,6 +321,14 @@ graph_builder.add_node("request_maintenance", request_maintenance)
 def final_answer(state: State):
     process_id = state.get("process_id", "Unknown")
     db_outputs = state.get("db_outputs", ["No data"])
+    recommendation = current_recommendation(state)
+
+    if args.decision == "optimizer" and recommendation is not None:
+        wait = next_check_seconds(recommendation)
+        next_inspection = datetime.now(timezone.utc) + timedelta(seconds=wait)
+        reason = (f"runtime {recommendation['runtime']:.0f}s, maintain_now={recommendation['maintain_now']}, "
+                  f"expected availability {recommendation['availability']:.3f}")
+        return {"next_inspection": [json.dumps({"next_inspection": next_inspection.isoformat(), "reason": reason})]}
     
     summary_prompt = f"""당신은 공정 예지보전을 위한 AI 에이전트입니다. 당신의 목표는 설비의 상태를 모니터링하고 고장이 발생하기 전에 점검을 수행하는 것 입니다.
     {process_id} 공정에 대해 이전 설비 상태 로그를 조회하고 평균 고장 간격과 평균 수리 시간을 고려해서 다음 점검 시간을 결정해주세요.
@@ -220,6 +336,9 @@ def final_answer(state: State):
     공정 {process_id}에 대한 상태 정보가 다음과 같습니다:
     
     {db_outputs[-1]}
+
+    고장 모델 몬테카를로 최적화 권고 (wait_seconds: 정비하지 않을 때 다음 판단까지, interval_after_reset: 정비 후 다음 점검까지):
+    {json.dumps(recommendation)}
     
     이 데이터를 기반으로 다음에 공정을 점검 여부를 결정할 시간을 알려주세요.
     그리고 그렇게 결정한 이유에 대해서도 설명하세요.
@@ -233,7 +352,9 @@ def final_answer(state: State):
     "reason": "reason"}}
     """
     
+    started = time.perf_counter()
     response = llm.invoke([HumanMessage(content=summary_prompt)])
+    record_llm_call("agent_next_inspection", time.perf_counter() - started, response)
     
     return {"next_inspection": [response.content]}
 
@@ -241,6 +362,7 @@ graph_builder.add_node("final_answer", final_answer)
 
 graph_builder.add_edge(START, "PredictiveMaster")
 graph_builder.add_edge("PredictiveMaster", "InfluxNode")
+graph_builder.add_edge("InfluxNode", "OptimizerNode")
 graph_builder.add_edge("request_maintenance", "final_answer")
 graph_builder.add_edge("final_answer", END)
 
@@ -258,33 +380,77 @@ def stream_graph_updates(user_input: str):
             print(f"{key}: {value}\n")
     return event
 
-def run():
+# ===============================
+# 이상 감지 기반 즉시 점검
+# ===============================
+# 정기 점검(next_inspection) 사이에도 라인 이벤트 스트림을 감시해, 이상 신호가 임계값을 넘으면 기다리지 않고 바로 점검.
+# 감지기는 스레드에서 돌고 요청은 큐로 넘김. 점검하는 동안 들어온 요청은 방금 끝난 점검으로 처리된 것으로 보고 버림.
+detector = AnomalyDetector([p_id], cooldown=args.trigger_cooldown)
+triggers = queue.Queue()
+
+
+def watch_line_events():
+    redis_client = redis.from_url(url=redis_url, decode_responses=True)
+    last_id = "$"
     while True:
-        a = stream_graph_updates("P2-A")
-        raw_str = a['final_answer']['next_inspection'][0]
-        
-        # JSON 문자열 추출
-        json_str = re.search(r'{.*}', raw_str, re.DOTALL).group()
+        try:
+            events, last_id = read_events(redis_client, last_id)
+            for _, event in events:
+                fired = detector.observe(event)
+                if fired:
+                    triggers.put(fired)
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis connection error: {e}")
+            time.sleep(1)
+
+
+def seconds_until_next_inspection(result):
+    raw_str = result['final_answer']['next_inspection'][0]
+
+    # JSON 문자열 추출
+    json_str = re.search(r'{.*}', raw_str, re.DOTALL).group()
+
+    # JSON 파싱
+    parsed = json.loads(json_str)
 
-        # JSON 파싱
-        parsed = json.loads(json_str)
+    # next_inspection 시간 추출 및 datetime 객체로 변환
+    next_inspection_time = datetime.fromisoformat(parsed["next_inspection"])
 
-        # next_inspection 시간 추출 및 datetime 객체로 변환
-        next_inspection_time = datetime.fromisoformat(parsed["next_inspection"])
+    # 현재 시간 (UTC 기준)
+    now = datetime.now(timezone.utc)
 
-        # 현재 시간 (UTC 기준)
-        now = datetime.now(timezone.utc)
+    # 시간 차이 계산
+    remaining_time = next_inspection_time - now
+    return remaining_time.total_seconds()
 
-        # 시간 차이 계산
-        remaining_time = next_inspection_time - now
-        remaining_time_seconds = remaining_time.total_seconds()
+
+def run():
+    line, user_input, reason = p_id, p_id, "schedule"
+    while True:
+        AGENT_EVALUATIONS.labels(line=line, reason=reason).inc()
+        detector.mark_evaluated(line)
+        a = stream_graph_updates(user_input)
+        while not triggers.empty():
+            triggers.get_nowait()
+
+        remaining_time_seconds = seconds_until_next_inspection(a)
         print(remaining_time_seconds)
+        line, user_input, reason = p_id, p_id, "schedule"
         if remaining_time_seconds < 0:
             print("점검 시간이 지났습니다.")
-            run()
-        else:
-            time.sleep(remaining_time_seconds)
-            run()
+            continue
+
+        # next_inspection까지 기다리되, 그 전에 이상 감지 요청이 오면 해당 라인을 바로 점검
+        try:
+            line, signals = triggers.get(timeout=remaining_time_seconds)
+            print(f"이상 감지로 즉시 점검: {line} {signals}")
+            user_input, reason = f"{line} 이상 감지: {', '.join(signals)}", "anomaly"
+        except queue.Empty:
+            pass
+
 
 if __name__ == "__main__":
+    start_metrics_server(args.metrics_port)
+    if redis_url and not args.no_anomaly_trigger:
+        threading.Thread(target=watch_line_events, daemon=True).start()
     run()
\ No newline at end of file
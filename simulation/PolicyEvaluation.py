@@ -0,0 +1,363 @@
+import os
+import re
+import json
+import argparse
+import importlib
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from failure_model import FailureModel, FAILURE_DETECT_DELAY
+from inspection_optimizer import recommend, next_check_seconds
+
+# ===============================
+# 정비 정책 오프라인 평가 (사후 정비 vs Rule-based vs AI Agent vs 몬테카를로 최적화)
+# ===============================
+# ProcessSimulator와 같은 고장/수리/정비 모델로 라인 하나를 이산 사건 방식으로 시뮬레이션.
+# 정책마다 같은 시드 목록으로 반복 실행(난수 스트림을 용도별로 분리해 정책 간 비교 분산을 줄임)하고
+# 가동률, 시간당 처리량, 다운타임, 정비 비용의 평균과 95% 신뢰구간, 사후 정비 대비 차이를 출력.
+#
+# Agent 정책은 PMAgent와 같은 흐름: 점검 시각마다 최근 상태 로그(InfluxNode 출력 형식)를 LLM에 넘기고
+# {"decision": bool, "next_inspection": ISO 8601} 응답에 따라 정비 여부와 다음 점검 시각을 정함.
+# --agent stub: LLM 대신 로그에서 평균 고장 간격을 추정하는 규칙으로 응답
+# --agent 모듈:함수: (db_output: str, now: datetime) -> 응답 문자열 을 돌려주는 함수를 불러와 사용
+# Optimizer 정책은 PMAgent --decision optimizer와 같이 점검 시각마다 inspection_optimizer.py 권고를 따름.
+
+POLICIES = ("reactive", "rule_based", "agent", "optimizer")
+METRICS = ("availability", "throughput_per_hour", "downtime_minutes", "maintenance_cost")
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+EVENT_TYPES = ("processing", "failure", "repair", "maintenance")
+
+# 양측 95% t 분포 임계값 (자유도 → 값), 30 초과는 정규분포 근사
+T_CRITICAL_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+                 9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--policies", type=str, default=",".join(POLICIES), help="Comma separated policies to evaluate")
+    parser.add_argument("--replications", type=int, default=30, help="Seeded replications per policy")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed")
+    parser.add_argument("--horizon_hours", type=float, default=8.0, help="Simulated wall-clock hours per replication")
+    parser.add_argument("--sim_speed", type=float, default=5.0, help="Simulation speed of the modelled ProcessSimulator")
+    parser.add_argument("--maintenance_interval", type=float, default=30.0, help="Runtime between maintenances for rule_based")
+    parser.add_argument("--agent", type=str, default="stub", help="'stub' or 'module:callable' returning an LLM-style response")
+    parser.add_argument("--agent_window", type=float, default=3600.0, help="Seconds of status history shown to the agent")
+    parser.add_argument("--maintenance_cost", type=float, default=1.0, help="Cost per preventive maintenance")
+    parser.add_argument("--repair_cost", type=float, default=3.0, help="Cost per failure repair")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--output", type=str, default=None, help="Write per-replication results and summary as JSON")
+    return parser.parse_args()
+
+
+# ===============================
+# 정책
+# ===============================
+class ReactivePolicy:
+    name = "reactive"
+
+    def should_maintain(self, line):
+        return False
+
+
+class RuleBasedPolicy:
+    """ProcessSimulator의 rule_based와 같이 누적 가동시간이 주기에 도달하면 정비"""
+    name = "rule_based"
+
+    def __init__(self, interval):
+        self._interval = interval
+
+    def should_maintain(self, line):
+        return line.runtime >= self._interval
+
+
+def format_db_output(events, now):
+    """PMAgent InfluxNode 출력과 같은 형식: 최신순으로 이벤트마다 event_type/event_status/available '시각: 값' 한 줄씩"""
+    output = []
+    for t, event_type, event_status, available in reversed(events):
+        timestamp = EPOCH + timedelta(seconds=t)
+        for value in (event_type, event_status, available):
+            output.append(f"{timestamp}: {value}")
+    return "\n".join(output) if output else "No data found"
+
+
+def parse_agent_response(response_text):
+    """PMAgent와 같은 방식으로 ```json 블록을 벗기고 JSON을 파싱"""
+    clean_text = response_text.strip()
+    if clean_text.startswith("```json"):
+        clean_text = clean_text.split("```json")[1]
+    if clean_text.endswith("```"):
+        clean_text = clean_text.split("```")[0]
+    match = re.search(r"{.*}", clean_text, re.DOTALL)
+    return json.loads(match.group() if match else clean_text)
+
+
+class StubPMAgentLLM:
+    """
+    LLM 대신 쓰는 결정 규칙. 로그에서 가동 재개 → 고장까지의 간격(고장 간격)을 추정해
+    현재 가동 구간이 그 safety 비율을 넘었으면 점검을 요청하고, 남은 시간 뒤를 다음 점검 시각으로 응답.
+    """
+    def __init__(self, safety=0.7, min_interval=10.0, default_interval=120.0):
+        self._safety = safety
+        self._min_interval = min_interval
+        self._default_interval = default_interval
+
+    def __call__(self, db_output, now):
+        rows = {}
+        for line in db_output.splitlines():
+            timestamp, _, value = line.rpartition(": ")
+            if timestamp:
+                rows.setdefault(timestamp, []).append(value)
+
+        events = []
+        for timestamp, values in rows.items():
+            # 같은 시각에 여러 이벤트(고장과 수리 시작 등)가 기록될 수 있음
+            for value in values:
+                if value in EVENT_TYPES:
+                    events.append((datetime.fromisoformat(timestamp), value))
+        events.sort()
+
+        uptimes, resumed = [], None
+        for t, event_type in events:
+            if event_type == "processing":
+                resumed = t
+            elif event_type in ("failure", "maintenance") and resumed is not None:
+                if event_type == "failure":
+                    uptimes.append((t - resumed).total_seconds())
+                resumed = None
+
+        if not uptimes:
+            return json.dumps({"decision": False, "next_inspection": (now + timedelta(seconds=self._default_interval)).isoformat()})
+
+        mtbf = float(np.median(uptimes))
+        age = (now - resumed).total_seconds() if resumed is not None else 0.0
+        threshold = self._safety * mtbf
+        decision = age >= threshold
+        wait = threshold if decision else threshold - age
+        next_inspection = now + timedelta(seconds=max(self._min_interval, wait))
+        return json.dumps({"decision": decision, "next_inspection": next_inspection.isoformat()})
+
+
+class AgentPolicy:
+    name = "agent"
+
+    def __init__(self, llm, window):
+        self._llm = llm
+        self._window = window
+        self._next_inspection = 0.0
+        self.calls = 0
+
+    def should_maintain(self, line):
+        if line.t < self._next_inspection:
+            return False
+        now = EPOCH + timedelta(seconds=line.t)
+        self.calls += 1
+        try:
+            response = parse_agent_response(self._llm(format_db_output(line.recent_events(self._window), now), now))
+            decision = response.get("decision", False)
+            if isinstance(decision, str):
+                decision = decision.lower() == "true"
+            next_inspection = datetime.fromisoformat(response["next_inspection"])
+            if next_inspection.tzinfo is None:
+                next_inspection = next_inspection.replace(tzinfo=timezone.utc)
+            self._next_inspection = line.t + max(0.0, (next_inspection - now).total_seconds())
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # PMAgent와 같이 응답을 해석하지 못하면 점검하지 않음
+            print(f"Error parsing agent response: {e}")
+            decision = False
+            self._next_inspection = line.t + 60.0
+        return bool(decision)
+
+
+class OptimizerPolicy:
+    name = "optimizer"
+
+    def __init__(self, sim_speed):
+        self._sim_speed = sim_speed
+        self._next_inspection = 0.0
+        self.calls = 0
+
+    def should_maintain(self, line):
+        if line.t < self._next_inspection:
+            return False
+        self.calls += 1
+        result = recommend(line.runtime, self._sim_speed)
+        self._next_inspection = line.t + next_check_seconds(result)
+        return result["maintain_now"]
+
+
+def load_agent(spec):
+    if spec == "stub":
+        return StubPMAgentLLM()
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def build_policy(name, config):
+    if name == "reactive":
+        return ReactivePolicy()
+    if name == "rule_based":
+        return RuleBasedPolicy(config["maintenance_interval"])
+    if name == "agent":
+        return AgentPolicy(load_agent(config["agent"]), config["agent_window"])
+    if name == "optimizer":
+        return OptimizerPolicy(config["sim_speed"])
+    raise ValueError(f"Unknown policy: {name}")
+
+
+# ===============================
+# 라인 시뮬레이션
+# ===============================
+class LineState:
+    def __init__(self, history_window):
+        self.t = 0.0
+        self.runtime = 0.0
+        self._history_window = history_window
+        self._events = deque()
+
+    def log(self, event_type, event_status, available):
+        self._events.append((self.t, event_type, event_status, int(available)))
+        while self._events and self._events[0][0] < self.t - self._history_window:
+            self._events.popleft()
+
+    def recent_events(self, window):
+        return [event for event in self._events if event[0] >= self.t - window]
+
+
+def simulate(policy_name, seed, config):
+    """정책 하나를 시드 하나로 horizon 동안 실행하고 지표를 반환"""
+    policy = build_policy(policy_name, config)
+    model = FailureModel(config["sim_speed"])
+    # 용도별 난수 스트림을 분리해 정책이 달라도 같은 시드는 같은 스텝/고장/수리 난수 열을 사용
+    step_rng, fail_rng, repair_rng, maintain_rng = (
+        np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(4)
+    )
+    horizon = config["horizon_hours"] * 3600
+    line = LineState(config["agent_window"])
+
+    up = down = 0.0
+    finished = interrupted = maintenances = failures = 0
+    line.log("processing", "", True)
+    while line.t < horizon:
+        if policy.should_maintain(line):
+            line.log("maintenance", "start", False)
+            dt = model.maintain_time(maintain_rng)
+            line.t += dt
+            down += dt
+            maintenances += 1
+            line.runtime = 0.0
+            line.log("maintenance", "finish", True)
+            line.log("processing", "", True)
+            continue
+
+        dt = model.step_time(step_rng)
+        line.t += dt
+        up += dt
+        line.runtime += dt
+        if model.should_fail(line.runtime, fail_rng):
+            failures += 1
+            interrupted += 1
+            line.log("failure", "", False)
+            line.log("repair", "start", False)
+            dt = FAILURE_DETECT_DELAY + model.repair_time(repair_rng)
+            line.t += dt
+            down += dt
+            line.runtime = 0.0
+            line.log("repair", "finish", True)
+            line.log("processing", "", True)
+        else:
+            finished += 1
+
+    hours = line.t / 3600
+    return {
+        "policy": policy_name,
+        "seed": seed,
+        "availability": up / (up + down),
+        "throughput_per_hour": finished / hours,
+        "downtime_minutes": down / 60,
+        "maintenance_cost": maintenances * config["maintenance_cost"] + failures * config["repair_cost"],
+        "failures": failures,
+        "maintenances": maintenances,
+        "interrupted": interrupted,
+        "agent_calls": getattr(policy, "calls", 0),
+    }
+
+
+def _simulate_task(task):
+    return simulate(*task)
+
+
+# ===============================
+# 통계
+# ===============================
+def t_critical(df):
+    if df > 30:
+        return 1.96
+    return T_CRITICAL_95[max(k for k in T_CRITICAL_95 if k <= df)]
+
+
+def confidence_interval(values):
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return mean, mean, mean
+    half = t_critical(len(values) - 1) * float(values.std(ddof=1)) / np.sqrt(len(values))
+    return mean, mean - half, mean + half
+
+
+def summarize(results, baseline="reactive"):
+    by_policy = {}
+    for result in results:
+        by_policy.setdefault(result["policy"], {})[result["seed"]] = result
+
+    summary = {}
+    for policy, runs in by_policy.items():
+        seeds = sorted(runs)
+        summary[policy] = {"replications": len(seeds)}
+        for metric in METRICS:
+            summary[policy][metric] = confidence_interval([runs[s][metric] for s in seeds])
+            # 같은 시드끼리 짝지은 차이 (공통 난수로 분산 감소)
+            if policy != baseline and baseline in by_policy:
+                paired = [runs[s][metric] - by_policy[baseline][s][metric] for s in seeds if s in by_policy[baseline]]
+                if paired:
+                    summary[policy][f"{metric}_vs_{baseline}"] = confidence_interval(paired)
+    return summary
+
+
+def print_summary(summary, baseline="reactive"):
+    for policy, stats in summary.items():
+        print(f"\n=== {policy} (n={stats['replications']}) ===")
+        for metric in METRICS:
+            mean, low, high = stats[metric]
+            line = f"{metric:>20}: {mean:10.4f}  95% CI [{low:.4f}, {high:.4f}]"
+            diff = stats.get(f"{metric}_vs_{baseline}")
+            if diff:
+                line += f"  Δ vs {baseline}: {diff[0]:+.4f} [{diff[1]:+.4f}, {diff[2]:+.4f}]"
+            print(line)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    policies = [p.strip() for p in args.policies.split(",") if p.strip()]
+    config = {
+        "horizon_hours": args.horizon_hours,
+        "sim_speed": args.sim_speed,
+        "maintenance_interval": args.maintenance_interval,
+        "agent": args.agent,
+        "agent_window": args.agent_window,
+        "maintenance_cost": args.maintenance_cost,
+        "repair_cost": args.repair_cost,
+    }
+    tasks = [(policy, args.seed + i, config) for policy in policies for i in range(args.replications)]
+
+    print(f"Running {len(tasks)} replications on {args.workers} workers")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(_simulate_task, tasks, chunksize=max(1, len(tasks) // (4 * (args.workers or 1)))))
+
+    summary = summarize(results)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "summary": summary, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\nSaved {args.output}")
@@ -0,0 +1,202 @@
+import os
+import time
+import argparse
+import statistics
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from influxdb_client import InfluxDBClient
+from process_log import events_flux, PROCESS_BUCKET, MEASUREMENT_V1, MEASUREMENT_V2
+
+# ===============================
+# process_log v1 → v2 마이그레이션
+# ===============================
+# 과거 v1 포인트를 배치(시간 구간) 단위로 v2(process_event)로 다시 씀. 변환은 Flux to()로 서버에서 수행하고,
+# 배치마다 v1 포인트가 v2에 모두 있는지(product_id/status/_time 기준) 검증. 건수만 비교하면 듀얼 쓰기/v2 단독
+# 쓰기 구간 때문에 백필이 덜 된 배치도 통과할 수 있어, 누락 0건인 배치만 v1을 삭제함.
+# 같은 포인트를 다시 써도 덮어쓰기라 중간에 끊겨도 재실행하면 됨.
+# --report는 두 스키마의 시리즈 수와 대표 조회(생산 추이/라인 로그/흐름 분석)의 조회 시간을 비교 출력.
+#   python ProcessLogMigration.py --report                # 전환 전 측정
+#   python ProcessLogMigration.py --days 30 --report      # 백필 후 측정
+#   python ProcessLogMigration.py --days 30 --delete_v1   # 누락 없이 검증된 배치의 v1 포인트 삭제
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=0, help="Backfill the last N days into the v2 schema")
+    parser.add_argument("--batch_hours", type=int, default=6, help="Hours rewritten per query")
+    parser.add_argument("--delete_v1", action="store_true", help="Delete v1 points of batches with no v1 point missing from v2")
+    parser.add_argument("--dry_run", action="store_true", help="Only print the batches, their v1/v2 counts and missing v1 points")
+    parser.add_argument("--report", action="store_true", help="Report series counts and query times for both schemas")
+    parser.add_argument("--report_days", type=int, default=30, help="Window for series cardinality")
+    parser.add_argument("--bench_range", type=str, default="12h", help="Range of the benchmark queries")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark query (median is reported)")
+    return parser.parse_args()
+
+
+def _flux_time(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def rewrite_flux(start, stop):
+    # group()으로 product_id 태그를 그룹 키에서 빼야 map에서 필드로 옮길 수 있음
+    return f'''
+from(bucket: "{PROCESS_BUCKET}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r._measurement == "{MEASUREMENT_V1}" and r._field == "status")
+  |> group()
+  |> map(fn: (r) => ({{
+      _time: r._time, _measurement: "{MEASUREMENT_V2}", _field: "product_id", _value: r.product_id,
+      process_id: r.process_id, line_id: r.line_id, status: r._value
+  }}))
+  |> to(bucket: "{PROCESS_BUCKET}", tagColumns: ["process_id", "line_id", "status"])
+  |> count()
+'''
+
+
+def count_flux(measurement, field, start, stop):
+    return f'''
+from(bucket: "{PROCESS_BUCKET}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r._measurement == "{measurement}" and r._field == "{field}")
+  |> group()
+  |> count()
+'''
+
+
+def missing_flux(start, stop):
+    # v1 포인트마다 같은 product_id/status/_time의 v2 포인트가 있는지 left join으로 확인해 없는 건수를 셈
+    return f'''
+import "join"
+
+v1 = from(bucket: "{PROCESS_BUCKET}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r._measurement == "{MEASUREMENT_V1}" and r._field == "status")
+  |> group()
+  |> map(fn: (r) => ({{_time: r._time, product_id: r.product_id, status: r._value}}))
+v2 = from(bucket: "{PROCESS_BUCKET}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r._measurement == "{MEASUREMENT_V2}" and r._field == "product_id")
+  |> group()
+  |> map(fn: (r) => ({{_time: r._time, product_id: r._value, status: r.status}}))
+
+join.left(
+    left: v1,
+    right: v2,
+    on: (l, r) => l._time == r._time and l.product_id == r.product_id and l.status == r.status,
+    as: (l, r) => ({{_time: l._time, _value: if exists r.product_id then 0 else 1}}),
+)
+  |> sum()
+'''
+
+
+def _scalar(query_api, org, query):
+    values = [record.get_value() for table in query_api.query(org=org, query=query) for record in table.records]
+    return int(values[0]) if values else 0
+
+
+def batch_counts(query_api, org, start, stop):
+    """(v1 건수, v2 건수, v2에 없는 v1 건수)"""
+    start, stop = _flux_time(start), _flux_time(stop)
+    return (
+        _scalar(query_api, org, count_flux(MEASUREMENT_V1, "status", start, stop)),
+        _scalar(query_api, org, count_flux(MEASUREMENT_V2, "product_id", start, stop)),
+        _scalar(query_api, org, missing_flux(start, stop)),
+    )
+
+
+def migrate(client, org, days, batch_hours, delete_v1=False, dry_run=False):
+    query_api = client.query_api()
+    delete_api = client.delete_api()
+    stop = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    cursor = stop - timedelta(days=days)
+    batch = timedelta(hours=batch_hours)
+    totals = {"v1": 0, "v2": 0, "missing": 0, "mismatched": 0}
+
+    while cursor < stop:
+        batch_stop = min(cursor + batch, stop)
+        if not dry_run:
+            query_api.query(org=org, query=rewrite_flux(_flux_time(cursor), _flux_time(batch_stop)))
+        v1, v2, missing = batch_counts(query_api, org, cursor, batch_stop)
+        totals["v1"] += v1
+        totals["v2"] += v2
+        totals["missing"] += missing
+        # 듀얼 쓰기/v2 단독 쓰기 구간이 있으면 v2가 더 많아도 누락이 있을 수 있어 건수 대신 포인트 단위로 판정
+        ok = missing == 0
+        if not ok:
+            totals["mismatched"] += 1
+        print(f"{cursor} ~ {batch_stop}: v1={v1} v2={v2} missing={missing} {'OK' if ok else 'MISMATCH'}")
+
+        if delete_v1 and ok and v1 and not dry_run:
+            delete_api.delete(cursor, batch_stop, f'_measurement="{MEASUREMENT_V1}"', bucket=PROCESS_BUCKET, org=org)
+            print(f"    v1 삭제: {v1}건")
+        cursor = batch_stop
+
+    print(f"합계: v1={totals['v1']} v2={totals['v2']} 누락={totals['missing']} 불일치 배치={totals['mismatched']}")
+    return totals
+
+
+# ===============================
+# 전/후 비교 리포트
+# ===============================
+def series_count(query_api, org, measurement, days):
+    query = f'''
+import "influxdata/influxdb"
+influxdb.cardinality(bucket: "{PROCESS_BUCKET}", start: -{days}d, predicate: (r) => r._measurement == "{measurement}")
+'''
+    return _scalar(query_api, org, query)
+
+
+def benchmark_queries(schema, range_str):
+    """대시보드/리포트가 실제로 사용하는 process 버킷 조회"""
+    range_clause = f"|> range(start: -{range_str})"
+    return {
+        "production (finish/line/1h)": events_flux(range_clause, statuses=["finish"], schema=schema) + '''
+        |> group(columns:["line_id"])
+        |> aggregateWindow(every: 1h, fn: count, createEmpty: false)
+        ''',
+        "line log (P1-A)": events_flux(range_clause, where='r.line_id == "P1-A"', schema=schema),
+        "flow analytics (all events)": events_flux(range_clause, schema=schema) + '''
+        |> keep(columns: ["_time", "_value", "product_id", "process_id", "line_id"])
+        ''',
+    }
+
+
+def time_query(query_api, org, query, repeat):
+    durations = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        tables = query_api.query(org=org, query=query)
+        durations.append(time.perf_counter() - started)
+        rows = sum(len(table.records) for table in tables)
+    return statistics.median(durations), rows
+
+
+def report(client, org, days, range_str, repeat):
+    query_api = client.query_api()
+    print(f"\n=== 시리즈 수 (최근 {days}일) ===")
+    for schema, measurement in (("v1", MEASUREMENT_V1), ("v2", MEASUREMENT_V2)):
+        print(f"{schema} {measurement}: {series_count(query_api, org, measurement, days)}")
+
+    print(f"\n=== 조회 시간 (최근 {range_str}, {repeat}회 중앙값) ===")
+    results = {schema: benchmark_queries(schema, range_str) for schema in ("v1", "v2")}
+    for name in results["v1"]:
+        v1_seconds, v1_rows = time_query(query_api, org, results["v1"][name], repeat)
+        v2_seconds, v2_rows = time_query(query_api, org, results["v2"][name], repeat)
+        speedup = v1_seconds / v2_seconds if v2_seconds else float("inf")
+        print(
+            f"{name:<30} v1 {v1_seconds * 1000:8.1f}ms ({v1_rows} rows)  "
+            f"v2 {v2_seconds * 1000:8.1f}ms ({v2_rows} rows)  x{speedup:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    load_dotenv()
+    org = os.getenv("INFLUXDB_ORG")
+    client = InfluxDBClient(url=os.getenv("INFLUXDB_URL"), token=os.getenv("INFLUXDB_TOKEN"), org=org, timeout=600_000)
+
+    if args.days:
+        migrate(client, org, args.days, args.batch_hours, delete_v1=args.delete_v1, dry_run=args.dry_run)
+    if args.report:
+        report(client, org, args.report_days, args.bench_range, args.repeat)
@@ -1,15 +1,25 @@
 import os
 import argparse
-from ProcessSimulator import ProcessSimulator
+from ProcessSimulator import ProcessSimulator, MAINTENANCE_POLICIES
+from topology import Topology
+from metrics import start_metrics_server
 from dotenv import load_dotenv
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", type=str, choices=["producer","relay","consumer"], required=True, help="Mode: producer or consumer")
-    parser.add_argument("--process_name", type=str, required=True, help="Process name")
+    parser.add_argument("--mode", type=str, choices=["producer","relay","consumer"], default=None, help="Mode: producer, relay or consumer (derived from --topology if omitted)")
+    parser.add_argument("--process_name", type=str, required=True, help="Process name (comma separated to run several lines with --engine async)")
     parser.add_argument("--process_next", type=str, default=None, help="Next process name")
+    parser.add_argument("--topology", type=str, default=None, help="Topology file (JSON/YAML); next line, mode and buffer capacity come from it")
     parser.add_argument("--agent_url", type=str, default=None, help="Agent URL")
+    parser.add_argument("--policy", type=str, choices=MAINTENANCE_POLICIES, default=None, help="Maintenance policy tag (default: agent if --agent_url else reactive)")
+    parser.add_argument("--maintenance_interval", type=float, default=30.0, help="Runtime between scheduled maintenances for rule_based")
     parser.add_argument("--sim_speed", type=float, default=5.0, help="Simulation speed")
+    parser.add_argument("--buffer_capacity", type=int, default=None, help="Input buffer capacity of this line (default: unbounded)")
+    parser.add_argument("--overflow", type=str, choices=["block","reject"], default="block", help="Behaviour when the next line's buffer is full")
+    parser.add_argument("--metrics_port", type=int, default=0, help="Prometheus metrics port (0 = disabled)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the saved checkpoint and start with new equipment")
+    parser.add_argument("--engine", type=str, choices=["thread","async"], default="thread", help="thread: ProcessSimulator, async: AsyncProcessSimulator (lines share one event loop)")
     return parser.parse_args()
 
 if __name__ == "__main__":
@@ -21,16 +31,51 @@ if __name__ == "__main__":
     influxdb_org = os.getenv("INFLUXDB_ORG")
     redis_url = os.getenv("REDIS_URL")
     
-    sim = ProcessSimulator(
-        mode=args.mode,
-        process_name=args.process_name,
-        process_next=args.process_next,
-        influxdb_url=influxdb_url,
-        influxdb_token=influxdb_token,
-        influxdb_org=influxdb_org,
-        redis_url=redis_url,
-        agent_url=args.agent_url,
-        sim_speed=args.sim_speed
-    )
+    start_metrics_server(args.metrics_port)
     
-    sim.run()
\ No newline at end of file
+    # 토폴로지가 주어지면 모드/버퍼 용량을 정의에서 가져오고, 다음 라인은 라우팅 규칙으로 결정
+    topology = Topology.load(args.topology) if args.topology else None
+    process_names = [name.strip() for name in args.process_name.split(",") if name.strip()]
+    if len(process_names) > 1 and args.engine != "async":
+        raise SystemExit("Several --process_name values need --engine async")
+    if len(process_names) > 1 and topology is None:
+        raise SystemExit("Several --process_name values need --topology")
+    
+    if args.engine == "async":
+        from AsyncProcessSimulator import AsyncProcessSimulator as Simulator, run_many
+    else:
+        Simulator = ProcessSimulator
+    
+    sims = []
+    for process_name in process_names:
+        mode = args.mode
+        buffer_capacity = args.buffer_capacity
+        if topology is not None:
+            mode = mode or topology.mode_of(process_name)
+            if buffer_capacity is None:
+                buffer_capacity = topology.capacity_of(process_name)
+        if mode is None:
+            raise SystemExit("--mode is required without --topology")
+        
+        sims.append(Simulator(
+            mode=mode,
+            process_name=process_name,
+            process_next=args.process_next,
+            influxdb_url=influxdb_url,
+            influxdb_token=influxdb_token,
+            influxdb_org=influxdb_org,
+            redis_url=redis_url,
+            agent_url=args.agent_url,
+            sim_speed=args.sim_speed,
+            buffer_capacity=buffer_capacity,
+            overflow=args.overflow,
+            topology=topology,
+            policy=args.policy,
+            maintenance_interval=args.maintenance_interval,
+            resume=not args.fresh
+        ))
+    
+    if len(sims) > 1:
+        run_many(sims)
+    else:
+        sims[0].run()
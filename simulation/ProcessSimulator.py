@@ -1,12 +1,62 @@
-import random
+import json
 import time
+import uuid
 import threading
 from datetime import datetime, timezone
 import redis
 import requests
-import numpy as np
-from influxdb_client import InfluxDBClient, Point
+from influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import SYNCHRONOUS
+from metrics import ITEMS_PROCESSED, influx_write_timer, observe_hop, observe_e2e
+from topology import Router, SOURCE_PROCESS
+from failure_model import FailureModel, FAILURE_DETECT_DELAY
+from process_log import build_points, write_schema as process_write_schema, PROCESS_BUCKET
+from status_log import build_writes, write_schema as status_write_schema
+from event_stream import event_fields, publish_event
+
+# 큐별 누적 push/pop 건수 해시 (QueueMonitor가 도착/출발률 계산에 사용)
+QUEUE_STATS_PREFIX = "queue_stats:"
+# 라인별 입력 버퍼 용량 해시 (각 라인이 시작 시 자신의 용량을 등록)
+BUFFER_CAPACITY_KEY = "buffer_capacity"
+# 정비 정책: 사후 정비 / 누적 가동시간 기준 주기 정비 / AI Agent 요청 정비
+MAINTENANCE_POLICIES = ("reactive", "rule_based", "agent")
+# 라인별 상태 체크포인트 해시 / 꺼내서 처리 중인 제품 목록 (재시작 시 복구)
+STATE_PREFIX = "sim_state:"
+PROCESSING_PREFIX = "processing:"
+
+# 용량 확인과 적재를 원자적으로 수행 (가득 차면 0 반환)
+# 적재에 성공하면 넘긴 제품을 처리 중 목록에서 빼고 라인 상태(ARGV[2:])를 같은 호출에서 체크포인트
+PUSH_IF_SPACE = """
+local cap = tonumber(redis.call('HGET', KEYS[3], KEYS[1]))
+if cap and cap > 0 and redis.call('LLEN', KEYS[1]) >= cap then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('HINCRBY', KEYS[2], 'pushed', 1)
+redis.call('LREM', KEYS[4], 1, ARGV[1])
+if #ARGV > 1 then
+    redis.call('HSET', KEYS[5], unpack(ARGV, 2))
+end
+return 1
+"""
+
+# 처리 중이던 제품을 입력 큐 맨 앞으로 순서대로 되돌림 (ARGV[1]: 다음 라인에 넘기던 제품은 제외)
+# 다시 꺼낼 때 popped가 중복 집계되지 않도록 보정
+RECOVER_IN_FLIGHT = """
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+local n = 0
+for i = #items, 1, -1 do
+    if items[i] ~= ARGV[1] then
+        redis.call('LREM', KEYS[1], 1, items[i])
+        redis.call('LPUSH', KEYS[2], items[i])
+        n = n + 1
+    end
+end
+if n > 0 then
+    redis.call('HINCRBY', KEYS[3], 'popped', -n)
+end
+return n
+"""
 
 class ItemIDGenerator:
     def __init__(self):
@@ -24,7 +74,57 @@ class ItemIDGenerator:
         self.counter += 1
         return item_id
 
-class ProcessSimulator:
+    def restore(self, last_minute, counter):
+        """체크포인트에서 복원. 같은 분 안에 재시작해도 이미 발급한 ID를 다시 쓰지 않음"""
+        self.last_minute = last_minute or None
+        self.counter = int(counter or 0)
+
+
+class SimulatorState:
+    """ProcessSimulator/AsyncProcessSimulator 공용 체크포인트 필드 변환"""
+    def _state_key(self):
+        return f"{STATE_PREFIX}{self._process_name}"
+
+    def _processing_key(self):
+        return f"{PROCESSING_PREFIX}{self._process_name}"
+
+    def _state_fields(self, handoff=""):
+        # handoff: 다음 라인 버퍼가 가득 차 넘기지 못하고 있는 제품 (재시작 시 공정을 다시 하지 않고 바로 넘김)
+        fields = {
+            "runtime": self._runtime,
+            "failure_prob": float(self._failure_prob),
+            "is_broken": int(self._is_broken),
+            "is_maintenance": int(self._is_maintenance),
+            "handoff": handoff,
+            "saved_at": time.time(),
+        }
+        if self._mode == "producer":
+            fields["id_minute"] = self._item_id_generator.last_minute or ""
+            fields["id_counter"] = self._item_id_generator.counter
+        return fields
+
+    def _state_args(self, handoff=""):
+        args = []
+        for field, value in self._state_fields(handoff).items():
+            args += [field, value]
+        return args
+
+    def _apply_state(self, state):
+        if not state:
+            return
+        self._runtime = float(state.get("runtime", 0.0))
+        self._failure_prob = self._failure_model.failure_prob(self._runtime)
+        self._is_broken = state.get("is_broken") == "1"
+        self._is_maintenance = state.get("is_maintenance") == "1"
+        self._pending_handoff = state.get("handoff") or None
+        if self._mode == "producer":
+            self._item_id_generator.restore(state.get("id_minute"), state.get("id_counter"))
+        print(
+            f"Restored {self._process_name}: runtime={self._runtime:.1f} broken={self._is_broken} "
+            f"maintenance={self._is_maintenance} handoff={self._pending_handoff}"
+        )
+
+class ProcessSimulator(SimulatorState):
     def __init__(
         self,
         mode: str,
@@ -36,9 +136,16 @@ class ProcessSimulator:
         redis_url: str = "redis://localhost:6379",
         agent_url: str = None,
         sim_speed: float = 5.0,
+        buffer_capacity: int = None,
+        overflow: str = "block",
+        topology=None,
+        policy: str = None,
+        maintenance_interval: float = 30.0,
+        resume: bool = True,
     ):
         self._process_name = process_name
         self._process_next = process_next
+        self._topology = topology
         
         self._influxdb_client = InfluxDBClient(
             url=influxdb_url,
@@ -54,12 +161,44 @@ class ProcessSimulator:
         
         self._agent_url = agent_url
 
+        # 상태 로그에 정책 태그를 남겨 정책별 가동률/MTBF/OEE 비교에 사용
+        self._policy = policy or ("agent" if agent_url else "reactive")
+        if self._policy not in MAINTENANCE_POLICIES:
+            raise ValueError("Invalid maintenance policy")
+        self._maintenance_interval = maintenance_interval
+        self._process_log_schema = process_write_schema()
+        self._status_log_schema = status_write_schema()
+
+        # 버퍼 용량 등록 (None이면 무제한) 및 적재 스크립트 준비
+        if buffer_capacity:
+            self._redis_client.hset(BUFFER_CAPACITY_KEY, self._process_name, buffer_capacity)
+        else:
+            self._redis_client.hdel(BUFFER_CAPACITY_KEY, self._process_name)
+        if overflow not in ("block", "reject"):
+            raise ValueError("Invalid overflow mode")
+        self._overflow = overflow
+        self._push_if_space = self._redis_client.register_script(PUSH_IF_SPACE)
+        self._recover_in_flight = self._redis_client.register_script(RECOVER_IN_FLIGHT)
+
+        # 토폴로지가 있으면 공정 ID/제품 태그/다음 라인을 정의에서 가져오고, 없으면 라인 이름 규칙(P1-A)을 따름
+        if self._topology is not None:
+            self._process_id = self._topology.process_of(process_name)
+            self._item_tag = self._topology.tag_of(process_name)
+            self._router = Router(self._topology, process_name, self._redis_client)
+        else:
+            self._process_id = process_name[:-2]
+            self._item_tag = process_name[-1]
+            self._router = None
+
         self._is_broken = False
         self._runtime = 0.0
         self._failure_prob = 0.0
         self._is_maintenance = False
+        self._is_blocked = False
+        self._pending_handoff = None
         
         self.sim_speed = sim_speed        
+        self._failure_model = FailureModel(sim_speed)
         self._mode = mode
         self._item_id_generator = ItemIDGenerator()
         
@@ -72,50 +211,63 @@ class ProcessSimulator:
         else:
             raise ValueError("Invalid mode")
         
+        self._restore(resume)
         threading.Thread(target=self._check_maintenance, daemon=True).start()
         
     @property
     def _step_time(self):
-        return max(np.random.normal(10, 2), 5) / self.sim_speed
+        return self._failure_model.step_time()
     @property
     def _maintain_time(self):
-        return max(np.random.normal(100, 5), 10) / self.sim_speed
+        return self._failure_model.maintain_time()
     @property
     def _repair_time(self):
-        return max(np.random.normal(60, 10), 45) / self.sim_speed
+        return self._failure_model.repair_time()
+    @property
+    def _blocked_poll_time(self):
+        return 1.0 / self.sim_speed
+
+    def _publish_event(self, kind, event, product_id=""):
+        # 이상 감지기(anomaly_detector.py)가 읽는 라인 이벤트. 실패해도 시뮬레이션은 계속
+        try:
+            publish_event(self._redis_client, event_fields(self._process_name, kind, event, self._runtime, product_id))
+        except redis.exceptions.RedisError as e:
+            print(f"Redis line event error: {e}")
 
     def _logging_status(self, event_type, event_status, available):
-        point = (
-            Point("status_log")
-            .tag("process", self._process_name)
-            .field("event_type", event_type)
-            .field("event_status", event_status)
-            .field("available", int(available))
-            .time(datetime.now(timezone.utc))
+        self._publish_event("status", f"{event_type}:{event_status}")
+        # trace_id와 포인트 시각(이벤트 시각)으로 대시보드/에이전트까지의 구간별 지연을 추적
+        event_time = datetime.now(timezone.utc)
+        # 스키마 전환 중에는 라인별 버킷과 통합 status 버킷에 함께 기록 (status_log.py)
+        writes = build_writes(
+            self._process_name, self._policy, event_type, event_status, available,
+            uuid.uuid4().hex[:16], event_time, self._status_log_schema
         )
         try:
-            self._write_api.write(bucket=f'{self._process_name}_status', record=point)
+            with influx_write_timer("status"):
+                for bucket, point in writes:
+                    self._write_api.write(bucket=bucket, record=point)
+            observe_hop("status", "influx_write", time.time() - event_time.timestamp())
             print(f"Logging status: {event_type} {event_status} {available}")
         except Exception as e:
             print(f"InfluxDB status_log error: {e}")
 
     def _logging_process(self, product_id, process_id, line_id, status):
-        point = (
-            Point("process_log")
-            .tag("product_id", product_id)
-            .tag("process_id", process_id)
-            .tag("line_id", line_id)
-            .field("status", status)
-            .time(datetime.now(timezone.utc))
+        if line_id == self._process_name:
+            self._publish_event("process", status, product_id)
+        # 스키마 전환 중에는 v1/v2 포인트를 한 번에 기록 (process_log.py)
+        points = build_points(
+            product_id, process_id, line_id, status, datetime.now(timezone.utc), self._process_log_schema
         )
         try:
-            self._write_api.write(bucket="process", record=point)
+            with influx_write_timer("process"):
+                self._write_api.write(bucket=PROCESS_BUCKET, record=points)
             print(f"Logging process: process {product_id} {process_id} {line_id} {status}")
         except Exception as e:
             print(f"InfluxDB process_log error: {e}")
 
     def _should_fail(self):
-        return random.random() < self._failure_prob
+        return self._failure_model.should_fail(self._runtime)
 
     def _repair(self):
         self._logging_status("repair", "start", False)
@@ -136,9 +288,32 @@ class ProcessSimulator:
         self._failure_prob = 0.0
         self._is_broken = False
         self._is_maintenance = False
+        self._checkpoint()
+
+    # ---------- 체크포인트 ----------
+    def _restore(self, resume):
+        """재시작 시 마모 상태/ID 카운터를 복원하고 처리 중이던 제품을 입력 큐로 되돌림"""
+        if resume:
+            self._apply_state(self._redis_client.hgetall(self._state_key()))
+        else:
+            self._redis_client.delete(self._state_key())
+        keys = [self._processing_key(), self._process_name, f"{QUEUE_STATS_PREFIX}{self._process_name}"]
+        recovered = self._recover_in_flight(keys=keys, args=[self._pending_handoff or ""])
+        if recovered:
+            print(f"Recovered {recovered} in-flight item(s) to {self._process_name}")
+
+    def _checkpoint(self, handoff=""):
+        self._redis_client.hset(self._state_key(), mapping=self._state_fields(handoff))
+
+    def _drop_in_flight(self, item):
+        """고장(interrupt)/폐기(reject)된 제품은 처리 중 목록에서 빼고 상태를 함께 기록"""
+        pipe = self._redis_client.pipeline()
+        pipe.lrem(self._processing_key(), 1, item)
+        pipe.hset(self._state_key(), mapping=self._state_fields())
+        pipe.execute()
 
     def _update_failure_rate(self):
-        self._failure_prob = 1 - np.exp(-self._runtime / 600)
+        self._failure_prob = self._failure_model.failure_prob(self._runtime)
 
     def _check_maintenance(self):
         pubsub = self._redis_client.pubsub()
@@ -146,37 +321,130 @@ class ProcessSimulator:
         for message in pubsub.listen():
             if message['type'] == 'message':
                 print(f"Received maintenance command: {message['data']}")
+                self._observe_maintenance_trace(message['data'])
                 self._is_maintenance = True
 
+    @staticmethod
+    def _observe_maintenance_trace(data):
+        """PMAgent가 보낸 추적 정보(JSON)가 있으면 publish → 수신 구간과 종단 지연 기록"""
+        try:
+            trace = json.loads(data).get("trace") or {}
+        except (ValueError, AttributeError):
+            # 이전 형식("maintenance_request") 메시지
+            return
+        received_at = time.time()
+        if trace.get("published_at") is not None:
+            observe_hop("agent", "publish_to_receipt", received_at - trace["published_at"])
+        if trace.get("t_event") is not None:
+            observe_e2e("agent", received_at - trace["t_event"])
+
+    def _push_item(self, queue, item):
+        keys = [queue, f"{QUEUE_STATS_PREFIX}{queue}", BUFFER_CAPACITY_KEY, self._processing_key(), self._state_key()]
+        return bool(self._push_if_space(keys=keys, args=[item] + self._state_args()))
+
+    def _next_line(self):
+        if self._router is not None:
+            return self._router.choose()
+        return self._process_next
+
+    def _process_of(self, line):
+        if self._topology is not None:
+            return self._topology.process_of(line)
+        return line[:-2]
+
+    def _log_arrival(self, item, line):
+        # 토폴로지 모드에서 sink 도착은 consumer가 직접 기록
+        if self._topology is not None and self._topology.is_sink(line):
+            return
+        self._logging_process(item, self._process_of(line), line, "arrival")
+
+    def _hand_off(self, item):
+        """
+        다음 라인 버퍼에 제품을 넘기고 도착 이벤트를 기록. 버퍼가 가득 차면
+        block 모드는 자리가 날 때까지 blocked 상태(비가동)로 대기하고, reject 모드는 제품을 폐기.
+        """
+        next_line = self._next_line()
+        if self._push_item(next_line, item):
+            self._log_arrival(item, next_line)
+            return True
+        if self._overflow == "reject":
+            self._logging_process(item, self._process_of(next_line), next_line, "reject")
+            self._drop_in_flight(item)
+            return False
+
+        self._is_blocked = True
+        self._checkpoint(handoff=item)
+        self._logging_status("blocked", "start", False)
+        while True:
+            time.sleep(self._blocked_poll_time)
+            # 라우팅 규칙에 따라 매번 다시 선택 (shortest_queue면 비어 있는 라인으로 우회)
+            next_line = self._next_line()
+            if self._push_item(next_line, item):
+                break
+        self._is_blocked = False
+        self._logging_status("blocked", "finish", True)
+        self._logging_status("processing", "", True)
+        self._log_arrival(item, next_line)
+        return True
+
+    def _feed_source(self, item):
+        """
+        소스 라인이 만든 제품을 자기 입력 큐에 넣고 투입(input)을 기록. 큐가 가득 차면 _hand_off와 같이
+        block 모드는 자리가 날 때까지 blocked 상태(비가동)로 대기하고, reject 모드는 투입 대신 폐기(reject)로 기록.
+        아직 처리 중 목록에 없는 제품이라 대기 중 재시작되면 투입 전 제품으로 보고 버림 (체크포인트 없음).
+        """
+        if not self._push_item(self._process_name, item):
+            if self._overflow == "reject":
+                self._logging_process(item, SOURCE_PROCESS, "", "reject")
+                return False
+            self._is_blocked = True
+            self._logging_status("blocked", "start", False)
+            while True:
+                time.sleep(self._blocked_poll_time)
+                if self._push_item(self._process_name, item):
+                    break
+            self._is_blocked = False
+            self._logging_status("blocked", "finish", True)
+            self._logging_status("processing", "", True)
+        self._logging_process(item, SOURCE_PROCESS, "", "input")
+        return True
+
     def _receive_item(self, process_name):
-        item = self._redis_client.blpop(process_name)
+        # 꺼낸 제품은 넘기거나 폐기할 때까지 처리 중 목록에 남겨 재시작 시 복구
+        item = self._redis_client.blmove(process_name, self._processing_key(), 0, "LEFT", "RIGHT")
         if item is None:
             return None
-        return item[1]
+        self._redis_client.hincrby(f"{QUEUE_STATS_PREFIX}{process_name}", "popped", 1)
+        return item
 
     def _process_step(self, item):
-        self._logging_process(item, self._process_name[:-2], self._process_name, "start")
-        time.sleep(self._step_time)
-        self._runtime += self._step_time
+        self._logging_process(item, self._process_id, self._process_name, "start")
+        step_time = self._step_time
+        time.sleep(step_time)
+        self._runtime += step_time
         self._update_failure_rate()
+        if self._policy == "rule_based" and self._runtime >= self._maintenance_interval:
+            self._is_maintenance = True
         if self._should_fail():
             self._is_broken = True
             self._logging_status("failure", "", False)
-            self._logging_process(item, self._process_name[:-2], self._process_name, "interrupt")
-            time.sleep(5)
+            self._logging_process(item, self._process_id, self._process_name, "interrupt")
+            ITEMS_PROCESSED.labels(line=self._process_name, status="interrupt").inc()
+            self._drop_in_flight(item)
+            time.sleep(FAILURE_DETECT_DELAY)
             self._repair()
             return False
-        self._logging_process(item, self._process_name[:-2], self._process_name, "finish")
+        self._logging_process(item, self._process_id, self._process_name, "finish")
+        ITEMS_PROCESSED.labels(line=self._process_name, status="finish").inc()
         return True
 
     def _run_producer(self):
         item_id = 0
         while True:
             try:
-                item = self._item_id_generator.generate() + self._process_name[-1]
-                self._redis_client.rpush(self._process_name, item)
-                self._logging_process(item, "P0", "", "input")
-                print(f"Produced: {item}")
+                item = self._item_id_generator.generate() + self._item_tag
+                if self._feed_source(item):
+                    print(f"Produced: {item}")
                 item_id += 1
                 time.sleep(self._step_time)
                 
@@ -185,13 +453,12 @@ class ProcessSimulator:
                     continue
                 
                 item = self._receive_item(self._process_name)
-                self._logging_process(item, self._process_name[:-2], self._process_name, "arrival")
+                self._logging_process(item, self._process_id, self._process_name, "arrival")
                 
                 if not self._process_step(item):
                     continue
                 
-                self._redis_client.rpush(self._process_next, item)
-                self._logging_process(item, self._process_next[:-2], self._process_next, "arrival")
+                self._hand_off(item)
                 
                 if self._is_maintenance:
                     self._maintenance()
@@ -212,8 +479,7 @@ class ProcessSimulator:
                     continue
                 if not self._process_step(item):
                     continue
-                self._redis_client.rpush(self._process_next, item)
-                self._logging_process(item, self._process_next[:-2], self._process_next, "arrival")
+                self._hand_off(item)
                 
                 if self._is_maintenance:
                     self._maintenance()
@@ -228,10 +494,22 @@ class ProcessSimulator:
                 item = self._receive_item(self._process_name)
                 if item is None:
                     continue
-                self._logging_process(item, self._process_name, "", "arrival")
+                # sink 도착은 산출량(process_id=sink 공정)으로 집계됨
+                process_id = self._process_id if self._topology is not None else self._process_name
+                self._logging_process(item, process_id, "", "arrival")
+                self._redis_client.lrem(self._processing_key(), 1, item)
             except Exception as e:
                 print(e)
 
+    def _resume(self):
+        """수리 도중 재시작됐으면 수리를 마저 하고, 넘기던 제품이 있으면 공정 없이 바로 넘김"""
+        if self._is_broken:
+            self._repair()
+        if self._pending_handoff:
+            item, self._pending_handoff = self._pending_handoff, None
+            self._hand_off(item)
+
     def run(self):
         print(f"Running {self._process_name} in {self._mode} mode")
+        self._resume()
         self._run_loop()
@@ -2,17 +2,163 @@ import redis
 import time
 import os
 import argparse
+from collections import deque
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from influxdb_client import InfluxDBClient, Point, WriteOptions
+from metrics import QUEUE_DEPTH, QUEUE_ARRIVAL_RATE, QUEUE_DEPARTURE_RATE, QUEUE_GROWTH_ALERT, start_metrics_server
+from ProcessSimulator import QUEUE_STATS_PREFIX
+from topology import Topology
 
 def parse_args():
     parser = argparse.ArgumentParser()
+    parser.add_argument("--pattern", type=str, default="P*", help="Redis key pattern for line queues (SCAN)")
+    parser.add_argument("--topology", type=str, default=None, help="Topology file; monitor its line queues instead of SCAN")
+    parser.add_argument("--interval", type=float, default=0.5, help="Sampling interval in seconds")
+    parser.add_argument("--rate_window", type=float, default=30.0, help="Window in seconds for rate calculation")
+    parser.add_argument("--discover_every", type=float, default=10.0, help="Queue re-discovery interval in seconds")
+    parser.add_argument("--bucket", type=str, default="queue", help="InfluxDB bucket for queue_status")
+    parser.add_argument("--growth_threshold", type=float, default=0.2, help="Alert when depth grows faster than this (items/s)")
+    parser.add_argument("--min_alert_depth", type=int, default=10, help="Alert only when depth is at least this")
+    parser.add_argument("--metrics_port", type=int, default=9102, help="Prometheus metrics port (0 = disabled)")
     return parser.parse_args()
 
+
+class QueueMonitor:
+    def __init__(
+        self,
+        redis_client,
+        write_api=None,
+        bucket: str = "queue",
+        pattern: str = "P*",
+        rate_window: float = 30.0,
+        discover_every: float = 10.0,
+        growth_threshold: float = 0.2,
+        min_alert_depth: int = 10,
+        queues: list = None,
+    ):
+        self._redis_client = redis_client
+        self._write_api = write_api
+        self._bucket = bucket
+        self._pattern = pattern
+        self._rate_window = rate_window
+        self._discover_every = discover_every
+        self._growth_threshold = growth_threshold
+        self._min_alert_depth = min_alert_depth
+
+        # 큐 목록이 고정(토폴로지)되면 SCAN 탐색을 하지 않음
+        self._fixed_queues = list(queues) if queues else None
+        self._queues = []
+        self._last_discovery = 0.0
+        self._history = {}
+        self._alerting = set()
+
+    def _discover(self):
+        if self._fixed_queues is not None:
+            self._queues = self._fixed_queues
+            self._last_discovery = time.monotonic()
+            return
+        # 비어 있는 리스트는 Redis에서 키가 사라지므로 통계 해시에서도 큐 이름을 수집
+        queues = set(self._redis_client.scan_iter(match=self._pattern, _type="LIST"))
+        for key in self._redis_client.scan_iter(match=f"{QUEUE_STATS_PREFIX}{self._pattern}"):
+            queues.add(key[len(QUEUE_STATS_PREFIX):])
+        self._queues = sorted(queues)
+        self._last_discovery = time.monotonic()
+
+    def _sample(self):
+        pipe = self._redis_client.pipeline(transaction=False)
+        for queue in self._queues:
+            pipe.llen(queue)
+            pipe.hmget(f"{QUEUE_STATS_PREFIX}{queue}", "pushed", "popped")
+        results = pipe.execute()
+
+        now = time.monotonic()
+        samples = {}
+        for i, queue in enumerate(self._queues):
+            depth = results[2 * i]
+            pushed, popped = (int(v or 0) for v in results[2 * i + 1])
+            samples[queue] = (now, depth, pushed, popped)
+        return samples
+
+    def _rates(self, queue, sample):
+        history = self._history.setdefault(queue, deque())
+        history.append(sample)
+        while len(history) > 2 and sample[0] - history[0][0] > self._rate_window:
+            history.popleft()
+
+        first = history[0]
+        elapsed = sample[0] - first[0]
+        if elapsed <= 0:
+            return 0.0, 0.0, 0.0
+        arrival_rate = (sample[2] - first[2]) / elapsed
+        departure_rate = (sample[3] - first[3]) / elapsed
+        growth_rate = (sample[1] - first[1]) / elapsed
+        return arrival_rate, departure_rate, growth_rate
+
+    def _check_growth(self, queue, depth, growth_rate):
+        growing = growth_rate > self._growth_threshold and depth >= self._min_alert_depth
+        if growing and queue not in self._alerting:
+            self._alerting.add(queue)
+            print(f"[ALERT] {queue} queue growing: depth={depth}, +{growth_rate:.2f} items/s")
+        elif not growing and queue in self._alerting:
+            self._alerting.discard(queue)
+            print(f"[RESOLVED] {queue} queue growth back to normal: depth={depth}")
+        QUEUE_GROWTH_ALERT.labels(queue=queue).set(int(growing))
+        return growing
+
+    def tick(self):
+        if not self._queues or time.monotonic() - self._last_discovery > self._discover_every:
+            self._discover()
+        if not self._queues:
+            return
+
+        timestamp = datetime.now(timezone.utc)
+        points = []
+        for queue, sample in self._sample().items():
+            depth = sample[1]
+            arrival_rate, departure_rate, growth_rate = self._rates(queue, sample)
+            alert = self._check_growth(queue, depth, growth_rate)
+
+            QUEUE_DEPTH.labels(queue=queue).set(depth)
+            QUEUE_ARRIVAL_RATE.labels(queue=queue).set(arrival_rate)
+            QUEUE_DEPARTURE_RATE.labels(queue=queue).set(departure_rate)
+
+            points.append(
+                Point("queue_status")
+                .tag("queue", queue)
+                .field("length", depth)
+                .field("arrival_rate", round(arrival_rate, 4))
+                .field("departure_rate", round(departure_rate, 4))
+                .field("growth_rate", round(growth_rate, 4))
+                .field("alert", int(alert))
+                .time(timestamp)
+            )
+
+        if self._write_api is not None:
+            try:
+                # 배치 write_api가 모아서 전송하므로 여기서는 버퍼에 넣기만 함
+                self._write_api.write(bucket=self._bucket, record=points)
+            except Exception as e:
+                print(f"InfluxDB queue_status error: {e}")
+
+    def run(self, interval: float = 0.5):
+        target = ", ".join(self._fixed_queues) if self._fixed_queues else f"matching '{self._pattern}'"
+        print(f"Monitoring queues {target} every {interval}s")
+        while True:
+            started = time.monotonic()
+            try:
+                self.tick()
+            except redis.exceptions.RedisError as e:
+                print(f"Redis error: {e}")
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
 if __name__ == "__main__":
     args = parse_args()
-    
+
     load_dotenv()
     redis_url = os.getenv("REDIS_URL")
+    start_metrics_server(args.metrics_port)
 
     # Redis 설정
     r = redis.from_url(
@@ -20,10 +166,25 @@ if __name__ == "__main__":
         decode_responses=True
     )
 
-    while True:
-        for queue_name in ['P1-A','P2-A','P1-B','P2-B','P3']:
-            queue_length = r.llen(queue_name)
-            #point = Point("queue_status").tag("queue", queue_name).field("length", queue_length)
-            #write_api.write(bucket=bucket, org=org, record=point)
-            print(f"{queue_name} Queue length: {queue_length}")
-        time.sleep(5)
\ No newline at end of file
+    influxdb_client = InfluxDBClient(
+        url=os.getenv("INFLUXDB_URL"),
+        token=os.getenv("INFLUXDB_TOKEN"),
+        org=os.getenv("INFLUXDB_ORG")
+    )
+    write_api = influxdb_client.write_api(write_options=WriteOptions(batch_size=500, flush_interval=5_000))
+
+    monitor = QueueMonitor(
+        r,
+        write_api=write_api,
+        bucket=args.bucket,
+        pattern=args.pattern,
+        rate_window=args.rate_window,
+        discover_every=args.discover_every,
+        growth_threshold=args.growth_threshold,
+        min_alert_depth=args.min_alert_depth,
+        queues=Topology.load(args.topology).queues if args.topology else None,
+    )
+    try:
+        monitor.run(args.interval)
+    finally:
+        write_api.close()
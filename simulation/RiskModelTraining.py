@@ -0,0 +1,168 @@
+import json
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+from failure_model import FailureModel, FAILURE_DETECT_DELAY
+from feature_store import LineFeatures, MODEL_INPUTS, RISK_MODEL_PATH, model_inputs
+
+# ===============================
+# 고장 위험 모델 오프라인 학습
+# ===============================
+# ProcessSimulator와 같은 고장/수리/정비 모델로 라인 이력을 시뮬레이션하면서, 실시간과 같은 형식의 라인 이벤트를
+# LineFeatures에 넣어 스텝이 끝날 때마다 피처를 뽑음 (실시간 FeatureUpdater와 같은 코드로 계산).
+# 라벨: 그 시점부터 horizon초 안에 고장이 나는지. 시드 절반은 사후 정비, 절반은 주기 정비로 돌려 정비 이력도 포함.
+# 뒤쪽 holdout 비율의 시드로 log loss / AUC를 확인하고 로지스틱 회귀(L2, Newton)를 JSON으로 저장.
+# 큐 길이는 오프라인 시뮬레이션에 없어서 0으로 학습됨 (가중치 0).
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sim_speed", type=float, default=5.0, help="Simulation speed of the modelled ProcessSimulator")
+    parser.add_argument("--lines", type=int, default=20, help="Simulated line histories (one seed each)")
+    parser.add_argument("--hours", type=float, default=8.0, help="Wall-clock hours per history")
+    parser.add_argument("--horizon", type=float, default=20.0, help="Label: failure within this many seconds")
+    parser.add_argument("--maintenance_interval", type=float, default=30.0, help="Runtime between maintenances for rule_based seeds")
+    parser.add_argument("--l2", type=float, default=1.0, help="L2 regularisation strength")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of seeds kept for evaluation")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed")
+    parser.add_argument("--output", type=str, default=RISK_MODEL_PATH)
+    return parser.parse_args()
+
+
+def simulate_history(seed, config):
+    """라인 하나의 이력. (스텝 종료 시각별 피처 행렬, 그 시각 배열, 고장 시각 배열)"""
+    model = FailureModel(config["sim_speed"])
+    rng = np.random.default_rng(seed)
+    interval = config["maintenance_interval"] if seed % 2 else None
+    features = LineFeatures()
+    horizon = config["hours"] * 3600
+    t, runtime = 0.0, 0.0
+    rows, times, failures = [], [], []
+
+    def emit(kind, event):
+        features.observe({"kind": kind, "event": event, "runtime": runtime, "ts": t})
+
+    emit("status", "processing:")
+    while t < horizon:
+        if interval is not None and runtime >= interval:
+            emit("status", "maintenance:start")
+            t += model.maintain_time(rng)
+            runtime = 0.0
+            emit("status", "maintenance:finish")
+            emit("status", "processing:")
+            continue
+
+        emit("process", "start")
+        dt = model.step_time(rng)
+        t += dt
+        runtime += dt
+        if model.should_fail(runtime, rng):
+            failures.append(t)
+            emit("status", "failure:")
+            emit("process", "interrupt")
+            emit("status", "repair:start")
+            t += FAILURE_DETECT_DELAY + model.repair_time(rng)
+            runtime = 0.0
+            emit("status", "repair:finish")
+            emit("status", "processing:")
+            continue
+        emit("process", "finish")
+        rows.append(model_inputs(features.snapshot(t)))
+        times.append(t)
+    return np.asarray(rows, dtype=float), np.asarray(times), np.asarray(failures)
+
+
+def label(times, failures, horizon):
+    """각 시각 이후 horizon초 안에 고장이 있으면 1"""
+    next_failure = np.searchsorted(failures, times, side="right")
+    has_next = next_failure < len(failures)
+    upcoming = np.where(has_next, failures[np.minimum(next_failure, len(failures) - 1)], np.inf)
+    return (upcoming - times <= horizon).astype(float)
+
+
+def dataset(seeds, config):
+    xs, ys = [], []
+    for seed in seeds:
+        rows, times, failures = simulate_history(seed, config)
+        xs.append(rows)
+        ys.append(label(times, failures, config["horizon"]))
+    return np.vstack(xs), np.concatenate(ys)
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -50, 50)))
+
+
+def fit_logistic(x, y, l2, iterations=50):
+    """표준화한 x에 Newton(IRLS). 절편은 규제하지 않음. 반환: (가중치, 절편)"""
+    xb = np.hstack([np.ones((len(x), 1)), x])
+    w = np.zeros(xb.shape[1])
+    penalty = np.full(xb.shape[1], l2)
+    penalty[0] = 0.0
+    for _ in range(iterations):
+        p = sigmoid(xb @ w)
+        grad = xb.T @ (p - y) + penalty * w
+        hessian = xb.T @ (xb * (p * (1 - p))[:, None]) + np.diag(penalty) + 1e-9 * np.eye(len(w))
+        step = np.linalg.solve(hessian, grad)
+        w -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return w[1:], w[0]
+
+
+def log_loss(y, p):
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+def auc(y, p):
+    """순위 기반 AUC (Mann-Whitney U)"""
+    ranks = np.empty(len(p))
+    ranks[np.argsort(p, kind="mergesort")] = np.arange(1, len(p) + 1)
+    positives = y == 1
+    n_pos, n_neg = positives.sum(), (~positives).sum()
+    if n_pos == 0 or n_neg == 0:
+        return None
+    return float((ranks[positives].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = {
+        "sim_speed": args.sim_speed,
+        "hours": args.hours,
+        "horizon": args.horizon,
+        "maintenance_interval": args.maintenance_interval,
+    }
+    seeds = [args.seed + i for i in range(args.lines)]
+    n_holdout = max(1, int(len(seeds) * args.holdout))
+    x_train, y_train = dataset(seeds[:-n_holdout], config)
+    x_test, y_test = dataset(seeds[-n_holdout:], config)
+    print(f"train {len(y_train)} samples (positive {y_train.mean():.1%}), holdout {len(y_test)}")
+
+    mean = x_train.mean(axis=0)
+    std = x_train.std(axis=0)
+    # 변하지 않는 피처(오프라인의 queue_depth 등)는 1로 나눠 가중치가 0이 되도록
+    std = np.where(std > 0, std, 1.0)
+    weights, bias = fit_logistic((x_train - mean) / std, y_train, args.l2)
+
+    p_test = sigmoid(((x_test - mean) / std) @ weights + bias)
+    base = np.full(len(y_test), y_train.mean())
+    print(f"holdout log loss {log_loss(y_test, p_test):.4f} (base rate {log_loss(y_test, base):.4f}), AUC {auc(y_test, p_test)}")
+    for name, weight in zip(MODEL_INPUTS, weights):
+        print(f"{name:>16}: {weight:+.4f}")
+
+    params = {
+        "features": list(MODEL_INPUTS),
+        "mean": mean.tolist(),
+        "std": std.tolist(),
+        "weights": weights.tolist(),
+        "bias": float(bias),
+        "horizon": args.horizon,
+        "sim_speed": args.sim_speed,
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "samples": int(len(y_train)),
+        "holdout_auc": auc(y_test, p_test),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    print(f"Saved {args.output}")
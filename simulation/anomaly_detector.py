@@ -0,0 +1,184 @@
+import os
+import math
+import time
+from metrics import ANOMALY_TRIGGERS
+
+# ===============================
+# 라인별 스트리밍 이상 감지 (EWMA / CUSUM)
+# ===============================
+# event_stream.py의 라인 이벤트를 하나씩 받아 세 가지 신호를 갱신하고, 임계값을 넘으면 즉시 에이전트 점검을 요청.
+#  - step_duration: 공정 start → finish/interrupt 소요 시간. EWMA 기준선으로 표준화한 값의 상승 CUSUM이 h를 넘으면
+#  - interrupt_rate: 스텝 결과(finish=0, interrupt=1)의 EWMA가 INTERRUPT_RATE_LIMIT를 넘으면 (절반 아래로 내려가야 재무장)
+#  - time_since_reset: 리셋 이후 누적 가동시간이 관측된 고장 시점 가동시간 EWMA의 TSR_RATIO배를 넘으면 (리셋 주기당 한 번)
+# 기준선이 MIN_SAMPLES개 쌓이기 전에는 신호를 내지 않음. 고장/수리/정비 중에 넘은 신호는 모아 두었다가
+# 라인이 다시 가동(processing)될 때 요청 (멈춘 라인을 점검해도 정비 요청을 받을 수 없음).
+# 같은 라인은 마지막 점검(정기 점검 포함) 이후 AGENT_TRIGGER_COOLDOWN초 안에 다시 요청하지 않음.
+AGENT_TRIGGER_COOLDOWN = float(os.getenv("AGENT_TRIGGER_COOLDOWN", "120"))
+MIN_SAMPLES = 20
+BASELINE_ALPHA = 0.02
+CUSUM_K, CUSUM_H = 0.5, 5.0
+INTERRUPT_ALPHA = 0.1
+INTERRUPT_RATE_LIMIT = float(os.getenv("INTERRUPT_RATE_LIMIT", "0.2"))
+TTF_ALPHA = 0.2
+TSR_RATIO = float(os.getenv("TSR_RATIO", "0.8"))
+
+# 이 이벤트 이후 다음 processing 이벤트까지는 라인이 멈춘 상태
+DOWN_EVENTS = ("failure:", "repair:start", "maintenance:start")
+RESET_EVENTS = ("repair:finish", "maintenance:finish")
+
+
+class Ewma:
+    """지수가중 이동 평균/분산"""
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.mean = None
+        self.var = 0.0
+        self.n = 0
+
+    def update(self, x):
+        if self.mean is None:
+            self.mean = x
+        else:
+            diff = x - self.mean
+            incr = self.alpha * diff
+            self.mean += incr
+            self.var = (1 - self.alpha) * (self.var + diff * incr)
+        self.n += 1
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+
+class Cusum:
+    """표준화된 값의 상승 방향 누적합"""
+    def __init__(self, k=CUSUM_K, h=CUSUM_H):
+        self.k = k
+        self.h = h
+        self.s = 0.0
+
+    def update(self, z):
+        self.s = max(0.0, self.s + z - self.k)
+        return self.s > self.h
+
+    def reset(self):
+        self.s = 0.0
+
+
+class LineDetector:
+    def __init__(self, line):
+        self.line = line
+        self._started = {}
+        self._step = Ewma(BASELINE_ALPHA)
+        self._step_cusum = Cusum()
+        self._interrupts = Ewma(INTERRUPT_ALPHA)
+        self._interrupt_alarm = False
+        self._ttf = Ewma(TTF_ALPHA)
+        self._tsr_alarm = False
+        self._runtime = 0.0
+        self._is_down = False
+        self._deferred = []
+
+    def observe(self, event):
+        """이벤트 하나를 반영하고 지금 요청할 신호 목록을 반환"""
+        self._runtime = event["runtime"]
+        if event["kind"] == "status":
+            signals = self._observe_status(event)
+        else:
+            signals = self._observe_process(event)
+        if self._is_down:
+            self._deferred += [signal for signal in signals if signal not in self._deferred]
+            return []
+        return signals
+
+    def _observe_status(self, event):
+        name = event["event"]
+        if name in DOWN_EVENTS:
+            self._is_down = True
+            self._started.clear()
+        elif name.startswith("processing:") and self._is_down:
+            self._is_down = False
+            signals, self._deferred = self._deferred, []
+            return signals
+        if name == "failure:":
+            self._ttf.update(event["runtime"])
+        elif name in RESET_EVENTS:
+            self._tsr_alarm = False
+        return []
+
+    def _observe_process(self, event):
+        status = event["event"]
+        if status == "start":
+            self._started[event["product_id"]] = event["ts"]
+            return []
+        if status not in ("finish", "interrupt"):
+            return []
+
+        signals = []
+        started = self._started.pop(event["product_id"], None)
+        if started is not None and self._step_duration(event["ts"] - started):
+            signals.append("step_duration")
+        if self._interrupt_rate(1.0 if status == "interrupt" else 0.0):
+            signals.append("interrupt_rate")
+        if self._time_since_reset():
+            signals.append("time_since_reset")
+        return signals
+
+    def _step_duration(self, duration):
+        baseline = self._step
+        alarm = False
+        if baseline.n >= MIN_SAMPLES:
+            z = (duration - baseline.mean) / max(baseline.std, 1e-6)
+            alarm = self._step_cusum.update(z)
+            if alarm:
+                self._step_cusum.reset()
+        baseline.update(duration)
+        return alarm
+
+    def _interrupt_rate(self, interrupted):
+        self._interrupts.update(interrupted)
+        if self._interrupts.n < MIN_SAMPLES:
+            return False
+        rate = self._interrupts.mean
+        if self._interrupt_alarm:
+            self._interrupt_alarm = rate >= INTERRUPT_RATE_LIMIT / 2
+            return False
+        self._interrupt_alarm = rate > INTERRUPT_RATE_LIMIT
+        return self._interrupt_alarm
+
+    def _time_since_reset(self):
+        if self._tsr_alarm or self._ttf.mean is None:
+            return False
+        self._tsr_alarm = self._runtime >= TSR_RATIO * self._ttf.mean
+        return self._tsr_alarm
+
+
+class AnomalyDetector:
+    """여러 라인의 이벤트를 받아 라인별로 디바운스된 점검 요청을 만듦"""
+    def __init__(self, lines, cooldown=AGENT_TRIGGER_COOLDOWN, clock=time.time):
+        self._lines = {line: LineDetector(line) for line in lines}
+        self._cooldown = cooldown
+        self._clock = clock
+        self._last_evaluated = {}
+
+    def observe(self, event):
+        """점검을 요청해야 하면 (라인, 신호 목록), 아니면 None"""
+        detector = self._lines.get(event["line"])
+        if detector is None:
+            return None
+        signals = detector.observe(event)
+        if not signals:
+            return None
+        line = detector.line
+        if self._clock() - self._last_evaluated.get(line, float("-inf")) < self._cooldown:
+            for signal in signals:
+                ANOMALY_TRIGGERS.labels(line=line, signal=signal, result="debounced").inc()
+            return None
+        for signal in signals:
+            ANOMALY_TRIGGERS.labels(line=line, signal=signal, result="fired").inc()
+        self.mark_evaluated(line)
+        return line, signals
+
+    def mark_evaluated(self, line):
+        """정기 점검을 포함해 라인을 점검할 때마다 호출해 쿨다운을 다시 시작"""
+        self._last_evaluated[line] = self._clock()
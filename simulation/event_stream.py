@@ -0,0 +1,52 @@
+import os
+import time
+
+# ===============================
+# 라인 이벤트 스트림 (Redis Stream)
+# ===============================
+# 시뮬레이터가 Influx에 상태/공정 로그를 쓸 때 같은 이벤트를 Redis Stream에도 추가해,
+# 이상 감지기(anomaly_detector.py)가 Influx 조회 없이 발생 즉시 읽어 가도록 함.
+# 필드: line, kind(status|process), event(이벤트 이름), runtime(마지막 리셋 이후 누적 가동시간), ts(epoch 초)
+#   status  이벤트 이름은 "{event_type}:{event_status}" (예: repair:finish, failure:)
+#   process 이벤트 이름은 공정 상태 (start/finish/interrupt), product_id 포함
+# 스트림 길이는 EVENT_STREAM_MAXLEN 근처로 잘라 메모리를 제한 (감지기는 최신 이벤트만 필요).
+LINE_EVENTS_STREAM = os.getenv("LINE_EVENTS_STREAM", "facman:line_events")
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))
+
+
+def event_fields(line, kind, event, runtime, product_id=""):
+    return {
+        "line": line,
+        "kind": kind,
+        "event": event,
+        "runtime": f"{runtime:.3f}",
+        "product_id": product_id,
+        "ts": f"{time.time():.3f}",
+    }
+
+
+def publish_event(redis_client, fields):
+    """동기/async 클라이언트 모두 사용 (async 클라이언트면 awaitable 반환)"""
+    return redis_client.xadd(LINE_EVENTS_STREAM, fields, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+
+
+def parse_event(fields):
+    return {
+        "line": fields["line"],
+        "kind": fields["kind"],
+        "event": fields["event"],
+        "runtime": float(fields.get("runtime") or 0.0),
+        "product_id": fields.get("product_id", ""),
+        "ts": float(fields["ts"]),
+    }
+
+
+def read_events(redis_client, last_id="$", block_ms=1000, count=500):
+    """last_id 이후 이벤트를 최대 block_ms 기다려 읽음. ([(id, 이벤트)], 마지막 id) 반환"""
+    response = redis_client.xread({LINE_EVENTS_STREAM: last_id}, count=count, block=block_ms)
+    events = []
+    for _, entries in response or []:
+        for entry_id, fields in entries:
+            events.append((entry_id, parse_event(fields)))
+            last_id = entry_id
+    return events, last_id
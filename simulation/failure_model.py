@@ -0,0 +1,38 @@
+import numpy as np
+
+# ===============================
+# 설비 고장/수리/정비 모델
+# ===============================
+# ProcessSimulator(실시간)와 PolicyEvaluation(오프라인 배치)이 같은 분포를 쓰도록 분리.
+# 모든 시간은 sim_speed로 나눈 실제 경과 시간(초) 기준이며, 고장 확률도 이 시간으로 누적된 가동시간을 사용.
+# 시간 표본 함수는 size를 주면 배열로 한 번에 뽑음 (inspection_optimizer.py의 벡터화 몬테카를로).
+
+STEP_MEAN, STEP_STD, STEP_MIN = 10, 2, 5
+MAINTAIN_MEAN, MAINTAIN_STD, MAINTAIN_MIN = 100, 5, 10
+REPAIR_MEAN, REPAIR_STD, REPAIR_MIN = 60, 10, 45
+# 누적 가동시간 runtime에서 한 스텝이 고장날 확률: 1 - exp(-runtime / FAILURE_SCALE)
+FAILURE_SCALE = 600
+# 고장 후 수리 시작까지 대기 (sim_speed와 무관한 고정 시간)
+FAILURE_DETECT_DELAY = 5
+
+
+class FailureModel:
+    def __init__(self, sim_speed: float = 5.0, rng=None):
+        self.sim_speed = sim_speed
+        self._rng = rng if rng is not None else np.random.default_rng()
+
+    def step_time(self, rng=None, size=None):
+        return np.maximum((rng or self._rng).normal(STEP_MEAN, STEP_STD, size), STEP_MIN) / self.sim_speed
+
+    def maintain_time(self, rng=None, size=None):
+        return np.maximum((rng or self._rng).normal(MAINTAIN_MEAN, MAINTAIN_STD, size), MAINTAIN_MIN) / self.sim_speed
+
+    def repair_time(self, rng=None, size=None):
+        return np.maximum((rng or self._rng).normal(REPAIR_MEAN, REPAIR_STD, size), REPAIR_MIN) / self.sim_speed
+
+    @staticmethod
+    def failure_prob(runtime):
+        return 1 - np.exp(-runtime / FAILURE_SCALE)
+
+    def should_fail(self, runtime, rng=None):
+        return (rng or self._rng).random() < self.failure_prob(runtime)
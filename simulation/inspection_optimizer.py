@@ -0,0 +1,118 @@
+import os
+import math
+import time
+from functools import lru_cache
+import numpy as np
+from failure_model import FailureModel, FAILURE_DETECT_DELAY, STEP_MEAN
+from metrics import OPTIMIZER_SECONDS
+
+# ===============================
+# 점검 시점 몬테카를로 최적화
+# ===============================
+# failure_model.py의 실제 고장/수리/정비 분포로, 현재 누적 가동시간(마지막 리셋 이후)에서 출발하는 궤적 수천 개를
+# NumPy 배열로 한 번에 시뮬레이션하고 "앞으로 wait초 더 가동한 뒤 정비" 후보들을 같은 난수(공통 난수)로 비교.
+#  - 한 주기: 지금부터 고장 또는 정비까지. 가동시간 U, 다운타임 D (고장: 감지 지연 + 수리, 정비: 정비 시간)
+#  - 리셋 직후(가동시간 0)에서 가용도 U/(U+D)가 최대인 주기 길이 → 장기 가용도 g와 정비 후 다음 점검까지의 간격
+#  - 현재 상태의 후보 점수 E[U] - g·E[U+D] (리셋 후에는 장기 가용도 g로 돌아가는 재생 과정 기준)가 최대인 wait
+# 정비는 PolicyEvaluation과 같이 스텝 사이(누적 가동시간이 처음 임계값 이상이 되는 시점)에 시작.
+# 결과는 (sim_speed, 가동시간 구간)별로 캐시. 구간 폭은 평균 스텝 시간이라 같은 상태의 라인은 같은 답을 공유.
+OPTIMIZER_TRAJECTORIES = int(os.getenv("OPTIMIZER_TRAJECTORIES", "4000"))
+OPTIMIZER_CANDIDATES = int(os.getenv("OPTIMIZER_CANDIDATES", "60"))
+OPTIMIZER_SEED = 0
+STEP_CHUNK = 32
+MAX_STEPS = 4096
+# 후보 wait의 최대값: 이 비율의 궤적이 고장나는 가동시간까지
+FAILURE_QUANTILE = 0.99
+
+
+def simulate_boundaries(model, runtime, n, rng):
+    """
+    runtime에서 출발한 궤적 n개의 스텝 경계 누적 가동시간 (n × (스텝 수 + 1), 0열은 runtime)과 고장 스텝 인덱스.
+    고장 스텝 f는 경계 f에서 시작해 경계 f+1에서 끝남. 모든 궤적이 고장날 때까지 STEP_CHUNK 스텝씩 늘림.
+    """
+    chunks = [np.full((n, 1), float(runtime))]
+    failed_at = np.full(n, -1)
+    steps = 0
+    while steps < MAX_STEPS:
+        durations = model.step_time(rng, size=(n, STEP_CHUNK))
+        boundaries = chunks[-1][:, -1:] + np.cumsum(durations, axis=1)
+        failed = rng.random((n, STEP_CHUNK)) < model.failure_prob(boundaries)
+        first = np.where(failed.any(axis=1), failed.argmax(axis=1) + steps, -1)
+        failed_at = np.where(failed_at < 0, first, failed_at)
+        chunks.append(boundaries)
+        steps += STEP_CHUNK
+        if (failed_at >= 0).all():
+            break
+    # MAX_STEPS까지 버틴 궤적은 마지막 스텝에서 고장난 것으로 봄 (실제로는 확률이 무시할 만큼 작음)
+    failed_at = np.where(failed_at < 0, steps - 1, failed_at)
+    return np.concatenate(chunks, axis=1), failed_at
+
+
+def expected_cycles(model, runtime, n, rng, candidates=OPTIMIZER_CANDIDATES):
+    """후보 wait 배열과 후보별 E[U], E[D]"""
+    boundaries, failed_at = simulate_boundaries(model, runtime, n, rng)
+    rows = np.arange(n)
+    fail_start = boundaries[rows, failed_at]
+    fail_end = boundaries[rows, failed_at + 1]
+
+    waits = np.linspace(0.0, float(np.quantile(fail_end - runtime, FAILURE_QUANTILE)), candidates)
+    thresholds = runtime + waits
+    # 후보별로 누적 가동시간이 처음 임계값 이상이 되는 경계 (고장 이후 경계는 쓰지 않으므로 잘라서 계산)
+    reach = (boundaries[:, :, None] < thresholds[None, None, :]).sum(axis=1)
+    reach = np.minimum(reach, failed_at[:, None] + 1)
+    maintain_at = boundaries[rows[:, None], reach]
+    fails_first = fail_start[:, None] < thresholds[None, :]
+
+    uptime = np.where(fails_first, fail_end[:, None], maintain_at) - runtime
+    repair = FAILURE_DETECT_DELAY + model.repair_time(rng, size=n)
+    maintain = model.maintain_time(rng, size=n)
+    downtime = np.where(fails_first, repair[:, None], maintain[:, None])
+    return waits, uptime.mean(axis=0), downtime.mean(axis=0)
+
+
+def runtime_bucket(runtime, sim_speed):
+    width = STEP_MEAN / sim_speed
+    return math.floor(max(runtime, 0.0) / width) * width
+
+
+@lru_cache(maxsize=16)
+def _fresh_cycle(sim_speed, trajectories, seed):
+    """리셋 직후 기준 (장기 가용도, 최적 주기 길이)"""
+    model = FailureModel(sim_speed)
+    waits, uptime, downtime = expected_cycles(model, 0.0, trajectories, np.random.default_rng(seed))
+    availability = uptime / (uptime + downtime)
+    best = int(np.argmax(availability[1:])) + 1
+    return float(availability[best]), float(waits[best])
+
+
+@lru_cache(maxsize=1024)
+def _recommend(sim_speed, bucket, trajectories, seed):
+    availability, interval = _fresh_cycle(sim_speed, trajectories, seed)
+    model = FailureModel(sim_speed)
+    waits, uptime, downtime = expected_cycles(model, bucket, trajectories, np.random.default_rng(seed))
+    best = int(np.argmax(uptime - availability * (uptime + downtime)))
+    return {
+        "runtime": bucket,
+        "maintain_now": best == 0,
+        "wait_seconds": float(waits[best]),
+        "cycle_availability": float(uptime[best] / (uptime[best] + downtime[best])),
+        "availability": availability,
+        "interval_after_reset": interval,
+    }
+
+
+def recommend(runtime, sim_speed, trajectories=OPTIMIZER_TRAJECTORIES, seed=OPTIMIZER_SEED):
+    """
+    누적 가동시간 runtime인 라인의 점검 권고.
+    maintain_now면 지금 정비하고 interval_after_reset초 뒤 다시 점검, 아니면 wait_seconds초 뒤 다시 판단.
+    """
+    started = time.perf_counter()
+    hits = _recommend.cache_info().hits
+    result = _recommend(sim_speed, runtime_bucket(runtime, sim_speed), trajectories, seed)
+    cache = "hit" if _recommend.cache_info().hits > hits else "miss"
+    OPTIMIZER_SECONDS.labels(cache=cache).observe(time.perf_counter() - started)
+    return dict(result)
+
+
+def next_check_seconds(result):
+    return result["interval_after_reset"] if result["maintain_now"] else result["wait_seconds"]
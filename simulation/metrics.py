@@ -0,0 +1,171 @@
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# ===============================
+# 시뮬레이터 / 에이전트 / 큐 모니터 공용 메트릭
+# ===============================
+ITEMS_PROCESSED = Counter(
+    "facman_items_processed_total",
+    "Items that finished or were interrupted on a line",
+    ["line", "status"],
+)
+
+INFLUX_WRITE_SECONDS = Histogram(
+    "facman_influx_write_seconds",
+    "InfluxDB write latency",
+    ["bucket"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+INFLUX_WRITE_ERRORS = Counter(
+    "facman_influx_write_errors_total",
+    "InfluxDB write failures",
+    ["bucket"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "facman_queue_depth",
+    "Redis list length per line queue",
+    ["queue"],
+)
+QUEUE_ARRIVAL_RATE = Gauge(
+    "facman_queue_arrival_rate",
+    "Items pushed per second (rolling window)",
+    ["queue"],
+)
+QUEUE_DEPARTURE_RATE = Gauge(
+    "facman_queue_departure_rate",
+    "Items popped per second (rolling window)",
+    ["queue"],
+)
+QUEUE_GROWTH_ALERT = Gauge(
+    "facman_queue_growth_alert",
+    "1 while the queue depth keeps growing above the alert threshold",
+    ["queue"],
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "facman_llm_call_seconds",
+    "LLM call latency",
+    ["component"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+LLM_TOKENS = Counter(
+    "facman_llm_tokens_total",
+    "LLM tokens consumed",
+    ["component", "kind"],
+)
+
+ANOMALY_TRIGGERS = Counter(
+    "facman_anomaly_triggers_total",
+    "Streaming detector threshold crossings (fired = agent evaluation requested)",
+    ["line", "signal", "result"],
+)
+AGENT_EVALUATIONS = Counter(
+    "facman_agent_evaluations_total",
+    "PMAgent evaluations by what started them",
+    ["line", "reason"],
+)
+OPTIMIZER_SECONDS = Histogram(
+    "facman_optimizer_seconds",
+    "Inspection optimizer latency (miss = Monte Carlo run)",
+    ["cache"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+LINE_FAILURE_RISK = Gauge(
+    "facman_line_failure_risk",
+    "Risk model probability of a failure within its horizon",
+    ["line"],
+)
+
+# ===============================
+# 지연 추적 (상태 이벤트 → 대시보드 렌더 / 에이전트 점검 수신)
+# ===============================
+# 시뮬레이터가 상태 로그를 쓸 때 trace_id와 이벤트 시각을 남기고, 각 구간을 지날 때마다
+# 이벤트 시각 기준 경과 시간을 기록. 서버 간 시계는 NTP로 맞춰져 있다고 가정 (음수는 0으로 기록).
+# path: dashboard(상태 로그 → 폴링 → emit → 브라우저 ack), agent(상태 로그 → InfluxNode → publish → 수신)
+TRACE_SLO_SECONDS = float(os.getenv("TRACE_SLO_SECONDS", "5"))
+TRACE_SLO_TARGET = float(os.getenv("TRACE_SLO_TARGET", "0.99"))
+TRACE_SLO_WINDOW = int(os.getenv("TRACE_SLO_WINDOW", "1000"))
+TRACE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+TRACE_HOP_SECONDS = Histogram(
+    "facman_trace_hop_seconds",
+    "Latency of one hop of a traced status event",
+    ["path", "hop"],
+    buckets=TRACE_BUCKETS,
+)
+TRACE_E2E_SECONDS = Histogram(
+    "facman_trace_e2e_seconds",
+    "Latency from the status event to the end of the path",
+    ["path"],
+    buckets=TRACE_BUCKETS,
+)
+TRACE_SLO_VIOLATIONS = Counter(
+    "facman_trace_slo_violations_total",
+    "Traced events slower than TRACE_SLO_SECONDS end to end",
+    ["path"],
+)
+TRACE_SLO_COMPLIANCE = Gauge(
+    "facman_trace_slo_compliance",
+    "Share of the last TRACE_SLO_WINDOW traced events within TRACE_SLO_SECONDS",
+    ["path"],
+)
+
+_slo_windows = {}
+_slo_breached = set()
+
+
+def observe_hop(path, hop, seconds):
+    TRACE_HOP_SECONDS.labels(path=path, hop=hop).observe(max(seconds, 0.0))
+
+
+def observe_e2e(path, seconds):
+    """종단 지연을 기록하고 최근 구간의 SLO 준수율을 갱신. 목표 아래로 떨어지거나 회복하면 로그 출력"""
+    seconds = max(seconds, 0.0)
+    TRACE_E2E_SECONDS.labels(path=path).observe(seconds)
+    within = seconds <= TRACE_SLO_SECONDS
+    if not within:
+        TRACE_SLO_VIOLATIONS.labels(path=path).inc()
+
+    window = _slo_windows.setdefault(path, deque(maxlen=TRACE_SLO_WINDOW))
+    window.append(within)
+    compliance = sum(window) / len(window)
+    TRACE_SLO_COMPLIANCE.labels(path=path).set(compliance)
+
+    breached = compliance < TRACE_SLO_TARGET
+    if breached != (path in _slo_breached):
+        (_slo_breached.add if breached else _slo_breached.discard)(path)
+        state = "BREACHED" if breached else "recovered"
+        print(f"[SLO] {path} {state}: {compliance:.1%} of last {len(window)} events within {TRACE_SLO_SECONDS}s "
+              f"(target {TRACE_SLO_TARGET:.0%})")
+
+
+@contextmanager
+def influx_write_timer(bucket):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        INFLUX_WRITE_ERRORS.labels(bucket=bucket).inc()
+        raise
+    finally:
+        INFLUX_WRITE_SECONDS.labels(bucket=bucket).observe(time.perf_counter() - started)
+
+
+def record_llm_call(component, seconds, response=None):
+    """LangChain AIMessage의 usage_metadata가 있으면 토큰 수도 기록"""
+    LLM_CALL_SECONDS.labels(component=component).observe(seconds)
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage:
+        LLM_TOKENS.labels(component=component, kind="input").inc(usage.get("input_tokens", 0))
+        LLM_TOKENS.labels(component=component, kind="output").inc(usage.get("output_tokens", 0))
+
+
+def start_metrics_server(port):
+    """/metrics 엔드포인트를 별도 스레드의 HTTP 서버로 노출"""
+    if port:
+        start_http_server(port)
+        print(f"Metrics server listening on :{port}/metrics")